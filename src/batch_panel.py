@@ -0,0 +1,404 @@
+import queue
+import re
+import threading
+import tkinter as tk
+from tkinter import filedialog, messagebox, ttk
+from tkinter.scrolledtext import ScrolledText
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.configuration import get_logger
+from utils.generate_queries import build_batched_queries, build_query
+from utils.ui_constants import (
+    BATCH_CHUNK_SIZE,
+    BATCH_INPUT_HEIGHT,
+    BATCH_POLL_INTERVAL_MS,
+    BATCH_WINDOW_TITLE,
+    DEFAULT_ENCODING,
+    DEFAULT_PADDING,
+    GRID_STICKY_E,
+    GRID_STICKY_EW,
+    GRID_STICKY_NSEW,
+    WIDGET_PADDING_X,
+    WIDGET_PADDING_Y,
+    WINDOW_PADDING,
+    WORKFLOW_BATCH_SIZE,
+)
+from utils.validators import Validator, field_validator
+
+logger = get_logger()
+
+"""
+GUI batch panel
+"""
+
+
+def parse_indicators(text: str) -> List[str]:
+    """
+    Splits pasted or loaded text into unique indicators
+
+    Args:
+    - text (str): Indicators separated by newlines, commas, semicolons or whitespace
+
+    Returns:
+    - List[str]: The indicators in first-seen order, without duplicates
+    """
+
+    return list(dict.fromkeys(value for value in re.split(r"[\s,;]+", text) if value))
+
+
+class BatchJob(threading.Thread):
+    def __init__(
+        self,
+        template: Dict[str, Any],
+        inputs: Dict[str, str],
+        field: str,
+        validator: Optional[Validator],
+        values: List[str],
+        duration: str,
+        platform: str,
+        base_queries: Dict[str, str],
+        include_post_pipeline: bool = False,
+        combine: bool = False,
+        chunk_size: int = BATCH_CHUNK_SIZE,
+    ) -> None:
+        """
+        Renders one query per indicator (or per IN-list batch) off the Tk thread
+
+        Rendered chunks are handed over through a queue, since Tk widgets may
+        only be touched from the thread running the event loop.
+
+        Args:
+        - template (Dict[str, Any]): The template
+        - inputs (Dict[str, str]): Values of the other optional fields
+        - field (str): The optional field receiving the indicators
+        - validator (Optional[Validator]): The validator of the field, None accepts all
+        - values (List[str]): The indicators
+        - duration (str): A duration from normalize_lookback
+        - platform (str): The platform name
+        - base_queries (Dict[str, str]): The base queries of the platform
+        - include_post_pipeline (bool): Whether to include the Defender post_pipeline
+        - combine (bool): Whether to OR indicators into batched queries, not one each
+        - chunk_size (int): Indicators rendered per chunk
+        """
+
+        super().__init__(name="batch-render", daemon=True)
+        self.template = template
+        self.inputs = inputs
+        self.field = field
+        self.validator = validator
+        self.values = values
+        self.duration = duration
+        self.platform = platform
+        self.base_queries = base_queries
+        self.include_post_pipeline = include_post_pipeline
+        self.combine = combine
+        self.chunk_size = chunk_size
+
+        # (queries, indicators done, invalid indicators) per chunk, then None
+        self.chunks: "queue.Queue[Optional[Tuple[List[str], int, List[str]]]]" = (
+            queue.Queue()
+        )
+        self.cancelled = threading.Event()
+        self.error: Optional[Exception] = None
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def _render_chunk(self, values: List[str]) -> Tuple[List[str], List[str]]:
+        if self.validator is None:
+            valid, invalid = values, []
+        else:
+            valid = []
+            invalid = []
+            for value in values:
+                if self.validator(value)[0]:
+                    valid.append(value)
+                else:
+                    invalid.append(value)
+        if not valid:
+            return [], invalid
+
+        if self.combine:
+            queries = build_batched_queries(
+                self.template,
+                self.inputs,
+                {self.field: valid},
+                self.duration,
+                self.platform,
+                self.base_queries,
+                self.include_post_pipeline,
+                WORKFLOW_BATCH_SIZE,
+            )
+            return queries, invalid
+
+        queries = []
+        for value in valid:
+            if self.cancelled.is_set():
+                break
+            queries.append(
+                build_query(
+                    self.template,
+                    {**self.inputs, self.field: value},
+                    self.duration,
+                    self.platform,
+                    self.base_queries,
+                    self.include_post_pipeline,
+                )
+            )
+        return queries, invalid
+
+    def run(self) -> None:
+        try:
+            for start in range(0, len(self.values), self.chunk_size):
+                if self.cancelled.is_set():
+                    break
+                chunk = self.values[start : start + self.chunk_size]
+                queries, invalid = self._render_chunk(chunk)
+                self.chunks.put((queries, start + len(chunk), invalid))
+        except Exception as e:
+            self.error = e
+        finally:
+            self.chunks.put(None)
+
+
+class BatchPanel:
+    def __init__(
+        self,
+        parent: tk.Tk,
+        template_name: str,
+        template: Dict[str, Any],
+        inputs: Dict[str, str],
+        duration: str,
+        platform: str,
+        base_queries: Dict[str, str],
+        include_post_pipeline: bool,
+        on_output: Callable[[List[str]], None],
+        on_reset: Callable[[], None],
+    ) -> None:
+        """
+        Window rendering a template for a list of indicators
+
+        Args:
+        - parent (tk.Tk): The main window
+        - template_name (str): The template name, shown in the title
+        - template (Dict[str, Any]): The template
+        - inputs (Dict[str, str]): Values of the other optional fields
+        - duration (str): A duration from normalize_lookback
+        - platform (str): The platform name
+        - base_queries (Dict[str, str]): The base queries of the platform
+        - include_post_pipeline (bool): Whether to include the Defender post_pipeline
+        - on_output (Callable[[List[str]], None]): Receives each chunk of queries
+        - on_reset (Callable[[], None]): Clears the output before a new run
+        """
+
+        self.template = template
+        self.inputs = inputs
+        self.duration = duration
+        self.platform = platform
+        self.base_queries = base_queries
+        self.include_post_pipeline = include_post_pipeline
+        self.on_output = on_output
+        self.on_reset = on_reset
+        self.optional_fields = template.get("optional_fields", {})
+        self.job: Optional[BatchJob] = None
+        self.queries: List[str] = []
+        self.invalid: List[str] = []
+
+        self.window = tk.Toplevel(parent)
+        self.window.title(f"{BATCH_WINDOW_TITLE} ({platform}: {template_name})")
+        self.window.protocol("WM_DELETE_WINDOW", self._close)
+
+        frame = ttk.Frame(self.window, padding=WINDOW_PADDING)
+        frame.pack(fill=tk.BOTH, expand=True)
+        frame.columnconfigure(1, weight=1)
+        frame.rowconfigure(1, weight=1)
+
+        # === Field Selector ===
+        ttk.Label(frame, text="Field:").grid(
+            row=0,
+            column=0,
+            sticky=GRID_STICKY_E,
+            padx=WIDGET_PADDING_X,
+            pady=WIDGET_PADDING_Y,
+        )
+        self.field_var = tk.StringVar(value=next(iter(self.optional_fields), ""))
+        ttk.Combobox(
+            frame,
+            textvariable=self.field_var,
+            values=list(self.optional_fields),
+            state="readonly",
+        ).grid(
+            row=0,
+            column=1,
+            sticky=GRID_STICKY_EW,
+            padx=WIDGET_PADDING_X,
+            pady=WIDGET_PADDING_Y,
+        )
+
+        # === Indicators ===
+        ttk.Label(frame, text="Indicators:").grid(
+            row=1, column=0, sticky="ne", padx=WIDGET_PADDING_X, pady=WIDGET_PADDING_Y
+        )
+        self.values_text = ScrolledText(frame, height=BATCH_INPUT_HEIGHT, wrap=tk.NONE)
+        self.values_text.grid(
+            row=1,
+            column=1,
+            sticky=GRID_STICKY_NSEW,
+            padx=WIDGET_PADDING_X,
+            pady=WIDGET_PADDING_Y,
+        )
+
+        self.combine_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            frame,
+            text=f"Combine into IN-lists of {WORKFLOW_BATCH_SIZE}",
+            variable=self.combine_var,
+        ).grid(row=2, column=1, sticky="w", padx=WIDGET_PADDING_X)
+
+        # === Progress ===
+        self.progress = ttk.Progressbar(frame, mode="determinate")
+        self.progress.grid(
+            row=3,
+            column=0,
+            columnspan=2,
+            sticky=GRID_STICKY_EW,
+            padx=WIDGET_PADDING_X,
+            pady=WIDGET_PADDING_Y,
+        )
+        self.status_label = ttk.Label(frame, text="Paste indicators or load a file")
+        self.status_label.grid(row=4, column=0, columnspan=2, padx=WIDGET_PADDING_X)
+
+        # === Buttons ===
+        btn_frame = ttk.Frame(frame)
+        btn_frame.grid(row=5, column=0, columnspan=2, pady=DEFAULT_PADDING)
+        ttk.Button(btn_frame, text="Load File...", command=self._load_file).grid(
+            row=0, column=0, padx=WIDGET_PADDING_X
+        )
+        self.start_btn = ttk.Button(btn_frame, text="Generate", command=self._start)
+        self.start_btn.grid(row=0, column=1, padx=WIDGET_PADDING_X)
+        self.cancel_btn = ttk.Button(
+            btn_frame, text="Cancel", command=self._cancel, state="disabled"
+        )
+        self.cancel_btn.grid(row=0, column=2, padx=WIDGET_PADDING_X)
+
+    def _load_file(self) -> None:
+        """
+        Replaces the indicators with the contents of a text file
+        """
+
+        path = filedialog.askopenfilename(
+            parent=self.window,
+            filetypes=[("Text files", "*.txt *.csv"), ("All files", "*.*")],
+        )
+        if not path:
+            return
+        try:
+            with open(path, "r", encoding=DEFAULT_ENCODING) as f:
+                text = f.read()
+        except OSError as e:
+            messagebox.showerror(
+                "Error", f"Failed to read {path}: {e}", parent=self.window
+            )
+            return
+        self.values_text.delete("1.0", tk.END)
+        self.values_text.insert("1.0", text)
+
+    def _start(self) -> None:
+        """
+        Starts rendering the indicators on a worker thread
+        """
+
+        field = self.field_var.get()
+        if field not in self.optional_fields:
+            messagebox.showerror(
+                "Error", "Choose a field for the indicators.", parent=self.window
+            )
+            return
+        values = parse_indicators(self.values_text.get("1.0", tk.END))
+        if not values:
+            messagebox.showerror("Error", "No indicators given.", parent=self.window)
+            return
+
+        meta = self.optional_fields[field]
+        inputs = {key: value for key, value in self.inputs.items() if key != field}
+        self.job = BatchJob(
+            self.template,
+            inputs,
+            field,
+            field_validator(meta),
+            values,
+            self.duration,
+            self.platform,
+            self.base_queries,
+            self.include_post_pipeline,
+            self.combine_var.get(),
+        )
+        self.queries = []
+        self.invalid = []
+        self.on_reset()
+        self.progress.configure(maximum=len(values), value=0)
+        self.start_btn.configure(state="disabled")
+        self.cancel_btn.configure(state="normal")
+        self.status_label.configure(text=f"Rendering {len(values)} indicators...")
+        logger.info(f"Batch started for {len(values)} indicators")
+        self.job.start()
+        self.window.after(BATCH_POLL_INTERVAL_MS, self._poll)
+
+    def _poll(self) -> None:
+        """
+        Drains rendered chunks from the worker and updates the progress
+        """
+
+        job = self.job
+        if job is None:
+            return
+
+        finished = False
+        try:
+            while True:
+                chunk = job.chunks.get_nowait()
+                if chunk is None:
+                    finished = True
+                    break
+                queries, done, invalid = chunk
+                self.queries.extend(queries)
+                self.invalid.extend(invalid)
+                self.progress.configure(value=done)
+                self.status_label.configure(
+                    text=f"{done} / {len(job.values)} indicators, "
+                    f"{len(self.queries)} queries"
+                )
+                if queries:
+                    self.on_output(queries)
+        except queue.Empty:
+            pass
+
+        if not finished:
+            self.window.after(BATCH_POLL_INTERVAL_MS, self._poll)
+            return
+
+        self.job = None
+        self.start_btn.configure(state="normal")
+        self.cancel_btn.configure(state="disabled")
+        if job.error is not None:
+            messagebox.showerror("Build Error", str(job.error), parent=self.window)
+            logger.info("Batch build failure")
+        status = "Cancelled" if job.cancelled.is_set() else "Done"
+        summary = f"{status}: {len(self.queries)} queries"
+        if self.invalid:
+            summary += (
+                f", {len(self.invalid)} invalid indicators skipped "
+                f"(e.g., {self.invalid[0]})"
+            )
+        self.status_label.configure(text=summary)
+        logger.info(f"Batch finished with {len(self.queries)} queries")
+
+    def _cancel(self) -> None:
+        if self.job is not None:
+            self.job.cancel()
+            self.status_label.configure(text="Cancelling...")
+
+    def _close(self) -> None:
+        self._cancel()
+        self.job = None  # Stops polling
+        self.window.destroy()
@@ -2,6 +2,7 @@ import sys
 import questionary
 
 from typing import Dict, Tuple, Any
+from zoneinfo import ZoneInfo
 
 from questionary import Separator
 
@@ -11,7 +12,12 @@ from utils.configuration import (
     validate,
 )
 
+from utils.emitters import get_emitter
+from utils.field_stats import build_field_stats_queries
 from utils.generate_queries import build_query
+from utils.query_history import get_history, rerender
+from utils.time_slices import build_sliced_queries
+from utils.validators import field_validator
 
 """
 Cli interface
@@ -36,6 +42,30 @@ class QueryCli:
 
         inputs = self._get_inputs(template)
         duration = self._get_lookback()
+        slices = self._get_slices()
+
+        if slices > 1:
+            sliced = build_sliced_queries(
+                template,
+                inputs,
+                duration,
+                self.platform,
+                self.base_queries,
+                self.include_post_pipeline,
+                slices=slices,
+            )
+            # Label the slices in the timezone their bounds are rendered in
+            zone = get_emitter(self.platform).time_zone
+            for (start, end), query in sliced:
+                start, end = start.astimezone(ZoneInfo(zone)), end.astimezone(
+                    ZoneInfo(zone)
+                )
+                print(
+                    f"Generated query for {start:%Y-%m-%d %H:%M} - {end:%Y-%m-%d %H:%M} {zone}:\n"
+                )
+                print(query)
+                print()
+            return
 
         query = build_query(
             template,
@@ -48,6 +78,59 @@ class QueryCli:
         print("Generated query:\n")
         print(query)
 
+        history = get_history()
+        if history is not None:
+            history.record(
+                self.platform,
+                template_name,
+                inputs,
+                duration,
+                self.include_post_pipeline,
+                query,
+            )
+
+        if self._confirm("Generate field statistics queries? [y/n]: "):
+            self._print_field_stats(template, inputs, duration)
+
+    def _print_field_stats(
+        self, template: Dict[str, Any], inputs: Dict[str, Any], duration: str
+    ) -> None:
+        """
+        Prints the aggregate companion queries counting the values of each optional field
+
+        Arguments:
+        - template (Dict[str, Any]): template of the given platform
+        - inputs (Dict[str, Any]): optional field values narrowing the counted events
+        - duration (str): A duration string of a lookback value
+        """
+
+        stats = build_field_stats_queries(
+            template, duration, self.platform, self.base_queries, inputs
+        )
+        if not stats:
+            print("The template has no optional fields to summarise")
+            return
+        for label, query in stats:
+            print(f"\nField statistics for {label}:\n")
+            print(query)
+
+    def _confirm(self, prompt: str) -> bool:
+        """
+        Asks the user a yes/no question
+
+        Arguments:
+        - prompt (str): The question to ask
+
+        Returns:
+        - bool: True if the user answered 'y'
+        """
+
+        while True:
+            choice = input(prompt).strip().lower()
+            if choice in ("y", "n"):
+                return choice == "y"
+            print("Please enter 'y' or 'n'.")
+
     def _get_template(self) -> Tuple[str, dict] | None:
         """
         Collects the name of the template selected by the user
@@ -63,6 +146,7 @@ class QueryCli:
                 for name, meta in self.templates.items()
             ] + [
                 Separator("---"),
+                questionary.Choice("Search query history", value="history"),
                 questionary.Choice("Go back to platform selection", value="back"),
                 questionary.Choice("Quit", value="quit"),
             ]
@@ -79,11 +163,58 @@ class QueryCli:
                     resolve_platform_and_templates(mode="cli", platform=None)
                 )
                 continue  # Restart template selection loop
+            if template_name == "history":
+                self._recall_from_history()
+                continue
 
             template = self.templates[template_name]
 
             return template_name, template
 
+    def _recall_from_history(self) -> None:
+        """
+        Searches the query history and prints a selected query, re-rendered
+        with the current templates
+        """
+
+        history = get_history()
+        if history is None:
+            print("The query history could not be opened")
+            return
+
+        text = input("Search history (empty for the latest queries): ").strip()
+        entries = history.search(text)
+        if not entries:
+            print("No queries found")
+            return
+
+        entry = questionary.select(
+            "Choose a query:",
+            choices=[
+                questionary.Choice(entry.summary, value=entry) for entry in entries
+            ]
+            + [Separator("---"), questionary.Choice("Cancel", value=None)],
+        ).ask()
+        if entry is None:
+            return
+
+        try:
+            query = rerender(entry)
+        except Exception as e:
+            print(f"Failed to re-render the query: {e}")
+            return
+        print("Recalled query:\n")
+        print(query)
+        print()
+        history.record(
+            entry.platform,
+            entry.template,
+            entry.inputs,
+            entry.duration,
+            entry.include_post_pipeline,
+            query,
+        )
+
     def _get_inputs(self, template) -> Dict[str, Any]:
         """
         Collect optional input parameters from the user, with validation if defined
@@ -102,8 +233,9 @@ class QueryCli:
                 value = input(f"{key} ({meta.get('help', '')}): ").strip()
                 if not value:
                     break
-                if "validation" in meta:
-                    valid, msg = validate(value, meta["validation"])
+                validator = field_validator(meta)
+                if validator is not None:
+                    valid, msg = validator(value)
                     if not valid:
                         print(f"Invalid input for {key}: {msg}")
                         continue
@@ -145,3 +277,21 @@ class QueryCli:
             break
 
         return duration
+
+    def _get_slices(self) -> int:
+        """
+        Collect the number of time slices to split the lookback into
+
+        Returns:
+        - int: Number of slices, 1 for a single relative query
+        """
+
+        while True:
+            value = input("Split into time slices (default '1'): ").strip()
+            if not value:
+                return 1
+            valid, msg = validate(value, "integer")
+            if not valid or int(value) <= 0:
+                print("Invalid input")
+                continue
+            return int(value)
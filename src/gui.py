@@ -1,15 +1,23 @@
 import re
 import tkinter as tk
-from tkinter import ttk, messagebox
-from tkinter.scrolledtext import ScrolledText
-from typing import List, Optional
+from tkinter import ttk, messagebox, filedialog
+from typing import Dict, List, Optional
 
-from utils.generate_queries import build_query
+from utils.generate_queries import IncrementalQueryBuilder, build_query
 
-from utils.configuration import load_templates, normalize_lookback, validate, get_logger
+from .batch_panel import BatchPanel
+from .history_panel import HistoryPanel
+from .output_pane import QueryOutputPane
+
+from utils.configuration import load_templates, normalize_lookback, get_logger
+from utils.query_history import HistoryEntry, get_history
+from utils.validators import field_validator
 
 from utils.ui_constants import (
+    DEFAULT_ENCODING,
     DEFAULT_MODE,
+    INVALID_FIELD_COLOR,
+    PREVIEW_DEBOUNCE_MS,
     DEFAULT_TIME_RANGE_INDEX,
     DEFAULT_WINDOW_WIDTH,
     DEFAULT_WINDOW_HEIGHT,
@@ -161,6 +169,13 @@ class QueryGui:
         # Template cache loading
         self.template_cache = {}
 
+        # Live preview state
+        self.preview_builders = {}
+        self.field_errors = {}
+        self._preview_job = None
+        # True while the output holds batch results the preview must not replace
+        self._showing_batch = False
+
         # Setup window
         self.root = root
         self.root.title(WINDOW_TITLE)
@@ -226,6 +241,9 @@ class QueryGui:
         )  # Labels column
         self.frame.columnconfigure(1, weight=1)  # Controls column
 
+        # Entries failing validation in the live preview
+        ttk.Style().configure("Invalid.TEntry", foreground=INVALID_FIELD_COLOR)
+
         # === Platform Selector ===
         ttk.Label(self.frame, text="Platform:").grid(
             row=0,
@@ -305,6 +323,7 @@ class QueryGui:
         self.lookback_var = tk.StringVar(
             value=self.display_values[DEFAULT_TIME_RANGE_INDEX]
         )
+        self.lookback_var.trace_add("write", self._schedule_preview)
         self.time_entry = ttk.Entry(
             time_frame, textvariable=self.lookback_var, width=TIME_ENTRY_WIDTH
         )
@@ -332,6 +351,7 @@ class QueryGui:
 
         # Defender button for post_pipeline
         self.include_post_pipeline_var = tk.BooleanVar(value=False)
+        self.include_post_pipeline_var.trace_add("write", self._schedule_preview)
 
         self.checkbox = tk.Checkbutton(
             self.frame,
@@ -345,7 +365,18 @@ class QueryGui:
         btn_frame.columnconfigure(0, weight=1)
 
         btn = ttk.Button(btn_frame, text="Generate Query", command=self._generate)
-        btn.grid(row=0, column=0, sticky="")
+        btn.grid(row=0, column=0, sticky="e", padx=WIDGET_PADDING_X)
+
+        batch_btn = ttk.Button(
+            btn_frame, text="Batch...", command=self._open_batch_panel
+        )
+        batch_btn.grid(row=0, column=1, padx=WIDGET_PADDING_X)
+
+        history_btn = ttk.Button(
+            btn_frame, text="History...", command=self._open_history_panel
+        )
+        history_btn.grid(row=0, column=2, sticky="w", padx=WIDGET_PADDING_X)
+        btn_frame.columnconfigure(2, weight=1)
 
         # === Output Text Box ===
         output_frame = ttk.LabelFrame(
@@ -355,14 +386,20 @@ class QueryGui:
         output_frame.columnconfigure(0, weight=1)
         output_frame.rowconfigure(0, weight=1)
 
-        self.output_text = ScrolledText(
-            output_frame, height=self.OUTPUT_HEIGHT, wrap=tk.WORD
+        self.output_pane = QueryOutputPane(output_frame, height=self.OUTPUT_HEIGHT)
+        self.output_pane.grid(row=0, column=0, sticky=GRID_STICKY_NSEW)
+
+        # === Copy and Save Buttons ===
+        output_btn_frame = ttk.Frame(self.frame)
+        output_btn_frame.grid(row=8, column=0, columnspan=2, pady=WIDGET_PADDING_Y)
+
+        copy_btn = ttk.Button(
+            output_btn_frame, text="Copy to Clipboard", command=self._copy
         )
-        self.output_text.grid(row=0, column=0, sticky=GRID_STICKY_NSEW)
+        copy_btn.grid(row=0, column=0, padx=WIDGET_PADDING_X)
 
-        # === Copy Button ===
-        copy_btn = ttk.Button(self.frame, text="Copy to Clipboard", command=self._copy)
-        copy_btn.grid(row=8, column=0, columnspan=2, sticky="", pady=WIDGET_PADDING_Y)
+        save_btn = ttk.Button(output_btn_frame, text="Save...", command=self._save)
+        save_btn.grid(row=0, column=1, padx=WIDGET_PADDING_X)
 
         # === Separator ===
         separator = ttk.Separator(self.frame, orient="horizontal")
@@ -601,7 +638,8 @@ class QueryGui:
 
         self.param_rows.clear()  # clear stored refs
         self.fields.clear()
-        self.output_text.delete("1.0", tk.END)
+        self.field_errors.clear()
+        self.output_pane.clear()
 
     def _render_fields(self, event: Optional[tk.Event] = None) -> None:
         """
@@ -669,12 +707,21 @@ class QueryGui:
                 pady=WIDGET_PADDING_Y,
             )
 
+            error_label = ttk.Label(
+                self.inputs_frame, text="", foreground=INVALID_FIELD_COLOR
+            )
+            error_label.grid(row=i, column=2, sticky="w", padx=WIDGET_PADDING_X)
+
             self.param_rows.append((label, entry, entry_var))
 
             self.fields[field] = (
                 entry_var,
-                meta.get("validation") if isinstance(meta, dict) else None,
+                field_validator(meta),
             )
+            self.field_errors[field] = (entry, error_label)
+            entry_var.trace_add("write", self._schedule_preview)
+
+        self._schedule_preview()
 
     # ==========================================
     # CORE BUSINESS LOGIC
@@ -708,17 +755,9 @@ class QueryGui:
             logger.info("Invalid time range")
             return 0
 
-        inputs = {}
-        for field, (var, validation_type) in self.fields.items():
-            value = var.get().strip()
-
-            if value:
-                valid, msg = validate(value, validation_type)
-                if not valid:
-                    messagebox.showerror("Invalid input", f"{field}: {msg}")
-                    logger.info("Invalid input")
-                    return 0
-                inputs[field] = value
+        inputs = self._collect_inputs()
+        if inputs is None:
+            return 0
 
         include_post = (
             self.include_post_pipeline_var.get() if platform == "defender" else False
@@ -729,11 +768,209 @@ class QueryGui:
                 template, inputs, duration, platform, self.base_queries, include_post
             )
             logger.info("Query issued")
-            self.output_text.delete("1.0", tk.END)
-            self.output_text.insert(tk.END, query)
+            self._show_queries([query])
         except Exception as e:
             messagebox.showerror("Build Error", str(e))
             logger.info("Build failure")
+            return
+
+        history = get_history()
+        if history is not None:
+            history.record(
+                platform, template_name, inputs, duration, include_post, query
+            )
+
+    def _schedule_preview(self, *args: str) -> None:
+        """
+        Re-renders the preview once edits pause for PREVIEW_DEBOUNCE_MS
+
+        Args:
+        - args (str): Variable trace arguments, unused
+        """
+
+        if self._preview_job is not None:
+            self.root.after_cancel(self._preview_job)
+        self._preview_job = self.root.after(PREVIEW_DEBOUNCE_MS, self._update_preview)
+
+    def _update_preview(self) -> None:
+        """
+        Renders the current inputs into the output, highlighting invalid fields
+        """
+
+        self._preview_job = None
+        template_name = self.current_template
+        if template_name not in self.templates:
+            return
+
+        duration = normalize_lookback(self.current_lookback, self.platform)
+        self.time_entry.configure(
+            style="Invalid.TEntry" if duration is None else "TEntry"
+        )
+        if duration is None:
+            return
+
+        inputs = {}
+        for field, (var, validator) in self.fields.items():
+            value = var.get().strip()
+            entry, error_label = self.field_errors[field]
+            valid, msg = validator(value) if value and validator else (True, "")
+            entry.configure(style="TEntry" if valid else "Invalid.TEntry")
+            error_label.configure(text=msg)
+            if value and valid:
+                inputs[field] = value
+
+        platform = self.current_platform
+        builder = self.preview_builders.get((platform, template_name))
+        include_post = (
+            self.include_post_pipeline_var.get() if platform == "defender" else False
+        )
+
+        try:
+            if builder is None:
+                builder = IncrementalQueryBuilder(
+                    self.templates[template_name], platform, self.base_queries
+                )
+                self.preview_builders[(platform, template_name)] = builder
+            query = builder.render(inputs, duration, include_post)
+            if not self._showing_batch:
+                self.output_pane.set_queries([query])
+        except Exception as e:
+            logger.info(f"Preview failure: {e}")
+
+    def _collect_inputs(self) -> Optional[Dict[str, str]]:
+        """
+        Collects and validates the optional field values
+
+        Returns:
+        - Optional[Dict[str, str]]: The non-empty values, or None if one is invalid
+        """
+
+        inputs = {}
+        for field, (var, validator) in self.fields.items():
+            value = var.get().strip()
+
+            if value:
+                valid, msg = validator(value) if validator is not None else (True, "")
+                if not valid:
+                    messagebox.showerror("Invalid input", f"{field}: {msg}")
+                    logger.info("Invalid input")
+                    return None
+                inputs[field] = value
+        return inputs
+
+    def _show_queries(self, queries: List[str]) -> None:
+        """
+        Replaces the output with generated queries, resuming the live preview
+
+        Args:
+        - queries (List[str]): The queries to show
+        """
+
+        self._showing_batch = False
+        self.output_pane.set_queries(queries)
+
+    def _append_batch(self, queries: List[str]) -> None:
+        """
+        Appends batch results to the output, pausing the live preview
+
+        Args:
+        - queries (List[str]): A rendered chunk of the batch
+        """
+
+        self._showing_batch = True
+        self.output_pane.append(queries)
+
+    def _clear_batch(self) -> None:
+        """
+        Empties the output for a new batch, pausing the live preview
+        """
+
+        self._showing_batch = True
+        self.output_pane.clear()
+
+    def _open_batch_panel(self) -> None:
+        """
+        Opens the batch panel for the selected template
+        """
+
+        template_name = self.current_template
+        if template_name not in self.templates:
+            messagebox.showerror("Error", "Invalid template choice.")
+            logger.info("Invalid template choice")
+            return
+
+        template = self.templates[template_name]
+        if not template.get("optional_fields"):
+            messagebox.showerror("Error", "Template has no optional fields to batch.")
+            return
+
+        duration = normalize_lookback(self.current_lookback, self.platform)
+        if duration is None:
+            messagebox.showerror("Error", "Invalid time range")
+            logger.info("Invalid time range")
+            return
+
+        inputs = self._collect_inputs()
+        if inputs is None:
+            return
+
+        platform = self.current_platform
+        BatchPanel(
+            self.root,
+            template_name,
+            template,
+            inputs,
+            duration,
+            platform,
+            self.base_queries,
+            self.include_post_pipeline_var.get() if platform == "defender" else False,
+            self._append_batch,
+            self._clear_batch,
+        )
+
+    def _open_history_panel(self) -> None:
+        """
+        Opens the query history
+        """
+
+        history = get_history()
+        if history is None:
+            messagebox.showerror("Error", "The query history could not be opened.")
+            return
+        HistoryPanel(
+            self.root,
+            history,
+            self._restore_history_entry,
+            self._show_queries,
+        )
+
+    def _restore_history_entry(self, entry: HistoryEntry) -> None:
+        """
+        Fills the form with a query from the history
+
+        Args:
+        - entry (HistoryEntry): The recorded query
+        """
+
+        if entry.platform != self.current_platform:
+            self.platform_var.set(entry.platform)
+            self._on_platform_change()
+        if entry.template not in self.templates:
+            messagebox.showerror(
+                "Invalid template", f"Template {entry.template} no longer exists"
+            )
+            return
+
+        # The restored query is previewed even if batch results are shown
+        self._showing_batch = False
+        self.template_var.set(entry.template)
+        self._render_fields()
+        for field, value in entry.inputs.items():
+            if field in self.fields:
+                self.fields[field][0].set(value)
+        self.lookback_var.set(entry.duration)
+        self.include_post_pipeline_var.set(entry.include_post_pipeline)
+        self.root.lift()
 
     def _copy(self) -> None:
         """
@@ -741,7 +978,7 @@ class QueryGui:
         """
         
         try:
-            query = self.output_text.get("1.0", tk.END).strip()
+            query = self.output_pane.get_text()
             self.root.clipboard_clear()
             self.root.clipboard_append(query)
             messagebox.showinfo("Copied", "Query copied to clipboard!")
@@ -750,6 +987,30 @@ class QueryGui:
             messagebox.showinfo("Failed to copy query to clipboard")
             logger.info("Failed to copy query to clipboard")
 
+    def _save(self) -> None:
+        """
+        Save all generated queries to a file
+        """
+
+        if not self.output_pane.queries:
+            messagebox.showinfo("Nothing to save", "Generate a query first.")
+            return
+
+        path = filedialog.asksaveasfilename(
+            defaultextension=".txt",
+            filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
+        )
+        if not path:
+            return
+
+        try:
+            with open(path, "w", encoding=DEFAULT_ENCODING) as f:
+                self.output_pane.write_to(f)
+            logger.info(f"{len(self.output_pane.queries)} queries saved to {path}")
+        except OSError as e:
+            messagebox.showerror("Failed to save queries", str(e))
+            logger.info("Failed to save queries")
+
     # ==========================================
     # EVENT HANDLERS
     # ==========================================
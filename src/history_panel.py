@@ -0,0 +1,195 @@
+import tkinter as tk
+from tkinter import messagebox, ttk
+from typing import Callable, Dict, List
+
+from utils.configuration import get_logger
+from utils.query_history import HistoryEntry, QueryHistory, rerender
+from utils.ui_constants import (
+    DEFAULT_PADDING,
+    GRID_STICKY_EW,
+    GRID_STICKY_NSEW,
+    HISTORY_LIST_HEIGHT,
+    HISTORY_SEARCH_LIMIT,
+    HISTORY_WINDOW_TITLE,
+    PREVIEW_DEBOUNCE_MS,
+    WIDGET_PADDING_X,
+    WIDGET_PADDING_Y,
+    WINDOW_PADDING,
+)
+
+logger = get_logger()
+
+"""
+GUI query history
+"""
+
+HISTORY_COLUMNS = (
+    ("time", "Time", 120),
+    ("platform", "Platform", 70),
+    ("template", "Template", 140),
+    ("inputs", "Inputs", 220),
+)
+
+
+class HistoryPanel:
+    def __init__(
+        self,
+        parent: tk.Tk,
+        history: QueryHistory,
+        on_restore: Callable[[HistoryEntry], None],
+        on_output: Callable[[List[str]], None],
+    ) -> None:
+        """
+        Window searching the query history
+
+        The list is filtered as the user types. Restoring an entry fills the
+        main window with its platform, template, inputs and time range;
+        re-rendering builds it again with the current templates.
+
+        Args:
+        - parent (tk.Tk): The main window
+        - history (QueryHistory): The query history
+        - on_restore (Callable[[HistoryEntry], None]): Fills the main window with an entry
+        - on_output (Callable[[List[str]], None]): Shows re-rendered queries
+        """
+
+        self.history = history
+        self.on_restore = on_restore
+        self.on_output = on_output
+        self.entries: Dict[str, HistoryEntry] = {}
+        self._search_job = None
+
+        self.window = tk.Toplevel(parent)
+        self.window.title(HISTORY_WINDOW_TITLE)
+
+        frame = ttk.Frame(self.window, padding=WINDOW_PADDING)
+        frame.pack(fill=tk.BOTH, expand=True)
+        frame.columnconfigure(1, weight=1)
+        frame.rowconfigure(1, weight=1)
+
+        # === Search ===
+        ttk.Label(frame, text="Search:").grid(
+            row=0, column=0, padx=WIDGET_PADDING_X, pady=WIDGET_PADDING_Y
+        )
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", self._schedule_search)
+        search_entry = ttk.Entry(frame, textvariable=self.search_var)
+        search_entry.grid(
+            row=0,
+            column=1,
+            sticky=GRID_STICKY_EW,
+            padx=WIDGET_PADDING_X,
+            pady=WIDGET_PADDING_Y,
+        )
+        search_entry.focus_set()
+
+        # === Entries ===
+        self.tree = ttk.Treeview(
+            frame,
+            columns=[name for name, _, _ in HISTORY_COLUMNS],
+            show="headings",
+            height=HISTORY_LIST_HEIGHT,
+            selectmode="browse",
+        )
+        for name, heading, width in HISTORY_COLUMNS:
+            self.tree.heading(name, text=heading)
+            self.tree.column(name, width=width, stretch=name == "inputs")
+        self.tree.grid(
+            row=1,
+            column=0,
+            columnspan=2,
+            sticky=GRID_STICKY_NSEW,
+            padx=WIDGET_PADDING_X,
+        )
+        self.tree.bind("<Double-1>", lambda event: self._restore())
+
+        # === Buttons ===
+        btn_frame = ttk.Frame(frame)
+        btn_frame.grid(row=2, column=0, columnspan=2, pady=DEFAULT_PADDING)
+        ttk.Button(btn_frame, text="Restore", command=self._restore).grid(
+            row=0, column=0, padx=WIDGET_PADDING_X
+        )
+        ttk.Button(btn_frame, text="Re-render", command=self._rerender).grid(
+            row=0, column=1, padx=WIDGET_PADDING_X
+        )
+        ttk.Button(btn_frame, text="Delete", command=self._delete).grid(
+            row=0, column=2, padx=WIDGET_PADDING_X
+        )
+
+        self._search()
+
+    def _schedule_search(self, *args: str) -> None:
+        if self._search_job is not None:
+            self.window.after_cancel(self._search_job)
+        self._search_job = self.window.after(PREVIEW_DEBOUNCE_MS, self._search)
+
+    def _search(self) -> None:
+        """
+        Lists the entries matching the search text, newest first
+        """
+
+        self._search_job = None
+        self.history.flush()  # Queries generated a moment ago are listed too
+        try:
+            entries = self.history.search(
+                self.search_var.get(), limit=HISTORY_SEARCH_LIMIT
+            )
+        except Exception as e:
+            logger.info(f"History search failure: {e}")
+            return
+
+        self.tree.delete(*self.tree.get_children())
+        self.entries = {}
+        for entry in entries:
+            item = self.tree.insert(
+                "",
+                tk.END,
+                values=(
+                    f"{entry.created_at.astimezone():%Y-%m-%d %H:%M}",
+                    entry.platform,
+                    entry.template,
+                    ", ".join(f"{key}={value}" for key, value in entry.inputs.items()),
+                ),
+            )
+            self.entries[item] = entry
+
+    def _selected(self) -> HistoryEntry | None:
+        selection = self.tree.selection()
+        if not selection:
+            messagebox.showinfo(
+                "No query selected", "Select a query first.", parent=self.window
+            )
+            return None
+        return self.entries[selection[0]]
+
+    def _restore(self) -> None:
+        entry = self._selected()
+        if entry is not None:
+            self.on_restore(entry)
+
+    def _rerender(self) -> None:
+        entry = self._selected()
+        if entry is None:
+            return
+        try:
+            query = rerender(entry)
+        except Exception as e:
+            messagebox.showerror("Build Error", str(e), parent=self.window)
+            logger.info("History re-render failure")
+            return
+        self.history.record(
+            entry.platform,
+            entry.template,
+            entry.inputs,
+            entry.duration,
+            entry.include_post_pipeline,
+            query,
+        )
+        self.on_output([query])
+
+    def _delete(self) -> None:
+        entry = self._selected()
+        if entry is None:
+            return
+        self.history.delete(entry.id)
+        self._search()
@@ -1,7 +1,10 @@
+import argparse
 import tkinter as tk
 import sys
+from typing import List, Optional
 
 from utils.configuration import resolve_platform_and_templates, choose_mode
+from utils.profiling import add_profiling_arguments, profiling_from_args
 
 from .cli import QueryCli
 from .gui import QueryGui
@@ -26,7 +29,18 @@ Version {VERSION} olofmagn
 """
 
 
-def main():
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.main", description="ThreatQueryX"
+    )
+    add_profiling_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with profiling_from_args(args):
+        run()
+
+
+def run() -> None:
     print(BANNER)
 
     mode = choose_mode()
@@ -0,0 +1,176 @@
+import tkinter as tk
+from tkinter import ttk
+from tkinter.scrolledtext import ScrolledText
+from typing import Iterable, List, Optional, TextIO
+
+from utils.ui_constants import (
+    GRID_STICKY_NSEW,
+    OUTPUT_MAX_VIEW_CHARS,
+    OUTPUT_PAGE_SIZE,
+    OUTPUT_RENDER_CHUNK_CHARS,
+    WIDGET_PADDING_X,
+)
+
+"""
+Paged output view
+"""
+
+QUERY_SEPARATOR = "\n\n"
+
+
+class QueryOutputPane(ttk.Frame):
+    def __init__(
+        self, master: tk.Misc, height: int, page_size: int = OUTPUT_PAGE_SIZE
+    ) -> None:
+        """
+        Read-only view over a buffer of generated queries
+
+        Only one page of queries is materialized in the Text widget, and it
+        is inserted in chunks across event loop turns. Copying and saving
+        read the buffer, never the widget.
+
+        Args:
+        - master (tk.Misc): The parent widget
+        - height (int): Height of the text view in lines
+        - page_size (int): Queries shown per page
+        """
+
+        super().__init__(master)
+        self.page_size = page_size
+        self.queries: List[str] = []
+        self.page = 0
+        self._render_job: Optional[str] = None
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        self.text = ScrolledText(self, height=height, wrap=tk.WORD, state="disabled")
+        self.text.grid(row=0, column=0, sticky=GRID_STICKY_NSEW)
+
+        # Page navigation, only shown when there is more than one page
+        self.nav_frame = ttk.Frame(self)
+        self.prev_btn = ttk.Button(
+            self.nav_frame,
+            text="❮",
+            width=2,
+            command=lambda: self.show_page(self.page - 1),
+        )
+        self.prev_btn.pack(side="left", padx=WIDGET_PADDING_X)
+        self.page_label = ttk.Label(self.nav_frame, text="")
+        self.page_label.pack(side="left")
+        self.next_btn = ttk.Button(
+            self.nav_frame,
+            text="❯",
+            width=2,
+            command=lambda: self.show_page(self.page + 1),
+        )
+        self.next_btn.pack(side="left", padx=WIDGET_PADDING_X)
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-len(self.queries) // self.page_size))
+
+    def set_queries(self, queries: Iterable[str]) -> None:
+        """
+        Replaces the buffer and shows its first page
+
+        Args:
+        - queries (Iterable[str]): The queries to show
+        """
+
+        self.queries = list(queries)
+        self.show_page(0)
+
+    def append(self, queries: List[str]) -> None:
+        """
+        Appends queries to the buffer, redrawing only if the current page changes
+
+        Args:
+        - queries (List[str]): The queries to append
+        """
+
+        visible_before = len(self.queries) < (self.page + 1) * self.page_size
+        self.queries.extend(queries)
+        if visible_before:
+            self.show_page(self.page)
+        else:
+            self._update_navigation()
+
+    def clear(self) -> None:
+        self.set_queries([])
+
+    def show_page(self, page: int) -> None:
+        """
+        Materializes one page of the buffer in the view
+
+        Args:
+        - page (int): The zero-based page number, clamped to the available pages
+        """
+
+        self.page = min(max(page, 0), self.page_count - 1)
+        start = self.page * self.page_size
+        content = QUERY_SEPARATOR.join(self.queries[start : start + self.page_size])
+        if len(content) > OUTPUT_MAX_VIEW_CHARS:
+            hidden = len(content) - OUTPUT_MAX_VIEW_CHARS
+            content = (
+                f"{content[:OUTPUT_MAX_VIEW_CHARS]}\n\n"
+                f"... {hidden} more characters not shown; copy or save to get the full output"
+            )
+
+        if self._render_job is not None:
+            self.after_cancel(self._render_job)
+            self._render_job = None
+        self.text.configure(state="normal")
+        self.text.delete("1.0", tk.END)
+        self.text.configure(state="disabled")
+        self._insert_chunk(content, 0)
+        self._update_navigation()
+
+    def _insert_chunk(self, content: str, offset: int) -> None:
+        chunk = content[offset : offset + OUTPUT_RENDER_CHUNK_CHARS]
+        self.text.configure(state="normal")
+        self.text.insert(tk.END, chunk)
+        self.text.configure(state="disabled")
+        offset += len(chunk)
+        self._render_job = (
+            self.after_idle(self._insert_chunk, content, offset)
+            if offset < len(content)
+            else None
+        )
+
+    def _update_navigation(self) -> None:
+        if len(self.queries) <= self.page_size:
+            self.nav_frame.grid_remove()
+            return
+        start = self.page * self.page_size
+        end = min(start + self.page_size, len(self.queries))
+        self.page_label.configure(
+            text=f"Queries {start + 1}-{end} of {len(self.queries)}"
+        )
+        self.prev_btn.configure(state="normal" if self.page > 0 else "disabled")
+        self.next_btn.configure(
+            state="normal" if self.page < self.page_count - 1 else "disabled"
+        )
+        self.nav_frame.grid(row=1, column=0)
+
+    def get_text(self) -> str:
+        """
+        Joins the whole buffer, including queries that are not shown
+
+        Returns:
+        - str: All queries separated by blank lines
+        """
+
+        return QUERY_SEPARATOR.join(self.queries)
+
+    def write_to(self, handle: TextIO) -> None:
+        """
+        Streams the whole buffer to a file
+
+        Args:
+        - handle (TextIO): An open text file
+        """
+
+        for query in self.queries:
+            handle.write(query)
+            handle.write(QUERY_SEPARATOR)
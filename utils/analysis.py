@@ -0,0 +1,523 @@
+import argparse
+import csv
+import json
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, TextIO, Tuple
+
+from utils.configuration import lookback_to_timedelta
+from utils.ui_constants import (
+    ANALYSIS_BATCH_ROWS,
+    ANALYSIS_READ_CHUNK,
+    DEFAULT_ENCODING,
+)
+
+"""
+Columnar analysis of exported hunt results
+"""
+
+ColumnBatch = Dict[str, List[Any]]
+
+# Keys holding the result rows of wrapped exports (Ariel, Elastic search responses)
+RECORD_CONTAINERS = ("events", "flows", "results", "hits")
+
+
+@dataclass
+class AnalysisResult:
+    """
+    Aggregates computed in a single pass over an export
+    """
+
+    rows: int = 0
+    group_counts: Counter = field(default_factory=Counter)
+    distinct_counts: Dict[str, int] = field(default_factory=dict)
+    time_buckets: List[Tuple[datetime, int]] = field(default_factory=list)
+    unparsed_timestamps: int = 0
+
+
+def flatten_record(record: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """
+    Flattens nested objects into dotted column names (e.g., source.ip)
+
+    Elastic hits are reduced to their _source. Lists are kept as their JSON
+    text so that every value can be counted.
+
+    Args:
+    - record (Dict[str, Any]): A decoded JSON record
+    - prefix (str): Column name prefix of nested objects
+
+    Returns:
+    - Dict[str, Any]: The record with one column per leaf value
+    """
+
+    if not prefix and isinstance(record.get("_source"), dict):
+        record = record["_source"]
+
+    flat = {}
+    for key, value in record.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_record(value, f"{name}."))
+        elif isinstance(value, list):
+            flat[name] = json.dumps(value, sort_keys=True)
+        else:
+            flat[name] = value
+    return flat
+
+
+def _unwrap_records(document: Any) -> List[Any]:
+    """
+    Finds the result rows of a decoded JSON export
+
+    Args:
+    - document (Any): A decoded JSON document
+
+    Returns:
+    - List[Any]: The records of the document
+    """
+
+    if isinstance(document, list):
+        return document
+    if isinstance(document, dict):
+        for key in RECORD_CONTAINERS:
+            value = document.get(key)
+            if isinstance(value, list):
+                return value
+            if isinstance(value, dict):
+                return _unwrap_records(value)
+        return [document]
+    raise ValueError("JSON export must contain objects")
+
+
+def _iter_json_array(handle: TextIO, buffer: str) -> Iterator[Any]:
+    """
+    Streams the elements of a top-level JSON array without loading the whole file
+
+    Args:
+    - handle (TextIO): The open export, positioned after the initial buffer
+    - buffer (str): Already read text, starting at the opening bracket
+
+    Returns:
+    - Iterator[Any]: The decoded array elements
+    """
+
+    decoder = json.JSONDecoder()
+    pos = buffer.index("[") + 1
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            end = None
+
+        # An element cut off by the chunk boundary needs more text
+        if end is None or end == len(buffer):
+            chunk = handle.read(ANALYSIS_READ_CHUNK)
+            if chunk:
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            if end is None:
+                raise ValueError("Truncated or malformed JSON array")
+
+        yield item
+        pos = end
+
+
+def _iter_json_records(handle: TextIO) -> Iterator[Any]:
+    """
+    Streams records from a JSON array, NDJSON or wrapped JSON export
+
+    Arrays and NDJSON are streamed; a pretty-printed wrapper object
+    (e.g., {"events": [...]}) is decoded as a whole.
+
+    Args:
+    - handle (TextIO): The open export
+
+    Returns:
+    - Iterator[Any]: The decoded records
+    """
+
+    buffer = handle.read(ANALYSIS_READ_CHUNK)
+    start = buffer.lstrip()
+    if not start:
+        return
+    if start[0] == "[":
+        yield from _iter_json_array(handle, start)
+        return
+
+    first_line = buffer.partition("\n")[0]
+    try:
+        json.loads(first_line)
+    except json.JSONDecodeError:
+        yield from _unwrap_records(json.loads(buffer + handle.read()))
+        return
+
+    pending = ""
+    while buffer:
+        lines = (pending + buffer).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield from _unwrap_records(json.loads(line))
+        buffer = handle.read(ANALYSIS_READ_CHUNK)
+    if pending.strip():
+        yield from _unwrap_records(json.loads(pending))
+
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Streams the rows of an export as flat dictionaries
+
+    Args:
+    - path (str): Path to the exported CSV or JSON results
+
+    Returns:
+    - Iterator[Dict[str, Any]]: One dictionary per row, empty values are None
+    """
+
+    with open(path, "r", encoding=DEFAULT_ENCODING, newline="") as handle:
+        if Path(path).suffix.lower() == ".csv":
+            reader = csv.reader(handle)
+            header = [name.lstrip("\ufeff").strip() for name in next(reader, [])]
+            for row in reader:
+                yield {name: value or None for name, value in zip(header, row)}
+            return
+
+        for record in _iter_json_records(handle):
+            yield {
+                name: None if value == "" else value
+                for name, value in flatten_record(record).items()
+            }
+
+
+def iter_column_batches(
+    path: str, columns: Sequence[str], batch_rows: int = ANALYSIS_BATCH_ROWS
+) -> Iterator[ColumnBatch]:
+    """
+    Streams an export as batches of columns, keeping only the requested columns
+
+    CSV files are detected by their .csv suffix, everything else is read as
+    JSON. Missing JSON values are None, empty CSV cells are None.
+
+    Args:
+    - path (str): Path to the exported CSV or JSON results
+    - columns (Sequence[str]): The columns to read
+    - batch_rows (int): Maximum number of rows per batch
+
+    Returns:
+    - Iterator[ColumnBatch]: Column name to values, one list per column
+    """
+
+    with open(path, "r", encoding=DEFAULT_ENCODING, newline="") as handle:
+        if Path(path).suffix.lower() == ".csv":
+            reader = csv.reader(handle)
+            header = [name.lstrip("\ufeff").strip() for name in next(reader, [])]
+            missing = [column for column in columns if column not in header]
+            if missing:
+                raise ValueError(
+                    f"Unknown column(s) {', '.join(missing)}. Available: {', '.join(header)}"
+                )
+            indexes = {column: header.index(column) for column in columns}
+            while rows := list(islice(reader, batch_rows)):
+                yield {
+                    column: [
+                        (row[index] or None) if index < len(row) else None
+                        for row in rows
+                    ]
+                    for column, index in indexes.items()
+                }
+            return
+
+        records = _iter_json_records(handle)
+        while batch := list(islice(records, batch_rows)):
+            flat = [flatten_record(record) for record in batch]
+            yield {
+                column: [
+                    None if record.get(column) == "" else record.get(column)
+                    for record in flat
+                ]
+                for column in columns
+            }
+
+
+@lru_cache(maxsize=65536)
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """
+    Parses the timestamp formats found in exports
+
+    Epoch seconds or milliseconds (QRadar starttime), ISO 8601 (Elastic
+    @timestamp, Defender Timestamp) and 'yyyy-MM-dd HH:mm:ss' (QRadar
+    DATEFORMAT) are accepted. Naive values are assumed to be in UTC.
+
+    Args:
+    - value (Any): The raw column value
+
+    Returns:
+    - Optional[datetime]: The timezone-aware timestamp, or None if unparseable
+    """
+
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        epoch = float(value)
+    except (TypeError, ValueError):
+        epoch = None
+
+    if epoch is not None:
+        # Millisecond epochs are beyond year 5138 when read as seconds
+        if abs(epoch) >= 1e11:
+            epoch /= 1000
+        try:
+            return datetime.fromtimestamp(epoch, tz=timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None
+
+    try:
+        moment = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def analyze(
+    path: str,
+    group_by: Sequence[str] = (),
+    distinct: Sequence[str] = (),
+    time_column: Optional[str] = None,
+    bucket: Optional[timedelta] = None,
+    batch_rows: int = ANALYSIS_BATCH_ROWS,
+) -> AnalysisResult:
+    """
+    Computes group-by counts, distinct counts and time buckets in one pass
+
+    Only the referenced columns are held in memory, one batch at a time.
+    Distinct counts are exact and grow with the number of distinct values.
+
+    Args:
+    - path (str): Path to the exported CSV or JSON results
+    - group_by (Sequence[str]): Columns whose value combinations are counted
+    - distinct (Sequence[str]): Columns whose distinct non-empty values are counted
+    - time_column (Optional[str]): Column holding the event timestamp
+    - bucket (Optional[timedelta]): Width of the time buckets, requires time_column
+    - batch_rows (int): Maximum number of rows per batch
+
+    Returns:
+    - AnalysisResult: The computed aggregates
+    """
+
+    if bucket is not None and (time_column is None or bucket <= timedelta(0)):
+        raise ValueError("Time bucketing requires a time column and a positive bucket")
+
+    columns = list(
+        dict.fromkeys([*group_by, *distinct, *([time_column] if bucket else [])])
+    )
+    result = AnalysisResult()
+    distinct_values: Dict[str, Set[Any]] = {column: set() for column in distinct}
+    buckets: Counter = Counter()
+    width = bucket.total_seconds() if bucket else 0
+
+    if not columns:
+        result.rows = count_rows(path)
+        return result
+
+    for batch in iter_column_batches(path, columns, batch_rows):
+        result.rows += len(batch[columns[0]])
+
+        if group_by:
+            result.group_counts.update(zip(*(batch[column] for column in group_by)))
+        for column, values in distinct_values.items():
+            values.update(batch[column])
+        if bucket:
+            for moment in map(parse_timestamp, batch[time_column]):
+                if moment is None:
+                    result.unparsed_timestamps += 1
+                else:
+                    buckets[moment.timestamp() // width] += 1
+
+    result.distinct_counts = {
+        column: len(values - {None}) for column, values in distinct_values.items()
+    }
+    result.time_buckets = [
+        (datetime.fromtimestamp(key * width, tz=timezone.utc), count)
+        for key, count in sorted(buckets.items())
+    ]
+    return result
+
+
+def count_rows(path: str, batch_rows: int = ANALYSIS_BATCH_ROWS) -> int:
+    """
+    Counts the rows of an export
+
+    Args:
+    - path (str): Path to the exported CSV or JSON results
+    - batch_rows (int): Maximum number of rows per batch
+
+    Returns:
+    - int: Number of rows
+    """
+
+    if Path(path).suffix.lower() == ".csv":
+        with open(path, "r", encoding=DEFAULT_ENCODING, newline="") as handle:
+            return max(sum(1 for _ in csv.reader(handle)) - 1, 0)
+    with open(path, "r", encoding=DEFAULT_ENCODING) as handle:
+        return sum(1 for _ in _iter_json_records(handle))
+
+
+def group_by_counts(path: str, columns: Sequence[str]) -> Counter:
+    """
+    Counts the rows of each combination of column values
+
+    Args:
+    - path (str): Path to the exported CSV or JSON results
+    - columns (Sequence[str]): The columns to group by
+
+    Returns:
+    - Counter: Row counts keyed by tuples of column values
+    """
+
+    return analyze(path, group_by=columns).group_counts
+
+
+def top_n(path: str, column: str, n: int = 10) -> List[Tuple[Any, int]]:
+    """
+    Finds the most common values of a column
+
+    Args:
+    - path (str): Path to the exported CSV or JSON results
+    - column (str): The column to rank
+    - n (int): Number of values to return
+
+    Returns:
+    - List[Tuple[Any, int]]: Values with their row counts, most common first
+    """
+
+    counts = analyze(path, group_by=[column]).group_counts
+    return [(key[0], count) for key, count in counts.most_common(n)]
+
+
+def distinct_counts(path: str, columns: Sequence[str]) -> Dict[str, int]:
+    """
+    Counts the distinct non-empty values of columns
+
+    Args:
+    - path (str): Path to the exported CSV or JSON results
+    - columns (Sequence[str]): The columns to count
+
+    Returns:
+    - Dict[str, int]: Number of distinct values per column
+    """
+
+    return analyze(path, distinct=columns).distinct_counts
+
+
+def time_buckets(
+    path: str, column: str, bucket: timedelta
+) -> List[Tuple[datetime, int]]:
+    """
+    Counts rows per fixed-width time bucket, aligned to the Unix epoch
+
+    Args:
+    - path (str): Path to the exported CSV or JSON results
+    - column (str): Column holding the event timestamp
+    - bucket (timedelta): Width of the buckets
+
+    Returns:
+    - List[Tuple[datetime, int]]: Bucket start (UTC) with its row count, oldest first
+    """
+
+    return analyze(path, time_column=column, bucket=bucket).time_buckets
+
+
+def format_report(result: AnalysisResult, group_by: Sequence[str], top: int) -> str:
+    """
+    Formats the aggregates of an export
+
+    Args:
+    - result (AnalysisResult): The computed aggregates
+    - group_by (Sequence[str]): The columns that were grouped by
+    - top (int): Number of groups to show
+
+    Returns:
+    - str: A human readable report
+    """
+
+    lines = [f"Rows: {result.rows}"]
+    if group_by:
+        lines.append(f"\nTop {top} by {', '.join(group_by)}:")
+        for key, count in result.group_counts.most_common(top):
+            values = ", ".join("" if value is None else str(value) for value in key)
+            lines.append(f"  {count:>10}  {values}")
+    for column, count in result.distinct_counts.items():
+        lines.append(f"\nDistinct {column}: {count}")
+    if result.time_buckets:
+        lines.append("\nEvents per bucket (UTC):")
+        for start, count in result.time_buckets:
+            lines.append(f"  {start:%Y-%m-%d %H:%M:%S}  {count:>10}")
+    if result.unparsed_timestamps:
+        lines.append(f"\nUnparseable timestamps: {result.unparsed_timestamps}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Summarises an exported result file
+
+    Args:
+    - argv (Optional[List[str]]): Command line arguments, defaults to sys.argv
+
+    Returns:
+    - int: 0 on success, 1 if the export could not be analysed
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.analysis",
+        description="Summarise exported QRadar, Elastic or Defender results",
+    )
+    parser.add_argument("path", help="Exported CSV, JSON or NDJSON results")
+    parser.add_argument(
+        "--group-by",
+        action="append",
+        default=[],
+        help="Column to group by (repeatable)",
+    )
+    parser.add_argument("--top", type=int, default=10, help="Number of groups to show")
+    parser.add_argument(
+        "--distinct",
+        action="append",
+        default=[],
+        help="Column to count distinct values of (repeatable)",
+    )
+    parser.add_argument("--time-column", help="Column holding the event timestamp")
+    parser.add_argument("--bucket", help="Time bucket width (e.g., 5m, 1h, 1d)")
+    args = parser.parse_args(argv)
+
+    bucket = None
+    if args.bucket:
+        bucket = lookback_to_timedelta(args.bucket)
+        if bucket is None:
+            parser.error(f"Invalid bucket '{args.bucket}'")
+
+    try:
+        result = analyze(
+            args.path, args.group_by, args.distinct, args.time_column, bucket
+        )
+    except (OSError, ValueError) as e:
+        print(f"Failed to analyse {args.path}: {e}")
+        return 1
+
+    print(format_report(result, args.group_by, args.top))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
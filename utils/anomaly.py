@@ -0,0 +1,362 @@
+import argparse
+import math
+import statistics
+import sys
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from utils.analysis import iter_records, parse_timestamp
+from utils.configuration import lookback_to_timedelta
+from utils.correlation import KEY_NORMALIZERS
+from utils.ui_constants import (
+    ANOMALY_MAD_THRESHOLD,
+    ANOMALY_MIN_WINDOWS,
+    ANOMALY_WINDOW_STEPS,
+)
+
+"""
+Threshold and anomaly detection over exported results
+"""
+
+# Scales the MAD to the standard deviation of a normal distribution
+MAD_SCALE = 1.4826
+
+
+@dataclass(frozen=True)
+class Baseline:
+    """
+    Location and spread of a set of window counts
+    """
+
+    median: float
+    mad: float
+    mean: float
+    stdev: float
+
+    def z_score(self, value: float) -> float:
+        return (value - self.mean) / self.stdev if self.stdev else 0.0
+
+    def robust_score(self, value: float) -> float:
+        return (value - self.median) / (MAD_SCALE * self.mad) if self.mad else 0.0
+
+
+@dataclass(frozen=True)
+class Anomaly:
+    """
+    The busiest window of an entity that exceeds the threshold
+    """
+
+    entity: str
+    window_end: datetime
+    count: int
+    z_score: float
+    robust_score: float
+
+
+@dataclass
+class DetectionResult:
+    """
+    Baseline, suggested thresholds and anomalies of an export
+    """
+
+    window: timedelta
+    baseline: Optional[Baseline] = None
+    threshold: Optional[int] = None
+    anomalies: List[Anomaly] = field(default_factory=list)
+    entity_thresholds: Dict[str, int] = field(default_factory=dict)
+    skipped_rows: int = 0
+
+
+def compute_baseline(values: Sequence[float]) -> Baseline:
+    """
+    Computes the median/MAD and mean/standard deviation of counts
+
+    Args:
+    - values (Sequence[float]): The window counts, at least one
+
+    Returns:
+    - Baseline: The baseline of the counts
+    """
+
+    median = statistics.median(values)
+    mad = statistics.median(abs(value - median) for value in values)
+    stdev = statistics.pstdev(values) if len(values) > 1 else 0.0
+    return Baseline(median, mad, statistics.fmean(values), stdev)
+
+
+def suggest_threshold(
+    baseline: Baseline,
+    values: Sequence[float],
+    mad_threshold: float = ANOMALY_MAD_THRESHOLD,
+) -> int:
+    """
+    Suggests a 'COUNT() > value' threshold separating anomalous windows
+
+    The threshold is the count whose robust z-score equals mad_threshold.
+    When more than half of the windows share one count (MAD of zero) the
+    mean and standard deviation are used, and the maximum if all are equal.
+
+    Args:
+    - baseline (Baseline): The baseline of the counts
+    - values (Sequence[float]): The window counts
+    - mad_threshold (float): Robust z-score regarded as anomalous
+
+    Returns:
+    - int: The suggested threshold
+    """
+
+    if baseline.mad:
+        limit = baseline.median + mad_threshold * MAD_SCALE * baseline.mad
+    elif baseline.stdev:
+        limit = baseline.mean + mad_threshold * baseline.stdev
+    else:
+        limit = max(values)
+    return math.floor(limit)
+
+
+def rolling_counts(
+    events: Iterable[Tuple[str, datetime, int]],
+    window: timedelta,
+    steps: int = ANOMALY_WINDOW_STEPS,
+) -> Dict[str, List[Tuple[datetime, int]]]:
+    """
+    Counts events per entity in windows sliding by window / steps
+
+    Events are aggregated into step-wide buckets first, so memory grows
+    with entities times active buckets rather than with events. Only
+    windows ending on a bucket with events are returned, which includes
+    the busiest window of every entity.
+
+    Args:
+    - events (Iterable[Tuple[str, datetime, int]]): Entity, event time and weight of each event
+    - window (timedelta): Width of the rolling window
+    - steps (int): Number of buckets per window
+
+    Returns:
+    - Dict[str, List[Tuple[datetime, int]]]: Window end with its count, per entity
+    """
+
+    if window <= timedelta(0) or steps <= 0:
+        raise ValueError("Window and steps must be positive")
+
+    width = window.total_seconds() / steps
+    buckets: Counter = Counter()
+    for entity, moment, weight in events:
+        buckets[(entity, int(moment.timestamp() // width))] += weight
+
+    per_entity: Dict[str, List[Tuple[int, int]]] = {}
+    for (entity, index), count in buckets.items():
+        per_entity.setdefault(entity, []).append((index, count))
+
+    windows: Dict[str, List[Tuple[datetime, int]]] = {}
+    for entity, indexed in per_entity.items():
+        indexed.sort()
+        active: deque = deque()
+        total = 0
+        series = []
+        for index, count in indexed:
+            active.append((index, count))
+            total += count
+            while active[0][0] <= index - steps:
+                total -= active.popleft()[1]
+            end = datetime.fromtimestamp((index + 1) * width, tz=timezone.utc)
+            series.append((end, total))
+        windows[entity] = series
+    return windows
+
+
+def detect(
+    rows: Iterable[Dict[str, Any]],
+    entity_column: str,
+    time_column: str,
+    window: timedelta,
+    count_column: Optional[str] = None,
+    normalizer: Optional[Callable[[Any], Optional[str]]] = None,
+    mad_threshold: float = ANOMALY_MAD_THRESHOLD,
+    steps: int = ANOMALY_WINDOW_STEPS,
+) -> DetectionResult:
+    """
+    Finds entities whose event count in a rolling window is anomalous
+
+    A population baseline over all windows yields the suggested threshold
+    for a template's 'count' optional field; entities with enough windows
+    also get a threshold from their own baseline.
+
+    Args:
+    - rows (Iterable[Dict[str, Any]]): The exported rows
+    - entity_column (str): Column identifying the entity (e.g., username)
+    - time_column (str): Column holding the event timestamp
+    - window (timedelta): Width of the rolling window, matching the template lookback
+    - count_column (Optional[str]): Column holding pre-aggregated counts (e.g., "Event Count")
+    - normalizer (Optional[Callable[[Any], Optional[str]]]): Entity normaliser
+    - mad_threshold (float): Robust z-score regarded as anomalous
+    - steps (int): Number of buckets per window
+
+    Returns:
+    - DetectionResult: The baseline, thresholds and anomalies
+    """
+
+    result = DetectionResult(window)
+
+    def events() -> Iterable[Tuple[str, datetime, int]]:
+        for row in rows:
+            entity = row.get(entity_column)
+            if entity is not None and normalizer is not None:
+                entity = normalizer(entity)
+            moment = parse_timestamp(row.get(time_column))
+            weight = 1
+            if count_column is not None:
+                try:
+                    weight = int(float(row.get(count_column)))
+                except (TypeError, ValueError):
+                    weight = None
+            if entity is None or moment is None or weight is None:
+                result.skipped_rows += 1
+                continue
+            yield str(entity), moment, weight
+
+    windows = rolling_counts(events(), window, steps)
+    counts = [count for series in windows.values() for _, count in series]
+    if not counts:
+        return result
+
+    result.baseline = compute_baseline(counts)
+    result.threshold = suggest_threshold(result.baseline, counts, mad_threshold)
+
+    for entity, series in windows.items():
+        window_end, peak = max(series, key=lambda item: item[1])
+        if peak > result.threshold:
+            result.anomalies.append(
+                Anomaly(
+                    entity,
+                    window_end,
+                    peak,
+                    result.baseline.z_score(peak),
+                    result.baseline.robust_score(peak),
+                )
+            )
+        if len(series) >= ANOMALY_MIN_WINDOWS:
+            own = [count for _, count in series]
+            result.entity_thresholds[entity] = suggest_threshold(
+                compute_baseline(own), own, mad_threshold
+            )
+
+    result.anomalies.sort(key=lambda anomaly: anomaly.count, reverse=True)
+    return result
+
+
+def format_report(result: DetectionResult, top: int) -> str:
+    """
+    Formats a detection result
+
+    Args:
+    - result (DetectionResult): The detection result
+    - top (int): Number of anomalies and per-entity thresholds to show
+
+    Returns:
+    - str: A human readable report
+    """
+
+    if result.baseline is None:
+        return f"No usable events ({result.skipped_rows} rows skipped)"
+
+    baseline = result.baseline
+    minutes = int(result.window.total_seconds() // 60)
+    lines = [
+        f"Window: {minutes} MINUTES",
+        f"Baseline: median {baseline.median:g}, MAD {baseline.mad:g}, "
+        f"mean {baseline.mean:.1f}, stdev {baseline.stdev:.1f}",
+        f"Suggested threshold for the 'count' optional field: {result.threshold}",
+        f"  (HAVING COUNT() > {result.threshold} LAST {minutes} MINUTES)",
+        f"\nAnomalous entities ({len(result.anomalies)}):",
+    ]
+    for anomaly in result.anomalies[:top]:
+        lines.append(
+            f"  {anomaly.count:>10}  {anomaly.entity}  window ending "
+            f"{anomaly.window_end:%Y-%m-%d %H:%M} UTC  "
+            f"z {anomaly.z_score:.1f}  robust z {anomaly.robust_score:.1f}"
+        )
+
+    if result.entity_thresholds:
+        lines.append(
+            f"\nPer-entity thresholds ({len(result.entity_thresholds)} entities with "
+            f"at least {ANOMALY_MIN_WINDOWS} windows, highest first):"
+        )
+        ranked = sorted(
+            result.entity_thresholds.items(), key=lambda item: item[1], reverse=True
+        )
+        for entity, threshold in ranked[:top]:
+            lines.append(f"  {threshold:>10}  {entity}")
+    if result.skipped_rows:
+        lines.append(
+            f"\nSkipped rows without entity, time or count: {result.skipped_rows}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Detects anomalous entities in an export and suggests a count threshold
+
+    Args:
+    - argv (Optional[List[str]]): Command line arguments, defaults to sys.argv
+
+    Returns:
+    - int: 0 on success, 1 if the export could not be analysed
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.anomaly",
+        description="Suggest count thresholds from exported results",
+    )
+    parser.add_argument("path", help="Exported CSV, JSON or NDJSON results")
+    parser.add_argument("--entity", required=True, help="Column identifying the entity")
+    parser.add_argument(
+        "--time-column", required=True, help="Column holding the event timestamp"
+    )
+    parser.add_argument(
+        "--window",
+        default="30m",
+        help="Rolling window, as the template lookback (default 30m)",
+    )
+    parser.add_argument("--count-column", help="Column with pre-aggregated counts")
+    parser.add_argument(
+        "--key",
+        choices=list(KEY_NORMALIZERS),
+        help="Normalise entities as this key type",
+    )
+    parser.add_argument("--mad-threshold", type=float, default=ANOMALY_MAD_THRESHOLD)
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=20,
+        help="Number of anomalies and per-entity thresholds to show",
+    )
+    args = parser.parse_args(argv)
+
+    window = lookback_to_timedelta(args.window)
+    if window is None:
+        parser.error(f"Invalid window '{args.window}'")
+
+    try:
+        result = detect(
+            iter_records(args.path),
+            args.entity,
+            args.time_column,
+            window,
+            args.count_column,
+            KEY_NORMALIZERS.get(args.key) if args.key else None,
+            args.mad_threshold,
+        )
+    except (OSError, ValueError) as e:
+        print(f"Failed to analyse {args.path}: {e}")
+        return 1
+
+    print(format_report(result, args.top))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import quote
+
+from utils.canonical import QueryDeduplicator
+from utils.configuration import get_logger
+from utils.http_client import open_connection, parse_base_url
+from utils.time_slices import build_sliced_queries
+from utils.ui_constants import (
+    ARIEL_API_VERSION,
+    ARIEL_MAX_IN_FLIGHT,
+    ARIEL_PAGE_SIZE,
+    ARIEL_POLL_INTERVAL_SECONDS,
+    ARIEL_RESULT_QUEUE_SIZE,
+    DEFAULT_ENCODING,
+    HTTP_TIMEOUT_SECONDS,
+)
+
+logger = get_logger()
+
+"""
+QRadar Ariel search scheduler
+"""
+
+_DONE = object()
+
+
+class ArielScheduler:
+    def __init__(
+        self,
+        url: str,
+        token: str,
+        max_in_flight: int = ARIEL_MAX_IN_FLIGHT,
+        page_size: int = ARIEL_PAGE_SIZE,
+        poll_interval: float = ARIEL_POLL_INTERVAL_SECONDS,
+        verify_tls: bool = True,
+        timeout: float = HTTP_TIMEOUT_SECONDS,
+    ) -> None:
+        """
+        Schedules Ariel searches with a cap on concurrently running searches
+
+        The cap holds across all streams of the scheduler, so a scheduler
+        shared by parallel workflow steps or slices never runs more than
+        max_in_flight searches.
+
+        Args:
+        - url (str): Base URL of the QRadar console (e.g., 'https://qradar.example.com')
+        - token (str): Authorized service token sent in the SEC header
+        - max_in_flight (int): Maximum number of searches running at once
+        - page_size (int): Number of records fetched per Range request
+        - poll_interval (float): Seconds between search status polls
+        - verify_tls (bool): Whether to verify the server certificate
+        - timeout (float): Socket timeout in seconds
+        """
+
+        if max_in_flight <= 0 or page_size <= 0:
+            raise ValueError("max_in_flight and page_size must be positive")
+
+        self.scheme, self.host, self.port, self.base_path = parse_base_url(url)
+        self.max_in_flight = max_in_flight
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self.page_size = page_size
+        self.poll_interval = poll_interval
+        self.verify_tls = verify_tls
+        self.timeout = timeout
+        self.headers = {
+            "SEC": token,
+            "Version": ARIEL_API_VERSION,
+            "Accept": "application/json",
+        }
+
+    # ==========================================
+    # ARIEL API
+    # ==========================================
+
+    def _request(
+        self, method: str, path: str, headers: Optional[Dict[str, str]] = None
+    ) -> Any:
+        """
+        Sends a request to the Ariel API and decodes the JSON response
+
+        Args:
+        - method (str): The HTTP method
+        - path (str): The path below /api/ariel
+        - headers (Optional[Dict[str, str]]): Extra request headers
+
+        Returns:
+        - Any: The decoded response body
+        """
+
+        connection = open_connection(
+            self.scheme, self.host, self.port, self.timeout, self.verify_tls
+        )
+        try:
+            connection.request(
+                method,
+                f"{self.base_path}/api/ariel{path}",
+                headers={**self.headers, **(headers or {})},
+            )
+            response = connection.getresponse()
+            payload = response.read()
+        finally:
+            connection.close()
+
+        if response.status >= 300:
+            raise RuntimeError(
+                f"Ariel {method} {path} failed with status {response.status}: "
+                f"{payload[:200].decode(DEFAULT_ENCODING, 'replace')}"
+            )
+        return json.loads(payload) if payload else None
+
+    def _create_search(self, query: str) -> str:
+        """
+        Creates an Ariel search
+
+        Args:
+        - query (str): The AQL query to run
+
+        Returns:
+        - str: The id of the created search
+        """
+
+        response = self._request(
+            "POST", f"/searches?query_expression={quote(query, safe='')}"
+        )
+        return response["search_id"]
+
+    def _wait_for_search(self, search_id: str, cancelled: threading.Event) -> int:
+        """
+        Polls a search until it completes
+
+        Args:
+        - search_id (str): The id of the search
+        - cancelled (threading.Event): Set when the consumer stopped reading
+
+        Returns:
+        - int: Number of records produced by the search
+        """
+
+        while not cancelled.is_set():
+            status = self._request("GET", f"/searches/{search_id}")
+            match status.get("status"):
+                case "COMPLETED":
+                    return int(status.get("record_count", 0))
+                case "ERROR" | "CANCELED":
+                    raise RuntimeError(
+                        f"Ariel search {search_id} ended with status {status['status']}"
+                    )
+            time.sleep(self.poll_interval)
+        return 0
+
+    def _iter_pages(
+        self, search_id: str, record_count: int
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Fetches the results of a completed search page by page
+
+        Args:
+        - search_id (str): The id of the search
+        - record_count (int): Number of records produced by the search
+
+        Returns:
+        - Iterator[List[Dict[str, Any]]]: Pages of result records
+        """
+
+        for first in range(0, record_count, self.page_size):
+            last = min(first + self.page_size, record_count) - 1
+            response = self._request(
+                "GET",
+                f"/searches/{search_id}/results",
+                headers={"Range": f"items={first}-{last}"},
+            )
+            # Results are keyed by the queried database ('events' or 'flows')
+            yield next(
+                (value for value in response.values() if isinstance(value, list)),
+                [],
+            )
+
+    # ==========================================
+    # SCHEDULING
+    # ==========================================
+
+    def _run_search(
+        self, query: str, pages: queue.Queue, cancelled: threading.Event
+    ) -> None:
+        """
+        Runs one search and pushes its result pages onto the shared queue
+
+        Args:
+        - query (str): The AQL query to run
+        - pages (queue.Queue): Queue consumed by stream
+        - cancelled (threading.Event): Set when the consumer stopped reading
+        """
+
+        while not self._slots.acquire(timeout=self.poll_interval):
+            if cancelled.is_set():
+                self._put(pages, _DONE, cancelled)
+                return
+
+        search_id = None
+        try:
+            if cancelled.is_set():
+                return
+            search_id = self._create_search(query)
+            record_count = self._wait_for_search(search_id, cancelled)
+            received = 0
+            for page in self._iter_pages(search_id, record_count):
+                if not self._put(pages, page, cancelled):
+                    return
+                received += len(page)
+            if received != record_count:
+                raise RuntimeError(
+                    f"Ariel search {search_id} returned {received} of "
+                    f"{record_count} records"
+                )
+            logger.info(f"Ariel search {search_id} returned {record_count} records")
+        except Exception as e:
+            self._put(pages, e, cancelled)
+        finally:
+            if search_id is not None:
+                try:
+                    self._request("DELETE", f"/searches/{search_id}")
+                except Exception:
+                    logger.warning(f"Failed to delete Ariel search {search_id}")
+            self._slots.release()
+            self._put(pages, _DONE, cancelled)
+
+    def _put(self, pages: queue.Queue, item: Any, cancelled: threading.Event) -> bool:
+        """
+        Puts an item on the queue without blocking forever on an abandoned consumer
+
+        Args:
+        - pages (queue.Queue): Queue consumed by stream
+        - item (Any): A page, an exception or the completion marker
+        - cancelled (threading.Event): Set when the consumer stopped reading
+
+        Returns:
+        - bool: Whether the item was queued
+        """
+
+        while not cancelled.is_set():
+            try:
+                pages.put(item, timeout=self.poll_interval)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def stream(
+        self, queries: Iterable[str], dedupe: bool = True
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Runs queries with at most max_in_flight searches of the scheduler at once
+        and streams the merged results
+
+        Records are yielded in arrival order as pages complete, so results of
+        different searches interleave.
+
+        Args:
+        - queries (Iterable[str]): AQL queries to run
+        - dedupe (bool): Whether to skip queries equivalent to an earlier one
+
+        Returns:
+        - Iterator[Dict[str, Any]]: Result records of all searches
+        """
+
+        if dedupe:
+            queries = QueryDeduplicator("qradar").filter(queries)
+
+        pages: queue.Queue = queue.Queue(maxsize=ARIEL_RESULT_QUEUE_SIZE)
+        cancelled = threading.Event()
+        executor = ThreadPoolExecutor(
+            max_workers=self.max_in_flight, thread_name_prefix="ariel"
+        )
+        try:
+            pending = 0
+            for query in queries:
+                executor.submit(self._run_search, query, pages, cancelled)
+                pending += 1
+
+            while pending:
+                item = pages.get()
+                if item is _DONE:
+                    pending -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield from item
+        finally:
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stream_lookback(
+        self,
+        template: Dict[str, Any],
+        inputs: Dict[str, str],
+        duration: str,
+        base_queries: Dict[str, str],
+        slices: int = ARIEL_MAX_IN_FLIGHT,
+        end: Optional[datetime] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Splits a lookback into time slices searched in parallel
+        and streams the merged results
+
+        Args:
+        - template (Dict[str, Any]): A QRadar template
+        - inputs (Dict[str, str]): User-provided field values for optional parameters
+        - duration (str): A QRadar duration (e.g., "30 DAYS")
+        - base_queries (Dict[str, str]): The QRadar base queries
+        - slices (int): Number of time slices to split the lookback into
+        - end (Optional[datetime]): End of the lookback, defaults to now in UTC
+
+        Returns:
+        - Iterator[Dict[str, Any]]: Result records of all slices
+        """
+
+        sliced = build_sliced_queries(
+            template, inputs, duration, "qradar", base_queries, slices=slices, end=end
+        )
+        return self.stream(query for _, query in sliced)
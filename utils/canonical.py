@@ -0,0 +1,289 @@
+import hashlib
+import re
+from typing import Callable, Iterable, Iterator, List, Set
+
+from utils.query_ir import QUOTED, mask_quotes, split_conditions, split_pipeline
+from utils.ui_constants import DEFAULT_ENCODING
+
+"""
+Query canonicalization and deduplication
+"""
+
+COMPARISON = re.compile(r"\s*(==|!=|=~|!~|>=|<=|<>|=|<|>)\s*")
+
+KEYWORDS = {
+    "qradar": re.compile(
+        r"\b(select|from|where|and|or|not|ilike|like|imatches|matches|in|is|null"
+        r"|order by|group by|having|desc|asc|last|start|stop|limit|as"
+        r"|minutes?|hours?|days?|true|false)\b",
+        re.IGNORECASE,
+    ),
+    "defender": re.compile(
+        r"\b(where|and|or|not|has|has_any|contains|startswith|endswith|in~?"
+        r"|order by|desc|asc|project|summarize|by|take|top|ago|datetime|between)\b",
+        re.IGNORECASE,
+    ),
+    "elastic": re.compile(r"\b(and|or|not)\b", re.IGNORECASE),
+}
+
+# Operators whose operands compare case-insensitively
+CASE_INSENSITIVE_OPERATORS = {
+    "qradar": re.compile(r"(?:\bilike)\s*\(?\s*$", re.IGNORECASE),
+    "defender": re.compile(
+        r"(?:\b(?:has|has_any|contains|startswith|endswith|in~)|=~)\s*\(?\s*$",
+        re.IGNORECASE,
+    ),
+}
+
+# Clauses that end the commutative condition list of an AQL query
+QRADAR_TAIL = re.compile(
+    r"\b(order by|group by|having|last|start|limit)\b", re.IGNORECASE
+)
+QRADAR_WHERE = re.compile(r"\bwhere\b", re.IGNORECASE)
+
+
+def _map_unquoted(text: str, transform: Callable[[str], str]) -> str:
+    """
+    Applies a transformation to the parts of a query outside quoted literals
+
+    Args:
+    - text (str): The query text
+    - transform (Callable[[str], str]): The transformation to apply
+
+    Returns:
+    - str: The transformed text
+    """
+
+    pieces = QUOTED.split(text)
+    return "".join(
+        piece if i % 2 else transform(piece) for i, piece in enumerate(pieces)
+    )
+
+
+def _lowercase_case_insensitive_literals(text: str, platform: str) -> str:
+    """
+    Lowercases literals compared with case-insensitive operators
+
+    Args:
+    - text (str): The query text
+    - platform (str): The platform the query targets
+
+    Returns:
+    - str: The text with case-insensitive operands in lower case
+    """
+
+    operator = CASE_INSENSITIVE_OPERATORS.get(platform)
+    if operator is None:
+        return text
+
+    pieces = QUOTED.split(text)
+    in_list = False
+    lowercase_next = False
+    for i, piece in enumerate(pieces):
+        if i % 2:
+            if lowercase_next or in_list:
+                pieces[i] = piece.lower()
+            lowercase_next = False
+            continue
+        if in_list and ")" in piece:
+            in_list = False
+        if operator.search(piece):
+            lowercase_next = True
+            in_list = piece.rstrip().endswith("(")
+    return "".join(pieces)
+
+
+def _sort_conditions(expression: str) -> str:
+    """
+    Sorts and deduplicates the operands of a conjunction
+
+    Expressions with a top-level 'or' are left untouched, since 'and'
+    binds tighter and splitting them would change their meaning.
+
+    Args:
+    - expression (str): A condition expression
+
+    Returns:
+    - str: The expression with its 'and' operands in sorted order
+    """
+
+    if len(split_conditions(expression, "or")) > 1:
+        return expression
+    return " and ".join(sorted(set(split_conditions(expression))))
+
+
+def _canonicalize_qradar(query: str) -> str:
+    """
+    Sorts the where conditions of an AQL query
+
+    Args:
+    - query (str): A whitespace and keyword normalized AQL query
+
+    Returns:
+    - str: The canonical query
+    """
+
+    masked = mask_quotes(query)
+    where = QRADAR_WHERE.search(masked)
+    if not where:
+        return query
+
+    tail = QRADAR_TAIL.search(masked, where.end())
+    end = tail.start() if tail else len(query)
+    conditions = _sort_conditions(query[where.end() : end].strip())
+    return f"{query[: where.end()]} {conditions} {query[end:]}".strip()
+
+
+def _canonicalize_defender(query: str) -> str:
+    """
+    Merges consecutive where stages of a KQL query and sorts their conditions
+
+    Args:
+    - query (str): A whitespace and keyword normalized KQL query
+
+    Returns:
+    - str: The canonical query
+    """
+
+    stages: List[str] = []
+    pending: List[str] = []
+
+    def _flush() -> None:
+        if pending:
+            stages.append("where " + _sort_conditions(" and ".join(pending)))
+            pending.clear()
+
+    for stage in split_pipeline(query):
+        if stage.startswith("where "):
+            body = stage[len("where ") :]
+            if len(split_conditions(body, "or")) > 1:
+                body = f"({body})"
+            pending.append(body)
+        else:
+            _flush()
+            stages.append(stage)
+    _flush()
+
+    return " | ".join(stages)
+
+
+def canonicalize_query(query: str, platform: str) -> str:
+    """
+    Rewrites a query into a canonical form so that equivalent queries compare equal
+
+    Whitespace is collapsed, case-insensitive keywords and operands are
+    lowercased, and commutative 'and' conditions are sorted.
+
+    Args:
+    - query (str): A query produced by build_query
+    - platform (str): The platform the query targets ("qradar", "defender", "elastic")
+
+    Returns:
+    - str: The canonical query text
+    """
+
+    if platform not in KEYWORDS:
+        raise ValueError(
+            f"Unsupported platform '{platform}'. Must be 'elastic', 'defender', or 'qradar'"
+        )
+
+    keywords = KEYWORDS[platform]
+
+    def _normalize(piece: str) -> str:
+        piece = re.sub(r"\s+", " ", piece)
+        piece = COMPARISON.sub(r" \1 ", piece)
+        if platform == "elastic":
+            piece = re.sub(r"\s*:\s*", ": ", piece)
+        piece = re.sub(r"\s+", " ", piece)
+        return keywords.sub(lambda m: m.group(1).lower(), piece)
+
+    text = _map_unquoted(query.strip(), _normalize).strip()
+    text = _lowercase_case_insensitive_literals(text, platform)
+
+    match platform:
+        case "qradar":
+            return _canonicalize_qradar(text)
+        case "defender":
+            return _canonicalize_defender(text)
+        case _:
+            return _sort_conditions(text)
+
+
+def query_fingerprint(query: str, platform: str) -> str:
+    """
+    Hashes the canonical form of a query
+
+    Args:
+    - query (str): A query produced by build_query
+    - platform (str): The platform the query targets
+
+    Returns:
+    - str: A hex SHA-256 digest identifying the query
+    """
+
+    canonical = canonicalize_query(query, platform)
+    return hashlib.sha256(
+        f"{platform}\n{canonical}".encode(DEFAULT_ENCODING)
+    ).hexdigest()
+
+
+class QueryDeduplicator:
+    def __init__(self, platform: str) -> None:
+        """
+        Tracks fingerprints of dispatched queries to skip equivalent ones
+
+        Args:
+        - platform (str): The platform the queries target
+        """
+
+        self.platform = platform
+        self.seen: Set[str] = set()
+        self.skipped = 0
+
+    def is_duplicate(self, query: str) -> bool:
+        """
+        Checks a query against previously seen queries and records it
+
+        Args:
+        - query (str): A query produced by build_query
+
+        Returns:
+        - bool: True if an equivalent query was already seen
+        """
+
+        fingerprint = query_fingerprint(query, self.platform)
+        if fingerprint in self.seen:
+            self.skipped += 1
+            return True
+        self.seen.add(fingerprint)
+        return False
+
+    def filter(self, queries: Iterable[str]) -> Iterator[str]:
+        """
+        Yields only the first of each group of equivalent queries
+
+        Args:
+        - queries (Iterable[str]): Queries produced by build_query
+
+        Returns:
+        - Iterator[str]: The unique queries in their original form
+        """
+
+        for query in queries:
+            if not self.is_duplicate(query):
+                yield query
+
+
+def dedupe_queries(queries: Iterable[str], platform: str) -> Iterator[str]:
+    """
+    Skips queries that are equivalent to an earlier query
+
+    Args:
+    - queries (Iterable[str]): Queries produced by build_query
+    - platform (str): The platform the queries target
+
+    Returns:
+    - Iterator[str]: The unique queries in their original form
+    """
+
+    return QueryDeduplicator(platform).filter(queries)
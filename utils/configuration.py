@@ -1,19 +1,22 @@
-import ipaddress
 import os
 import re
 import sys
+from datetime import timedelta
 import logging
 from typing import Dict, Any, Literal, Tuple, Optional
 
 import questionary
 import yaml
 
+from utils.profiling import profiled
+from utils.validators import UnknownValidationError, get_validator, resolve_validators
 from utils.ui_constants import (
     DEFAULT_ENCODING,
     LOG_FORMAT,
     DEFAULT_LOGGER_NAME,
     VALID_PLATFORMS,
     DEFAULT_LOG_LEVEL,
+    TEMPLATES_DIR,
 )
 
 
@@ -47,6 +50,29 @@ def get_logger(
     return logger
 
 
+@profiled("template_load")
+def read_templates(platform: str, directory: str = TEMPLATES_DIR) -> Dict[str, Any]:
+    """
+    Reads the template file of a platform, raising instead of exiting on errors
+
+    The validator of every optional field is resolved here, once per load.
+
+    Args:
+    - platform (str): The SIEM platform name (e.g., 'qradar', 'elastic', 'defender')
+    - directory (str): Directory holding the '<platform>.yaml' template files
+
+    Returns:
+    - Dict[str, Any]: Parsed YAML template as a dictionary
+
+    Raises:
+    - UnknownValidationError: If an optional field names an unknown validation
+    """
+
+    file_path = os.path.join(directory, f"{platform.lower()}.yaml")
+    with open(file_path, "r", encoding=DEFAULT_ENCODING) as f:
+        return resolve_validators(yaml.safe_load(f))
+
+
 def load_templates(platform: str) -> Dict[str, Any]:
     """
     Loads templates for the specified SIEM platform
@@ -62,46 +88,40 @@ def load_templates(platform: str) -> Dict[str, Any]:
         print("Goodbye")
         sys.exit(1)
 
-    file_path = os.path.join("templates", f"{platform.lower()}.yaml")
+    file_path = os.path.join(TEMPLATES_DIR, f"{platform.lower()}.yaml")
     try:
-        with open(file_path, "r", encoding=DEFAULT_ENCODING) as f:
-            templates = yaml.safe_load(f)
-            return templates
+        return read_templates(platform)
     except FileNotFoundError:
         print(f"File not found. Check if you provided correct {file_path}")
         sys.exit(1)
     except IOError as e:
         print(f"I/O Error occurred when reading {file_path}: {e}")
         sys.exit(1)
+    except UnknownValidationError as e:
+        print(f"Invalid template in {file_path}: {e}")
+        sys.exit(1)
 
 
 def validate(value: str, val_type: Optional[str]) -> Tuple[bool, str]:
     """
     Validates a given value against a specific type
 
+    Template fields carry their resolved validator (see field_validator);
+    this looks one up by name for values outside templates.
+
     Args:
     - value (str): The value to validate (e.g., IP address or port)
     - val_type (Optional[str]): The type to validate against (e.g., 'ip', 'port', 'domain')
 
     Returns:
     - Tuple[bool, str]: Whether the value is valid with a result or error message
+
+    Raises:
+    - UnknownValidationError: If val_type is not a registered validation
     """
 
-    match val_type:
-        case "ip":
-            try:
-                ipaddress.ip_address(value)
-                return True, ""
-            except ValueError:
-                return False, "Invalid IP Address"
-        case "integer":
-            try:
-                int(value)
-                return True, ""
-            except ValueError:
-                return False, "Must be an integer"
-        case _:
-            return True, ""
+    validator = get_validator(val_type)
+    return validator(value) if validator is not None else (True, "")
 
 
 def resolve_platform_and_templates(
@@ -204,3 +224,35 @@ def normalize_lookback(lookback: str, platform: str) -> Optional[str]:
             return f"{value}d" if is_defender_or_elastic else f"{value} DAYS"
         case _:
             return None
+
+
+def lookback_to_timedelta(duration: str) -> Optional[timedelta]:
+    """
+    Converts a normalized lookback value back into a time span
+
+    Args:
+    - duration (str): A duration from normalize_lookback (e.g., "30 DAYS", "1h")
+
+    Returns:
+    - Optional[timedelta]: The span of the lookback, or None if invalid
+    """
+
+    match = re.fullmatch(
+        r"(\d+)\s*(minutes?|hours?|days?|min|m|h|d)", duration.strip().lower()
+    )
+
+    if not match:
+        return None
+
+    value, unit = int(match.group(1)), match.group(2)
+
+    if value <= 0:
+        return None
+
+    match unit[0]:
+        case "m":
+            return timedelta(minutes=value)
+        case "h":
+            return timedelta(hours=value)
+        case _:
+            return timedelta(days=value)
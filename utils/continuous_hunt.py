@@ -0,0 +1,483 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.configuration import get_logger, load_templates, lookback_to_timedelta
+from utils.generate_queries import build_query
+from utils.profiling import add_profiling_arguments, profiling_from_args
+from utils.time_slices import TimeSlice, split_window
+from utils.ui_constants import (
+    DEFAULT_ENCODING,
+    HUNT_BACKFILL_SLICE_MINUTES,
+    HUNT_INGEST_DELAY_SECONDS,
+    HUNT_MAX_PARALLEL_SLICES,
+    HUNT_MIN_SLICE_SECONDS,
+    HUNT_STATE_DB,
+    MSEARCH_DEFAULT_INDEX,
+)
+from utils.validators import field_validator
+from utils.workflow import RUNNER_PLATFORMS, Runner, build_runners
+
+"""
+Incremental continuous hunting with watermarks
+"""
+
+logger = get_logger()
+
+# Receives the rows of one searched slice
+RowHandler = Callable[[TimeSlice, List[Dict[str, Any]]], None]
+
+
+def hunt_key(platform: str, template_name: str, inputs: Dict[str, str]) -> str:
+    """
+    Identifies a hunt by its platform, template and inputs
+
+    Args:
+    - platform (str): The platform name
+    - template_name (str): The template name
+    - inputs (Dict[str, str]): The optional field values
+
+    Returns:
+    - str: A hex SHA-256 digest
+    """
+
+    payload = json.dumps([platform, template_name, inputs], sort_keys=True)
+    return hashlib.sha256(payload.encode(DEFAULT_ENCODING)).hexdigest()
+
+
+def parse_inputs(items: List[str], template: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Parses key=value optional field values and validates them against a template
+
+    Args:
+    - items (List[str]): The values given on the command line
+    - template (Dict[str, Any]): The template they are for
+
+    Returns:
+    - Dict[str, str]: The non-empty values, stripped
+
+    Raises:
+    - ValueError: If an item is malformed, names an unknown field or fails validation
+    """
+
+    optional_fields = template.get("optional_fields", {})
+    inputs = {}
+    for item in items:
+        key, separator, value = item.partition("=")
+        if not separator:
+            raise ValueError(f"Invalid --input '{item}', expected key=value")
+        if key not in optional_fields:
+            raise ValueError(f"Template has no optional field '{key}'")
+        value = value.strip()
+        if not value:
+            continue
+        validator = field_validator(optional_fields[key])
+        if validator is not None:
+            valid, msg = validator(value)
+            if not valid:
+                raise ValueError(f"Invalid input for {key}: {msg}")
+        inputs[key] = value
+    return inputs
+
+
+class WatermarkStore:
+    def __init__(self, path: str = HUNT_STATE_DB) -> None:
+        """
+        SQLite store of the end of the last searched window of each hunt
+
+        Args:
+        - path (str): Path to the SQLite database, created with its directory if missing
+        """
+
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS watermarks (
+                    hunt TEXT PRIMARY KEY,
+                    platform TEXT NOT NULL,
+                    template TEXT NOT NULL,
+                    inputs TEXT NOT NULL,
+                    watermark TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+                """)
+
+    def get(
+        self, platform: str, template_name: str, inputs: Dict[str, str]
+    ) -> Optional[datetime]:
+        """
+        Reads the watermark of a hunt
+
+        Args:
+        - platform (str): The platform name
+        - template_name (str): The template name
+        - inputs (Dict[str, str]): The optional field values
+
+        Returns:
+        - Optional[datetime]: End of the last searched window, None for a new hunt
+        """
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT watermark FROM watermarks WHERE hunt = ?",
+                (hunt_key(platform, template_name, inputs),),
+            ).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def set(
+        self,
+        platform: str,
+        template_name: str,
+        inputs: Dict[str, str],
+        watermark: datetime,
+    ) -> None:
+        """
+        Stores the watermark of a hunt
+
+        Args:
+        - platform (str): The platform name
+        - template_name (str): The template name
+        - inputs (Dict[str, str]): The optional field values
+        - watermark (datetime): End of the last searched window
+        """
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                """
+                INSERT INTO watermarks
+                    (hunt, platform, template, inputs, watermark, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(hunt) DO UPDATE SET
+                    watermark = excluded.watermark, updated_at = excluded.updated_at
+                """,
+                (
+                    hunt_key(platform, template_name, inputs),
+                    platform,
+                    template_name,
+                    json.dumps(inputs, sort_keys=True),
+                    watermark.astimezone(timezone.utc).isoformat(),
+                    datetime.now(timezone.utc).isoformat(),
+                ),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class IncompleteSliceError(RuntimeError):
+    """
+    Raised when a slice cannot be searched without hitting the template's limit
+    """
+
+
+@dataclass
+class HuntRun:
+    """
+    Outcome of one incremental run of a hunt
+    """
+
+    start: datetime
+    end: datetime
+    slices: List[TimeSlice] = field(default_factory=list)
+    rows: int = 0
+    watermark: Optional[datetime] = None
+    error: Optional[Exception] = None
+
+
+class ContinuousHunt:
+    def __init__(
+        self,
+        store: WatermarkStore,
+        runner: Runner,
+        platform: str,
+        template_name: str,
+        template: Dict[str, Any],
+        base_queries: Dict[str, str],
+        inputs: Optional[Dict[str, str]] = None,
+        include_post_pipeline: bool = False,
+        ingest_delay: timedelta = timedelta(seconds=HUNT_INGEST_DELAY_SECONDS),
+        max_slice: timedelta = timedelta(minutes=HUNT_BACKFILL_SLICE_MINUTES),
+        max_parallel_slices: int = HUNT_MAX_PARALLEL_SLICES,
+        min_slice: timedelta = timedelta(seconds=HUNT_MIN_SLICE_SECONDS),
+    ) -> None:
+        """
+        Re-runs a template over the time elapsed since its last successful run
+
+        Args:
+        - store (WatermarkStore): Store of the hunt watermarks
+        - runner (Runner): Runs queries of the platform and returns their rows
+        - platform (str): The platform of the template
+        - template_name (str): The template name, part of the watermark key
+        - template (Dict[str, Any]): The template
+        - base_queries (Dict[str, str]): The base queries of the platform
+        - inputs (Optional[Dict[str, str]]): The optional field values
+        - include_post_pipeline (bool): Whether to include the Defender post_pipeline
+        - ingest_delay (timedelta): Lag behind now, so late-indexed events are found
+        - max_slice (timedelta): Maximum span of one search, longer gaps are split
+        - max_parallel_slices (int): Maximum number of slices searched at once
+        - min_slice (timedelta): Shortest part a slice truncated by the limit is split into
+        """
+
+        if (
+            max_slice <= timedelta(0)
+            or max_parallel_slices <= 0
+            or min_slice <= timedelta(0)
+        ):
+            raise ValueError(
+                "max_slice, max_parallel_slices and min_slice must be positive"
+            )
+
+        self.store = store
+        self.runner = runner
+        self.platform = platform
+        self.template_name = template_name
+        self.template = template
+        self.base_queries = base_queries
+        self.inputs = inputs or {}
+        self.include_post_pipeline = include_post_pipeline
+        self.ingest_delay = ingest_delay
+        self.max_slice = max_slice
+        self.max_parallel_slices = max_parallel_slices
+        self.min_slice = min_slice
+
+    def _search(self, window: TimeSlice) -> List[Dict[str, Any]]:
+        """
+        Searches one slice and verifies that its rows are complete
+
+        The runner raises on failed searches. A slice returning as many rows as
+        the template's limit may have been truncated, so it is searched again
+        in halves until every part comes back under the limit.
+
+        Args:
+        - window (TimeSlice): The (start, end) bounds of the slice
+
+        Returns:
+        - List[Dict[str, Any]]: All rows of the slice, oldest part first
+
+        Raises:
+        - IncompleteSliceError: If a part of min_slice or less still reaches the limit
+        """
+
+        query = build_query(
+            self.template,
+            self.inputs,
+            "",
+            self.platform,
+            self.base_queries,
+            self.include_post_pipeline,
+            time_range=window,
+        )
+        limit = self.template.get("limit")
+        rows = list(self.runner([query], limit))
+        if limit is None or len(rows) < limit:
+            return rows
+
+        if window[1] - window[0] <= self.min_slice:
+            raise IncompleteSliceError(
+                f"{window[0]:%Y-%m-%d %H:%M:%S} - {window[1]:%Y-%m-%d %H:%M:%S} UTC "
+                f"reached the template limit of {limit} rows"
+            )
+        rows = []
+        for part in split_window(window[0], window[1], 2):
+            rows.extend(self._search(part))
+        return rows
+
+    def run_once(
+        self,
+        initial_lookback: timedelta,
+        on_rows: Optional[RowHandler] = None,
+        now: Optional[datetime] = None,
+    ) -> HuntRun:
+        """
+        Searches the window between the watermark and now, then advances the watermark
+
+        Gaps longer than max_slice (e.g., after downtime) are split into
+        slices searched in parallel. The watermark only moves past slices
+        that, together with all earlier ones, were searched completely and
+        whose rows were handed to on_rows.
+
+        Args:
+        - initial_lookback (timedelta): Window searched when the hunt never ran
+        - on_rows (Optional[RowHandler]): Receives the rows of each slice, oldest first
+        - now (Optional[datetime]): Current time, defaults to now in UTC
+
+        Returns:
+        - HuntRun: The searched window, row count and new watermark
+        """
+
+        end = (now or datetime.now(timezone.utc)) - self.ingest_delay
+        watermark = self.store.get(self.platform, self.template_name, self.inputs)
+        start = watermark or end - initial_lookback
+        run = HuntRun(start, end, watermark=watermark)
+        if end <= start:
+            return run
+
+        count = -(-(end - start) // self.max_slice)  # Ceiling division
+        run.slices = split_window(start, end, count)
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_parallel_slices, count), thread_name_prefix="hunt"
+        ) as executor:
+            futures = [executor.submit(self._search, window) for window in run.slices]
+            for window, future in zip(run.slices, futures):
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    logger.error(
+                        f"Hunt {self.template_name} failed for "
+                        f"{window[0]:%Y-%m-%d %H:%M} - "
+                        f"{window[1]:%Y-%m-%d %H:%M} UTC: {e}"
+                    )
+                    run.error = e
+                    for pending in futures:
+                        pending.cancel()
+                    break
+                if on_rows is not None:
+                    on_rows(window, rows)
+                run.rows += len(rows)
+                run.watermark = window[1]
+                self.store.set(
+                    self.platform, self.template_name, self.inputs, window[1]
+                )
+        return run
+
+    def run_forever(
+        self,
+        interval: timedelta,
+        initial_lookback: timedelta,
+        on_rows: Optional[RowHandler] = None,
+        stop: Optional[threading.Event] = None,
+    ) -> None:
+        """
+        Runs the hunt every interval until stopped
+
+        Args:
+        - interval (timedelta): Time between runs
+        - initial_lookback (timedelta): Window searched when the hunt never ran
+        - on_rows (Optional[RowHandler]): Receives the rows of each slice
+        - stop (Optional[threading.Event]): Set to stop after the current run
+        """
+
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            run = self.run_once(initial_lookback, on_rows)
+            logger.info(
+                f"Hunt {self.template_name}: {run.rows} rows in "
+                f"{len(run.slices)} slice(s), "
+                f"watermark {run.watermark:%Y-%m-%d %H:%M:%S} UTC"
+                if run.watermark
+                else f"Hunt {self.template_name}: nothing searched"
+            )
+            stop.wait(interval.total_seconds())
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs a template continuously, searching only new time each run
+
+    Args:
+    - argv (Optional[List[str]]): Command line arguments, defaults to sys.argv
+
+    Returns:
+    - int: 0 on success, 1 on invalid arguments or a failed run
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.continuous_hunt",
+        description="Incrementally re-run a template with a stored watermark",
+    )
+    parser.add_argument("--platform", choices=RUNNER_PLATFORMS, required=True)
+    parser.add_argument("--template", required=True)
+    parser.add_argument(
+        "--input",
+        action="append",
+        default=[],
+        help="Optional field value as key=value (repeatable)",
+    )
+    parser.add_argument(
+        "--interval", default="5m", help="Time between runs (default 5m)"
+    )
+    parser.add_argument(
+        "--initial-lookback", default="1h", help="Window of the first run (default 1h)"
+    )
+    parser.add_argument(
+        "--once", action="store_true", help="Run a single increment and exit"
+    )
+    parser.add_argument("--db", default=HUNT_STATE_DB, help="Watermark database")
+    parser.add_argument("--output", help="Append result rows to this NDJSON file")
+    parser.add_argument("--qradar-url")
+    parser.add_argument("--qradar-token")
+    parser.add_argument("--elastic-url")
+    parser.add_argument("--elastic-api-key")
+    parser.add_argument("--elastic-index", default=MSEARCH_DEFAULT_INDEX)
+    add_profiling_arguments(parser)
+    args = parser.parse_args(argv)
+
+    interval = lookback_to_timedelta(args.interval)
+    initial_lookback = lookback_to_timedelta(args.initial_lookback)
+    if interval is None or initial_lookback is None:
+        parser.error("Invalid --interval or --initial-lookback")
+
+    templates = load_templates(args.platform)
+    template = templates.get(args.template)
+    if not isinstance(template, dict) or args.template == "base_queries":
+        parser.error(f"Unknown template '{args.template}' for {args.platform}")
+
+    try:
+        inputs = parse_inputs(args.input, template)
+    except ValueError as e:
+        parser.error(str(e))
+
+    runner = build_runners(
+        args.qradar_url,
+        args.qradar_token,
+        args.elastic_url,
+        args.elastic_api_key,
+        args.elastic_index,
+    ).get(args.platform)
+    if runner is None:
+        parser.error(f"No connection details given for {args.platform}")
+
+    def write_rows(window: TimeSlice, rows: List[Dict[str, Any]]) -> None:
+        if args.output:
+            with open(args.output, "a", encoding=DEFAULT_ENCODING) as f:
+                for row in rows:
+                    f.write(json.dumps(row, default=str) + "\n")
+
+    store = WatermarkStore(args.db)
+    hunt = ContinuousHunt(
+        store,
+        runner,
+        args.platform,
+        args.template,
+        template,
+        templates.get("base_queries", {}),
+        inputs,
+    )
+    try:
+        with profiling_from_args(args):
+            if args.once:
+                run = hunt.run_once(initial_lookback, write_rows)
+                print(f"{run.rows} rows in {len(run.slices)} slice(s)")
+                return 1 if run.error else 0
+            hunt.run_forever(interval, initial_lookback, write_rows)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
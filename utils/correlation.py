@@ -0,0 +1,419 @@
+import argparse
+import ipaddress
+import json
+import os
+import re
+import sys
+import tempfile
+import zlib
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+)
+
+from utils.analysis import iter_records, parse_timestamp
+from utils.configuration import lookback_to_timedelta
+from utils.ui_constants import (
+    CORRELATION_MAX_BUILD_ROWS,
+    CORRELATION_SPILL_PARTITIONS,
+    DEFAULT_ENCODING,
+)
+
+"""
+Cross-platform correlation of exported results
+"""
+
+Row = Dict[str, Any]
+# Normalised key, event time (None without a time column) and the original row
+KeyedRow = Tuple[str, Optional[float], Row]
+
+
+def normalize_ip(value: Any) -> Optional[str]:
+    """
+    Normalises an IP address, dropping ports and IPv4-mapped IPv6 prefixes
+
+    Args:
+    - value (Any): The raw value (e.g., "10.0.0.1", "10.0.0.1:443", "::ffff:10.0.0.1")
+
+    Returns:
+    - Optional[str]: The compressed address, or None if the value is not an IP
+    """
+
+    text = str(value).strip()
+    match = re.fullmatch(r"\[([^\]]+)\](?::\d+)?|(\d{1,3}(?:\.\d{1,3}){3}):\d+", text)
+    if match:
+        text = match.group(1) or match.group(2)
+    try:
+        address = ipaddress.ip_address(text)
+    except ValueError:
+        return None
+    if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return address.compressed
+
+
+def normalize_username(value: Any) -> Optional[str]:
+    """
+    Normalises a username to its lowercase account name
+
+    'DOMAIN\\user' (QRadar, Windows) and 'user@domain' (Defender UPNs) both
+    become 'user'.
+
+    Args:
+    - value (Any): The raw value
+
+    Returns:
+    - Optional[str]: The account name, or None if empty
+    """
+
+    text = str(value).strip().lower()
+    text = text.rsplit("\\", 1)[-1].split("@", 1)[0]
+    return text or None
+
+
+def normalize_host(value: Any) -> Optional[str]:
+    """
+    Normalises a host name to its lowercase short name
+
+    Args:
+    - value (Any): The raw value (e.g., "WS01.corp.local")
+
+    Returns:
+    - Optional[str]: The short host name, or the address if the value is an IP
+    """
+
+    ip = normalize_ip(value)
+    if ip is not None:
+        return ip
+    text = str(value).strip().lower().rstrip(".")
+    return text.split(".", 1)[0] or None
+
+
+def normalize_domain(value: Any) -> Optional[str]:
+    """
+    Normalises a domain, accepting bare names and URLs
+
+    Args:
+    - value (Any): The raw value (e.g., "https://WWW.Example.com/path", "example.com.")
+
+    Returns:
+    - Optional[str]: The lowercase domain without scheme, port, path or 'www.' prefix
+    """
+
+    text = str(value).strip().lower()
+    text = re.sub(r"^[a-z][a-z0-9+.-]*://", "", text)
+    text = re.split(r"[/?#]", text, maxsplit=1)[0]
+    text = text.rsplit("@", 1)[-1].split(":", 1)[0].rstrip(".")
+    if text.startswith("www."):
+        text = text[4:]
+    return text or None
+
+
+KEY_NORMALIZERS: Dict[str, Callable[[Any], Optional[str]]] = {
+    "ip": normalize_ip,
+    "username": normalize_username,
+    "host": normalize_host,
+    "domain": normalize_domain,
+}
+
+
+@dataclass(frozen=True)
+class JoinSide:
+    """
+    One input of a correlation: an export and the columns to join it on
+    """
+
+    path: str
+    key_column: str
+    time_column: Optional[str] = None
+
+
+def iter_keyed_rows(
+    rows: Iterable[Row],
+    key_column: str,
+    normalizer: Callable[[Any], Optional[str]],
+    time_column: Optional[str] = None,
+) -> Iterator[KeyedRow]:
+    """
+    Attaches the normalised join key and event time to rows
+
+    Rows without a usable key, or without a timestamp when a time column is
+    given, cannot match and are skipped.
+
+    Args:
+    - rows (Iterable[Row]): The rows of one side
+    - key_column (str): Column holding the join key
+    - normalizer (Callable[[Any], Optional[str]]): Key normaliser
+    - time_column (Optional[str]): Column holding the event timestamp
+
+    Returns:
+    - Iterator[KeyedRow]: The rows with their key and event time
+    """
+
+    for row in rows:
+        raw = row.get(key_column)
+        key = normalizer(raw) if raw is not None else None
+        if key is None:
+            continue
+        moment = None
+        if time_column is not None:
+            parsed = parse_timestamp(row.get(time_column))
+            if parsed is None:
+                continue
+            moment = parsed.timestamp()
+        yield key, moment, row
+
+
+class _HashTable:
+    """
+    In-memory build side, with rows of a key sorted by time for windowed probes
+    """
+
+    def __init__(self, rows: Iterable[KeyedRow]) -> None:
+        self.buckets: Dict[str, List[Tuple[float, Row]]] = {}
+        for key, moment, row in rows:
+            self.buckets.setdefault(key, []).append((moment or 0.0, row))
+        for bucket in self.buckets.values():
+            bucket.sort(key=lambda entry: entry[0])
+        self.times = {
+            key: [moment for moment, _ in bucket]
+            for key, bucket in self.buckets.items()
+        }
+
+    def probe(
+        self, key: str, moment: Optional[float], window: Optional[float]
+    ) -> Iterator[Row]:
+        bucket = self.buckets.get(key)
+        if not bucket:
+            return
+        if window is None or moment is None:
+            for _, row in bucket:
+                yield row
+            return
+        times = self.times[key]
+        low = bisect_left(times, moment - window)
+        high = bisect_right(times, moment + window)
+        for _, row in bucket[low:high]:
+            yield row
+
+
+def _partition(key: str, partitions: int) -> int:
+    return zlib.crc32(key.encode(DEFAULT_ENCODING)) % partitions
+
+
+def _spill(
+    rows: Iterable[KeyedRow], directory: str, prefix: str, partitions: int
+) -> List[str]:
+    """
+    Writes keyed rows to one NDJSON file per hash partition
+
+    Args:
+    - rows (Iterable[KeyedRow]): The rows to spill
+    - directory (str): Directory receiving the partition files
+    - prefix (str): File name prefix of the side
+    - partitions (int): Number of partitions
+
+    Returns:
+    - List[str]: The partition file paths, indexed by partition
+    """
+
+    paths = [os.path.join(directory, f"{prefix}-{i}.ndjson") for i in range(partitions)]
+    handles: List[TextIO] = [
+        open(path, "w", encoding=DEFAULT_ENCODING) for path in paths
+    ]
+    try:
+        for key, moment, row in rows:
+            handles[_partition(key, partitions)].write(
+                json.dumps([key, moment, row], default=str) + "\n"
+            )
+    finally:
+        for handle in handles:
+            handle.close()
+    return paths
+
+
+def _read_spilled(path: str) -> Iterator[KeyedRow]:
+    with open(path, "r", encoding=DEFAULT_ENCODING) as handle:
+        for line in handle:
+            key, moment, row = json.loads(line)
+            yield key, moment, row
+
+
+def hash_join(
+    build: Iterable[KeyedRow],
+    probe: Iterable[KeyedRow],
+    window: Optional[timedelta] = None,
+    max_build_rows: int = CORRELATION_MAX_BUILD_ROWS,
+    partitions: int = CORRELATION_SPILL_PARTITIONS,
+) -> Iterator[Tuple[str, Row, Row]]:
+    """
+    Joins two keyed row streams on equal keys, optionally within a time window
+
+    The build side is held in a hash table and the probe side is streamed
+    against it. Once the build side exceeds max_build_rows, both sides are
+    hash-partitioned to temporary files and joined one partition at a time.
+
+    Args:
+    - build (Iterable[KeyedRow]): The smaller side
+    - probe (Iterable[KeyedRow]): The larger side, streamed once
+    - window (Optional[timedelta]): Maximum time difference between matched rows
+    - max_build_rows (int): Build-side rows held in memory before spilling
+    - partitions (int): Number of spill partitions
+
+    Returns:
+    - Iterator[Tuple[str, Row, Row]]: The key with the matched build and probe rows
+    """
+
+    seconds = window.total_seconds() if window is not None else None
+    build = iter(build)
+    buffered: List[KeyedRow] = []
+    for keyed in build:
+        buffered.append(keyed)
+        if len(buffered) > max_build_rows:
+            break
+    else:
+        table = _HashTable(buffered)
+        del buffered
+        for key, moment, row in probe:
+            for match in table.probe(key, moment, seconds):
+                yield key, match, row
+        return
+
+    with tempfile.TemporaryDirectory(prefix="threatqueryx-join-") as directory:
+        build_paths = _spill(
+            (row for rows in (buffered, build) for row in rows),
+            directory,
+            "build",
+            partitions,
+        )
+        del buffered
+        probe_paths = _spill(probe, directory, "probe", partitions)
+        for build_path, probe_path in zip(build_paths, probe_paths):
+            table = _HashTable(_read_spilled(build_path))
+            if not table.buckets:
+                continue
+            for key, moment, row in _read_spilled(probe_path):
+                for match in table.probe(key, moment, seconds):
+                    yield key, match, row
+
+
+def correlate(
+    left: JoinSide,
+    right: JoinSide,
+    key: str,
+    window: Optional[timedelta] = None,
+    max_build_rows: int = CORRELATION_MAX_BUILD_ROWS,
+) -> Iterator[Tuple[str, Row, Row]]:
+    """
+    Correlates two exports, e.g. a Defender logon export with a QRadar firewall export
+
+    The left export is the build side and should be the smaller one.
+
+    Args:
+    - left (JoinSide): The build-side export
+    - right (JoinSide): The probe-side export
+    - key (str): Key type to normalise ("ip", "username", "host", "domain")
+    - window (Optional[timedelta]): Maximum time difference, requires time columns on both sides
+    - max_build_rows (int): Build-side rows held in memory before spilling
+
+    Returns:
+    - Iterator[Tuple[str, Row, Row]]: The normalised key with the matched left and right rows
+    """
+
+    normalizer = KEY_NORMALIZERS.get(key)
+    if normalizer is None:
+        raise ValueError(
+            f"Unsupported key '{key}'. Must be one of: {', '.join(KEY_NORMALIZERS)}"
+        )
+    if window is not None and (left.time_column is None or right.time_column is None):
+        raise ValueError("A time window requires a time column on both sides")
+
+    time_columns = (
+        (left.time_column, right.time_column) if window is not None else (None, None)
+    )
+    build = iter_keyed_rows(
+        iter_records(left.path), left.key_column, normalizer, time_columns[0]
+    )
+    probe = iter_keyed_rows(
+        iter_records(right.path), right.key_column, normalizer, time_columns[1]
+    )
+    yield from hash_join(build, probe, window, max_build_rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Correlates two exports and writes the matches as NDJSON
+
+    Args:
+    - argv (Optional[List[str]]): Command line arguments, defaults to sys.argv
+
+    Returns:
+    - int: 0 on success, 1 if the exports could not be correlated
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.correlation",
+        description="Join two exported result files on a normalised key",
+    )
+    parser.add_argument(
+        "left", help="Smaller export, held in memory (CSV, JSON or NDJSON)"
+    )
+    parser.add_argument("right", help="Larger export, streamed")
+    parser.add_argument("--key", choices=list(KEY_NORMALIZERS), required=True)
+    parser.add_argument(
+        "--left-column", required=True, help="Key column of the left export"
+    )
+    parser.add_argument(
+        "--right-column", required=True, help="Key column of the right export"
+    )
+    parser.add_argument("--left-time", help="Timestamp column of the left export")
+    parser.add_argument("--right-time", help="Timestamp column of the right export")
+    parser.add_argument("--window", help="Maximum time difference (e.g., 5m, 1h)")
+    parser.add_argument("--output", help="Write matches to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    window = None
+    if args.window:
+        window = lookback_to_timedelta(args.window)
+        if window is None:
+            parser.error(f"Invalid window '{args.window}'")
+
+    left = JoinSide(args.left, args.left_column, args.left_time)
+    right = JoinSide(args.right, args.right_column, args.right_time)
+
+    output = (
+        open(args.output, "w", encoding=DEFAULT_ENCODING) if args.output else sys.stdout
+    )
+    matches = 0
+    try:
+        for key, left_row, right_row in correlate(left, right, args.key, window):
+            output.write(
+                json.dumps(
+                    {"key": key, "left": left_row, "right": right_row}, default=str
+                )
+                + "\n"
+            )
+            matches += 1
+    except (OSError, ValueError) as e:
+        print(f"Failed to correlate: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"{matches} correlated pairs", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
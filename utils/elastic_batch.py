@@ -0,0 +1,521 @@
+import base64
+import http.client
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from utils.canonical import QueryDeduplicator
+from utils.configuration import get_logger
+from utils.query_ir import split_conditions
+from utils.http_client import open_connection, parse_base_url
+from utils.ui_constants import (
+    DEFAULT_ENCODING,
+    ELASTIC_PAGE_SIZE,
+    ELASTIC_PIT_KEEP_ALIVE,
+    HTTP_TIMEOUT_SECONDS,
+    MSEARCH_DEFAULT_INDEX,
+    MSEARCH_MAX_BYTES,
+    MSEARCH_MAX_COUNT,
+)
+
+logger = get_logger()
+
+"""
+Elastic _msearch batching
+"""
+
+TIMESTAMP_CONDITION = re.compile(
+    r'^@timestamp\s*(>=|>|<=|<)\s*"?([^"\s]+)"?$', re.IGNORECASE
+)
+BOOLEAN_KEYWORD = re.compile(r"(?<![\w.])(and|or|not)(?![\w.])", re.IGNORECASE)
+RANGE_OPERATORS = {">=": "gte", ">": "gt", "<=": "lte", "<": "lt"}
+
+# A batch entry is a query paired with its encoded NDJSON header and body lines
+BatchEntry = Tuple[str, bytes, bytes]
+
+
+class MsearchError(RuntimeError):
+    """
+    Raised when a search of an _msearch batch failed, although the request succeeded
+    """
+
+    def __init__(self, query: str, status: Any, reason: str) -> None:
+        super().__init__(
+            f"Search failed with status {status}: {reason} (query: {query[:200]})"
+        )
+        self.query = query
+        self.status = status
+        self.reason = reason
+
+
+def check_response(query: str, response: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Raises if a single _msearch response is an error instead of a result
+
+    _msearch answers 200 even when some of its searches fail, reporting the
+    failure in the item itself, so a failed search must not be read as "no hits".
+
+    Args:
+    - query (str): The query of the search
+    - response (Dict[str, Any]): Its item of the _msearch responses
+
+    Returns:
+    - Dict[str, Any]: The response, unchanged
+
+    Raises:
+    - MsearchError: If the item carries an error, a failing status or partial results
+    """
+
+    status = response.get("status", 200)
+    error = response.get("error")
+    if error is None and isinstance(status, int) and status < 400:
+        # Timed out or failed shards leave the hits silently incomplete
+        if response.get("timed_out"):
+            raise MsearchError(query, status, "search timed out with partial results")
+        failed = response.get("_shards", {}).get("failed", 0)
+        if failed:
+            raise MsearchError(query, status, f"{failed} shards failed")
+        return response
+    if isinstance(error, dict):
+        cause = error.get("root_cause") or [error]
+        reason = "; ".join(
+            f"{item.get('type', 'error')}: {item.get('reason', '')}"
+            for item in cause
+            if isinstance(item, dict)
+        )
+    else:
+        reason = str(error or "unknown error")
+    raise MsearchError(query, status, reason)
+
+
+def _uppercase_keywords(clause: str) -> str:
+    """
+    Uppercases boolean keywords outside quoted strings, as required by query_string
+
+    Args:
+    - clause (str): A single Elastic condition
+
+    Returns:
+    - str: The condition with 'and', 'or' and 'not' operators in upper case
+    """
+
+    pieces = re.split(r'("(?:[^"\\]|\\.)*")', clause)
+    return "".join(
+        (
+            piece
+            if piece.startswith('"')
+            else BOOLEAN_KEYWORD.sub(lambda m: m.group(1).upper(), piece)
+        )
+        for piece in pieces
+    )
+
+
+def to_search_body(
+    query: str,
+    size: Optional[int] = None,
+    source: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Translates a query produced by build_query into an Elasticsearch search body
+
+    Time conditions on @timestamp become range filters, the remaining
+    conditions are joined into a single query_string clause.
+
+    Args:
+    - query (str): The Elastic query string from build_query
+    - size (Optional[int]): Maximum number of hits to return
+    - source (Optional[List[str]]): Fields to include in _source
+
+    Returns:
+    - Dict[str, Any]: A search request body
+    """
+
+    clauses = []
+    time_range: Dict[str, str] = {}
+    for clause in split_conditions(query):
+        match = TIMESTAMP_CONDITION.match(clause)
+        if match:
+            operator, value = match.groups()
+            time_range[RANGE_OPERATORS[operator]] = value
+        elif clause != "*":
+            clauses.append(_uppercase_keywords(clause))
+
+    bool_query: Dict[str, Any] = {
+        "must": [
+            {
+                "query_string": {
+                    "query": " AND ".join(clauses) if clauses else "*",
+                    "analyze_wildcard": True,
+                }
+            }
+        ]
+    }
+    if time_range:
+        bool_query["filter"] = [{"range": {"@timestamp": time_range}}]
+
+    body: Dict[str, Any] = {"query": {"bool": bool_query}}
+    if size is not None:
+        body["size"] = size
+    if source is not None:
+        body["_source"] = source
+    return body
+
+
+def encode_entry(
+    query: str,
+    index: str = MSEARCH_DEFAULT_INDEX,
+    size: Optional[int] = None,
+    source: Optional[List[str]] = None,
+) -> BatchEntry:
+    """
+    Encodes a query as the header and body lines of an _msearch request
+
+    Args:
+    - query (str): The Elastic query string from build_query
+    - index (str): The index pattern to search
+    - size (Optional[int]): Maximum number of hits to return
+    - source (Optional[List[str]]): Fields to include in _source
+
+    Returns:
+    - BatchEntry: The query with its encoded NDJSON header and body lines
+    """
+
+    header = json.dumps({"index": index}, separators=(",", ":")) + "\n"
+    body = json.dumps(to_search_body(query, size, source), separators=(",", ":"))
+    return (
+        query,
+        header.encode(DEFAULT_ENCODING),
+        (body + "\n").encode(DEFAULT_ENCODING),
+    )
+
+
+def batch_queries(
+    queries: Iterable[str],
+    index: str = MSEARCH_DEFAULT_INDEX,
+    max_count: int = MSEARCH_MAX_COUNT,
+    max_bytes: int = MSEARCH_MAX_BYTES,
+    size: Optional[int] = None,
+    source: Optional[List[str]] = None,
+) -> Iterator[List[BatchEntry]]:
+    """
+    Groups queries into _msearch batches bounded by count and encoded size
+
+    A single query larger than max_bytes is emitted on its own batch.
+
+    Args:
+    - queries (Iterable[str]): Elastic query strings from build_query
+    - index (str): The index pattern to search
+    - max_count (int): Maximum number of searches per batch
+    - max_bytes (int): Maximum NDJSON body size per batch
+    - size (Optional[int]): Maximum number of hits to return per search
+    - source (Optional[List[str]]): Fields to include in _source
+
+    Returns:
+    - Iterator[List[BatchEntry]]: Batches of encoded entries
+    """
+
+    if max_count <= 0 or max_bytes <= 0:
+        raise ValueError("max_count and max_bytes must be positive")
+
+    batch: List[BatchEntry] = []
+    batch_bytes = 0
+    for query in queries:
+        entry = encode_entry(query, index, size, source)
+        entry_bytes = len(entry[1]) + len(entry[2])
+        if batch and (len(batch) >= max_count or batch_bytes + entry_bytes > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(entry)
+        batch_bytes += entry_bytes
+
+    if batch:
+        yield batch
+
+
+def iter_msearch_body(batch: List[BatchEntry]) -> Iterator[bytes]:
+    """
+    Streams the NDJSON body of an _msearch request one line at a time
+
+    Args:
+    - batch (List[BatchEntry]): A batch produced by batch_queries
+
+    Returns:
+    - Iterator[bytes]: Header and body lines in request order
+    """
+
+    for _, header, body in batch:
+        yield header
+        yield body
+
+
+class MsearchClient:
+    def __init__(
+        self,
+        url: str,
+        index: str = MSEARCH_DEFAULT_INDEX,
+        api_key: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        verify_tls: bool = True,
+        timeout: float = HTTP_TIMEOUT_SECONDS,
+    ) -> None:
+        """
+        Client sending batched searches to an Elasticsearch _msearch endpoint
+
+        Args:
+        - url (str): Base URL of the cluster (e.g., 'https://localhost:9200')
+        - index (str): The index pattern to search
+        - api_key (Optional[str]): Encoded API key for ApiKey authentication
+        - username (Optional[str]): Username for basic authentication
+        - password (Optional[str]): Password for basic authentication
+        - verify_tls (bool): Whether to verify the server certificate
+        - timeout (float): Socket timeout in seconds
+        """
+
+        self.scheme, self.host, self.port, self.base_path = parse_base_url(url)
+        self.path = self.base_path + "/_msearch"
+        self.index = index
+        self.timeout = timeout
+        self.verify_tls = verify_tls
+
+        self.headers = {"Content-Type": "application/x-ndjson"}
+        if api_key:
+            self.headers["Authorization"] = f"ApiKey {api_key}"
+        elif username is not None:
+            token = base64.b64encode(
+                f"{username}:{password or ''}".encode(DEFAULT_ENCODING)
+            ).decode("ascii")
+            self.headers["Authorization"] = f"Basic {token}"
+
+    def _connect(self) -> http.client.HTTPConnection:
+        """
+        Opens a connection to the cluster
+
+        Returns:
+        - http.client.HTTPConnection: A plain or TLS connection
+        """
+
+        return open_connection(
+            self.scheme, self.host, self.port, self.timeout, self.verify_tls
+        )
+
+    def send_batch(self, batch: List[BatchEntry]) -> List[Dict[str, Any]]:
+        """
+        Sends a single batch with a chunked, streamed request body
+
+        Args:
+        - batch (List[BatchEntry]): A batch produced by batch_queries
+
+        Returns:
+        - List[Dict[str, Any]]: One response per search, in batch order
+
+        Raises:
+        - RuntimeError: If the request fails
+        - MsearchError: If one of the searches fails
+        """
+
+        connection = self._connect()
+        try:
+            connection.request(
+                "POST",
+                self.path,
+                body=iter_msearch_body(batch),
+                headers=self.headers,
+                encode_chunked=True,
+            )
+            response = connection.getresponse()
+            payload = response.read()
+        finally:
+            connection.close()
+
+        if response.status != 200:
+            raise RuntimeError(
+                f"_msearch request failed with status {response.status}: "
+                f"{payload[:200].decode(DEFAULT_ENCODING, 'replace')}"
+            )
+
+        responses = json.loads(payload).get("responses", [])
+        if len(responses) != len(batch):
+            raise RuntimeError(
+                f"_msearch returned {len(responses)} responses for {len(batch)} searches"
+            )
+        for (query, _, _), response in zip(batch, responses):
+            check_response(query, response)
+        return responses
+
+    def search(
+        self,
+        queries: Iterable[str],
+        max_count: int = MSEARCH_MAX_COUNT,
+        max_bytes: int = MSEARCH_MAX_BYTES,
+        size: Optional[int] = None,
+        source: Optional[List[str]] = None,
+        dedupe: bool = True,
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Runs queries through _msearch, batching them by count and size
+
+        Args:
+        - queries (Iterable[str]): Elastic query strings from build_query
+        - max_count (int): Maximum number of searches per request
+        - max_bytes (int): Maximum NDJSON body size per request
+        - size (Optional[int]): Maximum number of hits to return per search
+        - source (Optional[List[str]]): Fields to include in _source
+        - dedupe (bool): Whether to skip queries equivalent to an earlier one
+
+        Returns:
+        - Iterator[Tuple[str, Dict[str, Any]]]: Each unique query with its search response
+        """
+
+        if dedupe:
+            queries = QueryDeduplicator("elastic").filter(queries)
+
+        for batch in batch_queries(
+            queries, self.index, max_count, max_bytes, size, source
+        ):
+            responses = self.send_batch(batch)
+            logger.info(f"_msearch batch of {len(batch)} searches completed")
+            for (query, _, _), response in zip(batch, responses):
+                yield query, response
+
+    def _request_json(
+        self, method: str, path: str, body: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Sends a JSON request to the cluster and decodes the JSON response
+
+        Args:
+        - method (str): The HTTP method
+        - path (str): The path below the base URL
+        - body (Optional[Dict[str, Any]]): The request body
+
+        Returns:
+        - Dict[str, Any]: The decoded response body
+
+        Raises:
+        - RuntimeError: If the request fails
+        """
+
+        headers = {**self.headers, "Content-Type": "application/json"}
+        connection = self._connect()
+        try:
+            connection.request(
+                method,
+                self.base_path + path,
+                body=(
+                    None if body is None else json.dumps(body).encode(DEFAULT_ENCODING)
+                ),
+                headers=headers,
+            )
+            response = connection.getresponse()
+            payload = response.read()
+        finally:
+            connection.close()
+
+        if response.status >= 300:
+            raise RuntimeError(
+                f"{method} {path} failed with status {response.status}: "
+                f"{payload[:200].decode(DEFAULT_ENCODING, 'replace')}"
+            )
+        return json.loads(payload) if payload else {}
+
+    def _page_with_pit(
+        self,
+        query: str,
+        limit: Optional[int],
+        page_size: int,
+        source: Optional[List[str]],
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Pages through all hits of a query with a point in time and search_after
+
+        The point in time keeps the pages consistent while the index changes.
+
+        Args:
+        - query (str): The Elastic query string from build_query
+        - limit (Optional[int]): Maximum number of hits to return, None for all
+        - page_size (int): Number of hits fetched per request
+        - source (Optional[List[str]]): Fields to include in _source
+
+        Returns:
+        - Iterator[Dict[str, Any]]: The hits of the query
+
+        Raises:
+        - RuntimeError: If a request fails
+        - MsearchError: If a page is an error or partial
+        """
+
+        pit = self._request_json(
+            "POST",
+            f"/{quote(self.index, safe=',*')}/_pit?keep_alive={ELASTIC_PIT_KEEP_ALIVE}",
+        )["id"]
+        returned = 0
+        search_after = None
+        try:
+            while limit is None or returned < limit:
+                size = page_size if limit is None else min(page_size, limit - returned)
+                body = to_search_body(query, size, source)
+                body["pit"] = {"id": pit, "keep_alive": ELASTIC_PIT_KEEP_ALIVE}
+                body["sort"] = [{"_shard_doc": "asc"}]
+                if search_after is not None:
+                    body["search_after"] = search_after
+                response = check_response(
+                    query, self._request_json("POST", "/_search", body)
+                )
+                pit = response.get("pit_id", pit)
+
+                hits = response.get("hits", {}).get("hits", [])
+                yield from hits
+                returned += len(hits)
+                if len(hits) < size:
+                    break
+                search_after = hits[-1]["sort"]
+        finally:
+            try:
+                self._request_json("DELETE", "/_pit", {"id": pit})
+            except Exception:
+                logger.warning("Failed to close Elastic point in time")
+
+    def iter_hits(
+        self,
+        queries: Iterable[str],
+        limit: Optional[int] = None,
+        page_size: int = ELASTIC_PAGE_SIZE,
+        source: Optional[List[str]] = None,
+        dedupe: bool = True,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Returns every hit of the queries, up to limit hits per query
+
+        The first page of each query goes through _msearch. A query whose first
+        page comes back full has more hits, so it is searched again page by page
+        under a point in time until a short page proves it complete.
+
+        Args:
+        - queries (Iterable[str]): Elastic query strings from build_query
+        - limit (Optional[int]): Maximum number of hits per query, None for all
+        - page_size (int): Number of hits fetched per request
+        - source (Optional[List[str]]): Fields to include in _source
+        - dedupe (bool): Whether to skip queries equivalent to an earlier one
+
+        Returns:
+        - Iterator[Dict[str, Any]]: The hits of all queries
+
+        Raises:
+        - RuntimeError: If a request fails
+        - MsearchError: If a search fails or returns partial results
+        """
+
+        if page_size <= 0:
+            raise ValueError("page_size must be positive")
+        size = page_size if limit is None else min(page_size, limit)
+
+        for query, response in self.search(
+            queries, size=size, source=source, dedupe=dedupe
+        ):
+            hits = response.get("hits", {}).get("hits", [])
+            if len(hits) < size or (limit is not None and len(hits) >= limit):
+                yield from hits
+            else:
+                yield from self._page_with_pit(query, limit, page_size, source)
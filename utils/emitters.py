@@ -0,0 +1,483 @@
+import re
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from utils.query_ir import (
+    Predicate,
+    QueryIR,
+    TimeFilter,
+    mask_quotes,
+    split_conditions,
+    split_pipeline,
+    strip_parentheses,
+)
+from utils.ui_constants import QRADAR_CONSOLE_TIMEZONE
+
+"""
+Per-platform query emitters
+"""
+
+
+def format_qradar_time(
+    moment: datetime, console_timezone: str = QRADAR_CONSOLE_TIMEZONE
+) -> str:
+    """
+    Formats a datetime for AQL START/STOP clauses
+
+    QRadar interprets the bounds in the console's timezone, so
+    timezone-aware values are converted to it. Naive values are assumed to
+    already be in the console's timezone.
+
+    Args:
+    - moment (datetime): The point in time to format
+    - console_timezone (str): IANA timezone of the console (e.g., "Europe/Berlin")
+
+    Returns:
+    - str: The time formatted as 'yyyy-MM-dd HH:mm:ss'
+    """
+
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(ZoneInfo(console_timezone))
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def format_utc_time(moment: datetime) -> str:
+    """
+    Formats a datetime as an ISO 8601 UTC timestamp for KQL and Elastic bounds
+
+    Naive values are assumed to already be in UTC.
+
+    Args:
+    - moment (datetime): The point in time to format
+
+    Returns:
+    - str: The time formatted as 'yyyy-MM-ddTHH:mm:ssZ'
+    """
+
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def split_select(source: str) -> Tuple[str, str]:
+    """
+    Splits an AQL base query into its select list and the remaining FROM clause
+
+    Args:
+    - source (str): An AQL base query (e.g., "SELECT sourceip, username FROM events")
+
+    Returns:
+    - Tuple[str, str]: The select list and the clause starting at FROM
+    """
+
+    masked = mask_quotes(source)
+    select = re.match(r"\s*SELECT\s+", masked, re.IGNORECASE)
+    from_clause = re.search(r"\sFROM\s", masked, re.IGNORECASE)
+    if not select or not from_clause:
+        raise ValueError(f"Base query is not a SELECT ... FROM query: '{source}'")
+    return (
+        source[select.end() : from_clause.start()].strip(),
+        source[from_clause.start() :].strip(),
+    )
+
+
+class QueryEmitter:
+    """
+    Renders a QueryIR into the query language of one platform
+
+    Subclasses describe the platform syntax; register them with
+    register_emitter to make a platform available to build_query.
+    """
+
+    platform = ""
+    equality_operator = "="
+    # Matches '<field> <equality operator> <literal>'
+    equality_pattern: Optional[re.Pattern] = None
+    # Relative scan cost of a condition, first matching rule wins
+    cost_rules: Tuple[Tuple[re.Pattern, int], ...] = ()
+    default_cost = 2
+    # Column holding the event count of grouped queries
+    count_column = "Count"
+    # IANA timezone absolute time bounds are rendered in
+    time_zone = "UTC"
+
+    def parse_equality(self, text: str) -> Optional[Tuple[str, str]]:
+        """
+        Parses a simple equality condition
+
+        Args:
+        - text (str): A rendered condition
+
+        Returns:
+        - Optional[Tuple[str, str]]: The field and literal, None for other conditions
+        """
+
+        if self.equality_pattern is None:
+            return None
+        match = self.equality_pattern.fullmatch(text.strip())
+        return (match.group(1), match.group(2)) if match else None
+
+    def parse_equality_group(self, text: str) -> Optional[Tuple[str, List[str]]]:
+        """
+        Parses a condition that is a disjunction of equalities on a single field
+
+        Args:
+        - text (str): A rendered condition (e.g., "(port = 80 or port = 443)")
+
+        Returns:
+        - Optional[Tuple[str, List[str]]]: The field and literals, None for other shapes
+        """
+
+        text = strip_parentheses(text)
+        if len(split_conditions(text)) > 1:
+            return None
+
+        parsed = [self.parse_equality(part) for part in split_conditions(text, "or")]
+        if not parsed or None in parsed:
+            return None
+        fields = {field for field, _ in parsed}
+        if len(fields) != 1:
+            return None
+        return parsed[0][0], [literal for _, literal in parsed]
+
+    def predicate_cost(self, predicate: Predicate) -> int:
+        """
+        Estimates how expensive a predicate is, lower is more selective and cheaper
+
+        Args:
+        - predicate (Predicate): The predicate to rank
+
+        Returns:
+        - int: The relative cost of the predicate
+        """
+
+        return self.condition_cost(self.render_predicate(predicate))
+
+    def condition_cost(self, text: str) -> int:
+        """
+        Estimates how expensive a condition is, for the optimizer and the linter
+
+        Args:
+        - text (str): A rendered condition or a template pattern
+
+        Returns:
+        - int: The relative cost of the condition
+        """
+
+        for pattern, cost in self.cost_rules:
+            if pattern.search(text):
+                return cost
+        return self.default_cost
+
+    def split_predicate_stages(self, text: str) -> Tuple[str, List[str]]:
+        """
+        Separates pipeline stages embedded in a condition from the condition itself
+
+        Args:
+        - text (str): A rendered condition
+
+        Returns:
+        - Tuple[str, List[str]]: The condition and the stages that followed it
+        """
+
+        return text, []
+
+    def is_reorder_barrier(self, text: str) -> bool:
+        """
+        Checks whether a condition relies on its position in the query
+
+        Args:
+        - text (str): A rendered condition
+
+        Returns:
+        - bool: True if conditions must keep their template order
+        """
+
+        return False
+
+    def render_predicate(self, predicate: Predicate) -> str:
+        """
+        Renders a single predicate
+
+        Args:
+        - predicate (Predicate): The predicate to render
+
+        Returns:
+        - str: The rendered condition
+        """
+
+        if predicate.text is not None:
+            return predicate.text
+        match predicate.operator:
+            case "=":
+                return (
+                    f"{predicate.field} {self.equality_operator} {predicate.values[0]}"
+                )
+            case "in":
+                return self.render_in_list(predicate.field, predicate.values)
+            case _:
+                raise ValueError(
+                    f"Unsupported predicate operator '{predicate.operator}'"
+                )
+
+    def render_in_list(self, field: str, values: Tuple[str, ...]) -> str:
+        """
+        Renders a membership test against a list of literals
+
+        Args:
+        - field (str): The field to test
+        - values (Tuple[str, ...]): The literals to compare against
+
+        Returns:
+        - str: The rendered condition
+        """
+
+        return f"{field} in ({', '.join(values)})"
+
+    def render_time_filter(self, time_filter: TimeFilter) -> str:
+        """
+        Renders the time restriction of a query
+
+        Args:
+        - time_filter (TimeFilter): The time filter to render
+
+        Returns:
+        - str: The rendered time clause
+        """
+
+        raise NotImplementedError
+
+    def render(self, ir: QueryIR) -> str:
+        """
+        Renders a complete query
+
+        Args:
+        - ir (QueryIR): The query structure
+
+        Returns:
+        - str: The query in the platform's language
+        """
+
+        raise NotImplementedError
+
+
+class QRadarEmitter(QueryEmitter):
+    platform = "qradar"
+    equality_operator = "="
+    equality_pattern = re.compile(
+        r"""([\w.]+|"[^"]+")\s*=\s*('[^']*'|-?\d+)""", re.IGNORECASE
+    )
+    cost_rules = (
+        (re.compile(r"\b(i?matches)\b", re.IGNORECASE), 4),
+        (re.compile(r"\bi?like\s*'%", re.IGNORECASE), 3),
+        (re.compile(r"\w\([^)]*\)\s*i?like\b", re.IGNORECASE), 3),
+        (re.compile(r"\bi?like\b", re.IGNORECASE), 2),
+        (re.compile(r"\bincidr\s*\(", re.IGNORECASE), 1),
+        (re.compile(r"^[\w.\"\s]+(=|\bIN\b)", re.IGNORECASE), 0),
+    )
+    count_column = '"Event Count"'
+    clause_keywords = re.compile(r"\b(group\s+by|having|order\s+by)\b", re.IGNORECASE)
+
+    def __init__(self, console_timezone: str = QRADAR_CONSOLE_TIMEZONE) -> None:
+        """
+        Emitter of AQL queries
+
+        Args:
+        - console_timezone (str): IANA timezone START/STOP bounds are interpreted in
+        """
+
+        ZoneInfo(console_timezone)  # Fails early on an unknown timezone
+        self.time_zone = console_timezone
+
+    def is_reorder_barrier(self, text: str) -> bool:
+        return bool(self.clause_keywords.search(mask_quotes(text)))
+
+    def render_in_list(self, field: str, values: Tuple[str, ...]) -> str:
+        return f"{field} IN ({', '.join(values)})"
+
+    def render_time_filter(self, time_filter: TimeFilter) -> str:
+        if time_filter.is_absolute:
+            return (
+                f"START '{format_qradar_time(time_filter.start, self.time_zone)}' "
+                f"STOP '{format_qradar_time(time_filter.end, self.time_zone)}'"
+            )
+        return f"LAST {time_filter.duration}"
+
+    def render(self, ir: QueryIR) -> str:
+        conditions = [self.render_predicate(p) for p in ir.predicates]
+        condition_string = " and ".join(conditions) if conditions else "true"
+        time_clause = self.render_time_filter(ir.time_filter)
+
+        source = ir.source
+        if ir.group_by:
+            _, from_clause = split_select(source)
+            columns = [
+                f'{expression} as "{alias}"' for alias, expression in ir.group_by
+            ]
+            columns.append(f"COUNT() as {self.count_column}")
+            source = f"SELECT {', '.join(columns)} {from_clause}"
+        elif ir.projection:
+            _, from_clause = split_select(source)
+            source = f"SELECT {', '.join(ir.projection)} {from_clause}"
+
+        group_clause = ""
+        if ir.group_by:
+            group_clause = " GROUP BY " + ", ".join(
+                expression for _, expression in ir.group_by
+            )
+
+        order_by = ir.order_by
+        if order_by is None and ir.group_by:
+            order_by = [(self.count_column, "DESC")]
+        elif order_by is None:
+            # Aggregating 'events' queries are not ordered by device time
+            is_events = (ir.source_key or "").lower() == "events"
+            order_by = [] if is_events else [("devicetime", "DESC")]
+
+        order_clause = ""
+        if order_by:
+            order_clause = " ORDER BY " + ", ".join(
+                f"{column} {direction}" for column, direction in order_by
+            )
+        limit_clause = f" LIMIT {ir.limit}" if ir.limit is not None else ""
+        clauses = f"{group_clause}{order_clause}{limit_clause}"
+        return f"{source} where {condition_string}{clauses} {time_clause}"
+
+
+class DefenderEmitter(QueryEmitter):
+    platform = "defender"
+    equality_operator = "=="
+    equality_pattern = re.compile(r"(\w+)\s*==\s*('[^']*'|-?\d+)")
+    cost_rules = (
+        (re.compile(r"\|\s*summarize\b"), 4),
+        (re.compile(r"\bmatches\s+regex\b"), 4),
+        (re.compile(r"\w\([^)]*\)\s*(==|!=|>|<|contains|has)"), 3),
+        (re.compile(r"\b(contains|endswith)(_cs)?\b"), 2),
+        (re.compile(r"\b(has|has_any|has_all|startswith)(_cs)?\b"), 1),
+        (re.compile(r"^\(?\s*\w+\s*(==|in\s*\(|>|<|>=|<=)"), 0),
+    )
+
+    def split_predicate_stages(self, text: str) -> Tuple[str, List[str]]:
+        parts = split_pipeline(text)
+        if not parts:
+            return text, []
+        return parts[0], parts[1:]
+
+    def render_time_filter(self, time_filter: TimeFilter) -> str:
+        if time_filter.is_absolute:
+            return (
+                f"Timestamp >= datetime({format_utc_time(time_filter.start)}) "
+                f"and Timestamp < datetime({format_utc_time(time_filter.end)})"
+            )
+        return f"Timestamp > ago({time_filter.duration})"
+
+    def render(self, ir: QueryIR) -> str:
+        conditions = [self.render_predicate(p) for p in ir.predicates]
+        time_condition = self.render_time_filter(ir.time_filter)
+        if ir.time_filter_first:
+            conditions.insert(0, time_condition)
+        else:
+            conditions.append(time_condition)
+
+        query = ir.source
+        for condition in conditions:
+            query += f"\n | where {condition}"
+        for stage in ir.stages + ir.post_pipeline:
+            query += f"\n | {stage}"
+
+        if ir.group_by:
+            keys = ", ".join(
+                expression if alias == expression else f"{alias} = {expression}"
+                for alias, expression in ir.group_by
+            )
+            query += f"\n | summarize {self.count_column} = count() by {keys}"
+
+        order_by = ir.order_by
+        if order_by is None:
+            sort_column = self.count_column if ir.group_by else "Timestamp"
+            order_by = [(sort_column, "desc")]
+        sort_keys = ", ".join(f"{column} {direction}" for column, direction in order_by)
+        if order_by and ir.limit is not None:
+            query += f"\n | top {ir.limit} by {sort_keys}"
+        elif order_by:
+            query += f"\n | order by {sort_keys}"
+        elif ir.limit is not None:
+            query += f"\n | take {ir.limit}"
+
+        if ir.projection:
+            query += f"\n | project {', '.join(ir.projection)}"
+        return query
+
+
+class ElasticEmitter(QueryEmitter):
+    platform = "elastic"
+    equality_operator = ":"
+    equality_pattern = re.compile(r'([\w.@]+):\s*("[^"]*"|-?\d+)')
+    cost_rules = (
+        (re.compile(r":\s*\*\S"), 3),
+        (re.compile(r":\s*\S*\*"), 1),
+        (re.compile(r'^\(?\s*[\w.@]+:\s*("|-?\d|\()'), 0),
+    )
+
+    def render_predicate(self, predicate: Predicate) -> str:
+        if predicate.text is None and predicate.operator == "=":
+            return f"{predicate.field}: {predicate.values[0]}"
+        return super().render_predicate(predicate)
+
+    def render_in_list(self, field: str, values: Tuple[str, ...]) -> str:
+        return f"{field}: ({' or '.join(values)})"
+
+    def render_time_filter(self, time_filter: TimeFilter) -> str:
+        if time_filter.is_absolute:
+            return (
+                f'@timestamp >= "{format_utc_time(time_filter.start)}" '
+                f'and @timestamp < "{format_utc_time(time_filter.end)}"'
+            )
+        return f"@timestamp >= now-{time_filter.duration}"
+
+    def render(self, ir: QueryIR) -> str:
+        conditions = [self.render_predicate(p) for p in ir.predicates]
+        condition_string = " and ".join(conditions) if conditions else "*"
+        time_condition = self.render_time_filter(ir.time_filter)
+        if ir.time_filter_first:
+            return f"{ir.source} and {time_condition} and {condition_string}"
+        return f"{ir.source} and {condition_string} and {time_condition}"
+
+
+EMITTERS: Dict[str, QueryEmitter] = {}
+
+
+def register_emitter(emitter: QueryEmitter) -> None:
+    """
+    Registers the emitter of a platform
+
+    Args:
+    - emitter (QueryEmitter): The emitter instance, keyed by its platform name
+    """
+
+    EMITTERS[emitter.platform] = emitter
+
+
+def get_emitter(platform: str) -> QueryEmitter:
+    """
+    Looks up the emitter of a platform
+
+    Args:
+    - platform (str): The platform name
+
+    Returns:
+    - QueryEmitter: The registered emitter
+    """
+
+    try:
+        return EMITTERS[platform]
+    except KeyError:
+        raise ValueError(
+            f"Unsupported platform '{platform}'. "
+            "Must be 'elastic', 'defender', or 'qradar'"
+        ) from None
+
+
+for _emitter in (QRadarEmitter(), DefenderEmitter(), ElasticEmitter()):
+    register_emitter(_emitter)
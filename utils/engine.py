@@ -0,0 +1,315 @@
+import copy
+import os
+import threading
+from datetime import datetime
+from functools import lru_cache, partial
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import yaml
+
+from utils.configuration import normalize_lookback, read_templates
+from utils.generate_queries import build_query
+from utils.ui_constants import ENGINE_RENDER_CACHE_SIZE, PLATFORMS, TEMPLATES_DIR
+from utils.validators import UnknownValidationError, field_validator
+
+"""
+Embeddable query engine
+"""
+
+TimeRange = Tuple[datetime, datetime]
+
+# The templates shipped next to the package, wherever the service is started from
+DEFAULT_TEMPLATES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), TEMPLATES_DIR
+)
+
+
+class ThreatQueryError(Exception):
+    """
+    Base class of the errors raised by ThreatQueryEngine
+    """
+
+
+class TemplateLoadError(ThreatQueryError):
+    """
+    A template file is missing, unreadable or malformed
+    """
+
+
+class UnknownPlatformError(ThreatQueryError, ValueError):
+    """
+    The platform is not one of the loaded platforms
+    """
+
+
+class UnknownTemplateError(ThreatQueryError, LookupError):
+    """
+    The platform has no template of that name
+    """
+
+
+class InvalidInputError(ThreatQueryError, ValueError):
+    """
+    An optional field value, lookback or row limit is invalid
+    """
+
+
+class QueryBuildError(ThreatQueryError):
+    """
+    A template could not be rendered into a query
+    """
+
+
+class ThreatQueryEngine:
+    def __init__(
+        self,
+        templates_dir: str = DEFAULT_TEMPLATES_DIR,
+        platforms: Iterable[str] = PLATFORMS,
+        render_cache_size: int = ENGINE_RENDER_CACHE_SIZE,
+    ) -> None:
+        """
+        Renders template queries in-process for long-running services
+
+        Templates of all platforms are loaded once. Rendering only reads
+        them, so one engine can be shared by any number of threads, and
+        rendered queries are kept in a bounded LRU cache.
+
+        Args:
+        - templates_dir (str): Directory holding the '<platform>.yaml' template files
+        - platforms (Iterable[str]): Platforms to load
+        - render_cache_size (int): Rendered queries kept, 0 to disable caching
+
+        Raises:
+        - TemplateLoadError: If a template file cannot be loaded
+        """
+
+        self.templates_dir = templates_dir
+        self._platforms = list(platforms)
+        self._lock = threading.Lock()
+        self._render_cache_size = render_cache_size
+        self._load()
+
+    def _load(self) -> None:
+        configs: Dict[str, Tuple[Dict[str, Any], Dict[str, str]]] = {}
+        for platform in self._platforms:
+            try:
+                config = read_templates(platform, self.templates_dir)
+            except (OSError, yaml.YAMLError, UnknownValidationError) as e:
+                raise TemplateLoadError(
+                    f"Failed to load {platform} templates: {e}"
+                ) from e
+            if not isinstance(config, dict):
+                raise TemplateLoadError(f"{platform} templates are not a mapping")
+            base_queries = config.get("base_queries", {})
+            templates = {
+                name: template
+                for name, template in config.items()
+                if name != "base_queries" and isinstance(template, dict)
+            }
+            configs[platform] = (templates, base_queries)
+
+        render = lru_cache(maxsize=self._render_cache_size)(
+            partial(self._render, configs)
+        )
+        # Swapped together, so concurrent renders see the old or the new templates
+        with self._lock:
+            self._configs = configs
+            self._render_cached = render
+
+    def reload(self) -> None:
+        """
+        Re-reads the template files, e.g. after they were edited
+
+        Raises:
+        - TemplateLoadError: If a template file cannot be loaded; loaded templates stay
+        """
+
+        self._load()
+
+    @property
+    def platforms(self) -> List[str]:
+        return list(self._configs)
+
+    def _platform(self, platform: str) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        config = self._configs.get(platform.lower())
+        if config is None:
+            raise UnknownPlatformError(
+                f"Unsupported platform '{platform}'. "
+                f"Must be one of: {', '.join(self._configs)}"
+            )
+        return config
+
+    def _template(self, platform: str, name: str) -> Dict[str, Any]:
+        templates, _ = self._platform(platform)
+        template = templates.get(name)
+        if template is None:
+            raise UnknownTemplateError(f"No template '{name}' for {platform}")
+        return template
+
+    def template_names(self, platform: str) -> List[str]:
+        """
+        Lists the templates of a platform
+
+        Args:
+        - platform (str): The platform name
+
+        Returns:
+        - List[str]: The template names in file order
+        """
+
+        return list(self._platform(platform)[0])
+
+    def describe(self, platform: str, name: str) -> Dict[str, Any]:
+        """
+        Returns a copy of a template, e.g. to list its optional fields
+
+        Args:
+        - platform (str): The platform name
+        - name (str): The template name
+
+        Returns:
+        - Dict[str, Any]: The template definition
+        """
+
+        return copy.deepcopy(self._template(platform, name))
+
+    def normalize_lookback(self, lookback: str, platform: str) -> str:
+        """
+        Normalizes a lookback (e.g., "30m", "2 hours") for a platform
+
+        Args:
+        - lookback (str): The lookback value
+        - platform (str): The platform name
+
+        Returns:
+        - str: The lookback in the platform's format
+
+        Raises:
+        - InvalidInputError: If the lookback is invalid
+        """
+
+        self._platform(platform)
+        duration = normalize_lookback(lookback, platform.lower())
+        if duration is None:
+            raise InvalidInputError(f"Invalid lookback '{lookback}'")
+        return duration
+
+    def validate_inputs(
+        self, platform: str, name: str, inputs: Dict[str, str]
+    ) -> Dict[str, str]:
+        """
+        Checks optional field values against the template
+
+        Args:
+        - platform (str): The platform name
+        - name (str): The template name
+        - inputs (Dict[str, str]): The optional field values
+
+        Returns:
+        - Dict[str, str]: The non-empty values, stripped
+
+        Raises:
+        - InvalidInputError: If a field is unknown or a value fails its validation
+        """
+
+        optional_fields = self._template(platform, name).get("optional_fields", {})
+        cleaned = {}
+        for key, value in inputs.items():
+            if key not in optional_fields:
+                raise InvalidInputError(
+                    f"Template '{name}' has no optional field '{key}'"
+                )
+            value = str(value).strip()
+            if not value:
+                continue
+            validator = field_validator(optional_fields[key])
+            if validator is not None:
+                valid, msg = validator(value)
+                if not valid:
+                    raise InvalidInputError(f"Invalid input for {key}: {msg}")
+            cleaned[key] = value
+        return cleaned
+
+    @staticmethod
+    def _render(
+        configs: Dict[str, Tuple[Dict[str, Any], Dict[str, str]]],
+        platform: str,
+        name: str,
+        inputs: Tuple[Tuple[str, str], ...],
+        duration: str,
+        include_post_pipeline: bool,
+        time_range: Optional[TimeRange],
+        limit: Optional[int],
+    ) -> str:
+        templates, base_queries = configs[platform]
+        try:
+            return build_query(
+                templates[name],
+                dict(inputs),
+                duration,
+                platform,
+                base_queries,
+                include_post_pipeline,
+                time_range=time_range,
+                limit=limit,
+            )
+        except (KeyError, ValueError) as e:
+            raise QueryBuildError(
+                f"Failed to render {platform} template '{name}': {e}"
+            ) from e
+
+    def render(
+        self,
+        platform: str,
+        name: str,
+        inputs: Optional[Dict[str, str]] = None,
+        lookback: str = "10m",
+        include_post_pipeline: bool = False,
+        time_range: Optional[TimeRange] = None,
+        limit: Optional[int] = None,
+    ) -> str:
+        """
+        Renders a template into a query
+
+        Args:
+        - platform (str): The platform name ("qradar", "defender", "elastic")
+        - name (str): The template name
+        - inputs (Optional[Dict[str, str]]): The optional field values
+        - lookback (str): The relative time range (e.g., "10m", "2 hours")
+        - include_post_pipeline (bool): Whether to include the Defender post_pipeline
+        - time_range (Optional[TimeRange]): Absolute (start, end) bounds
+        - limit (Optional[int]): Row limit overriding the template's limit
+
+        Returns:
+        - str: The rendered query
+
+        Raises:
+        - UnknownPlatformError: If the platform is not loaded
+        - UnknownTemplateError: If the template does not exist
+        - InvalidInputError: If an input, the lookback or the limit is invalid
+        - QueryBuildError: If the template cannot be rendered
+        """
+
+        platform = platform.lower()
+        cleaned = self.validate_inputs(platform, name, inputs or {})
+        duration = self.normalize_lookback(lookback, platform)
+        if time_range is not None and time_range[1] <= time_range[0]:
+            raise InvalidInputError("Time range end must be after its start")
+        if limit is not None and (
+            isinstance(limit, bool) or not isinstance(limit, int) or limit <= 0
+        ):
+            raise InvalidInputError(
+                f"Row limit must be a positive integer, got '{limit}'"
+            )
+
+        with self._lock:
+            render = self._render_cached
+        return render(
+            platform,
+            name,
+            tuple(sorted(cleaned.items())),
+            duration,
+            include_post_pipeline,
+            time_range,
+            limit,
+        )
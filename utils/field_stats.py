@@ -0,0 +1,218 @@
+import json
+import re
+from dataclasses import replace
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.elastic_batch import to_search_body
+from utils.emitters import get_emitter
+from utils.optimizer import AGGREGATION_STAGE, optimize
+from utils.query_ir import QueryIR, build_ir, mask_quotes
+from utils.ui_constants import FIELD_STATS_TOP_N
+
+"""
+Field statistics companion queries
+"""
+
+# Matches the field expression in front of the '{value}' placeholder of an
+# optional field pattern
+FIELD_EXPRESSIONS: Dict[str, re.Pattern] = {
+    "qradar": re.compile(
+        r"""^\s*(.+?)\s*(?:!=|<>|>=|<=|=|>|<|\bnot\s+i?like\b|\bi?like\b|\bi?matches\b|\bin\b)\s*['"(%]*\{value\}""",
+        re.IGNORECASE,
+    ),
+    "defender": re.compile(
+        r"""^\s*(.+?)\s*(?:==|!=|=~|>=|<=|=|>|<|!?\b(?:has_any|has_all|has|contains|startswith|endswith|in)(?:_cs)?\b)\s*['"(]*\{value\}"""
+    ),
+    "elastic": re.compile(r"""^\s*([\w.@]+)\s*:\s*['"(*]*\{value\}"""),
+}
+
+# Clauses that turn a condition into an aggregation
+QRADAR_AGGREGATION_CLAUSE = re.compile(
+    r"\b(group\s+by|having|order\s+by)\b", re.IGNORECASE
+)
+
+
+def stats_fields(template: Dict[str, Any], platform: str) -> List[Tuple[str, str]]:
+    """
+    Derives the fields to summarise from the optional fields of a template
+
+    The field expression is taken from the text in front of the operator of
+    each pattern. An optional field can override it with 'stats_field', or
+    opt out with 'stats_field: false' (e.g., analysed text fields).
+
+    Args:
+    - template (Dict[str, Any]): A template dictionary containing query structure
+    - platform (str): The platform of the template
+
+    Returns:
+    - List[Tuple[str, str]]: The optional field names with their field expressions
+    """
+
+    pattern = FIELD_EXPRESSIONS.get(platform)
+    if pattern is None:
+        raise ValueError(f"Unsupported platform '{platform}'")
+
+    fields = []
+    seen = set()
+    for name, meta in template.get("optional_fields", {}).items():
+        if not isinstance(meta, dict):
+            continue
+        expression = meta.get("stats_field")
+        if expression is False:
+            continue
+        if expression is None:
+            match = pattern.match(meta.get("pattern", ""))
+            if not match:
+                continue
+            expression = match.group(1)
+        # Threshold patterns (e.g., "qid HAVING COUNT() > {value}") are not fields
+        if QRADAR_AGGREGATION_CLAUSE.search(mask_quotes(expression)):
+            continue
+        if expression not in seen:
+            seen.add(expression)
+            fields.append((name, expression))
+    return fields
+
+
+def _strip_aggregation(ir: QueryIR, platform: str) -> QueryIR:
+    """
+    Removes the template's own aggregation so that raw events are counted
+
+    Args:
+    - ir (QueryIR): The optimised query structure
+    - platform (str): The platform of the query
+
+    Returns:
+    - QueryIR: The query structure filtering raw events only
+    """
+
+    predicates = []
+    for predicate in ir.predicates:
+        text = predicate.text
+        if platform == "qradar" and text is not None:
+            clause = QRADAR_AGGREGATION_CLAUSE.search(mask_quotes(text))
+            if clause:
+                text = text[: clause.start()].strip()
+                if not text:
+                    continue
+                predicate = replace(predicate, text=text)
+        predicates.append(predicate)
+
+    stages = []
+    for stage in ir.stages:
+        if AGGREGATION_STAGE.match(stage):
+            break
+        stages.append(stage)
+
+    return replace(
+        ir,
+        predicates=predicates,
+        stages=stages,
+        post_pipeline=[],
+        order_by=None,
+        projection=[],
+        limit=None,
+    )
+
+
+def build_stats_ir(
+    template: Dict[str, Any],
+    duration: str,
+    platform: str,
+    base_queries: Dict[str, str],
+    inputs: Optional[Dict[str, str]] = None,
+    time_range: Optional[Tuple[datetime, datetime]] = None,
+) -> QueryIR:
+    """
+    Builds the filtering part shared by the field statistics queries of a template
+
+    Args:
+    - template (Dict[str, Any]): A template dictionary containing query structure
+    - duration (str): A duration string for the time range (e.g., "1h", "30 MINUTES")
+    - platform (str): The platform ("qradar", "defender", "elastic")
+    - base_queries (Dict[str, str]): A dictionary of base queries keyed by name
+    - inputs (Optional[Dict[str, str]]): Optional field values narrowing the counts
+    - time_range (Optional[Tuple[datetime, datetime]]): Absolute (start, end) bounds
+
+    Returns:
+    - QueryIR: The query structure without projection, ordering or aggregation
+    """
+
+    ir = build_ir(template, inputs or {}, duration, base_queries, time_range=time_range)
+    return _strip_aggregation(optimize(ir, platform), platform)
+
+
+def build_field_stats_queries(
+    template: Dict[str, Any],
+    duration: str,
+    platform: str,
+    base_queries: Dict[str, str],
+    inputs: Optional[Dict[str, str]] = None,
+    top: int = FIELD_STATS_TOP_N,
+    time_range: Optional[Tuple[datetime, datetime]] = None,
+) -> List[Tuple[str, str]]:
+    """
+    Builds aggregate queries returning the most common values of each optional field
+
+    QRadar and Defender get one GROUP BY/summarize query per field, Elastic
+    gets a single search body with a terms aggregation per field.
+
+    Args:
+    - template (Dict[str, Any]): A template dictionary containing query structure
+    - duration (str): A duration string for the time range (e.g., "1h", "30 MINUTES")
+    - platform (str): The platform ("qradar", "defender", "elastic")
+    - base_queries (Dict[str, str]): A dictionary of base queries keyed by name
+    - inputs (Optional[Dict[str, str]]): Optional field values narrowing the counts
+    - top (int): Number of values to return per field
+    - time_range (Optional[Tuple[datetime, datetime]]): Absolute (start, end) bounds
+
+    Returns:
+    - List[Tuple[str, str]]: Labels with their queries, empty without usable fields
+    """
+
+    fields = stats_fields(template, platform)
+    if not fields:
+        return []
+
+    if platform == "elastic":
+        body = build_field_stats_body(template, duration, inputs, top, time_range)
+        label = ", ".join(name for name, _ in fields)
+        return [(label, json.dumps(body, indent=2))]
+
+    emitter = get_emitter(platform)
+    ir = build_stats_ir(template, duration, platform, base_queries, inputs, time_range)
+    return [
+        (name, emitter.render(replace(ir, group_by=[(name, expression)], limit=top)))
+        for name, expression in fields
+    ]
+
+
+def build_field_stats_body(
+    template: Dict[str, Any],
+    duration: str,
+    inputs: Optional[Dict[str, str]] = None,
+    top: int = FIELD_STATS_TOP_N,
+    time_range: Optional[Tuple[datetime, datetime]] = None,
+) -> Dict[str, Any]:
+    """
+    Builds an Elasticsearch search body with a terms aggregation per optional field
+
+    Args:
+    - template (Dict[str, Any]): An Elastic template dictionary
+    - duration (str): A duration string for the time range (e.g., "1h")
+    - inputs (Optional[Dict[str, str]]): Optional field values narrowing the counts
+    - top (int): Number of buckets to return per field
+    - time_range (Optional[Tuple[datetime, datetime]]): Absolute (start, end) bounds
+
+    Returns:
+    - Dict[str, Any]: A search request body returning aggregations only
+    """
+
+    ir = build_stats_ir(template, duration, "elastic", {}, inputs, time_range)
+    body = to_search_body(get_emitter("elastic").render(ir), size=0)
+    body["aggs"] = {
+        name: {"terms": {"field": expression, "size": top}}
+        for name, expression in stats_fields(template, "elastic")
+    }
+    return body
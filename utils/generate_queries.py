@@ -1,10 +1,28 @@
-from typing import Dict, Any
+from collections import OrderedDict
+from dataclasses import replace
+from datetime import datetime
+from itertools import product
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils.elastic_batch import to_search_body
+from utils.emitters import get_emitter
+from utils.optimizer import PREDICATE_PASSES, QUERY_PASSES, optimize as optimize_ir
+from utils.profiling import profiled
+from utils.query_ir import (
+    Predicate,
+    QueryIR,
+    TimeFilter,
+    build_ir,
+    render_optional_field,
+)
+from utils.ui_constants import PREVIEW_CACHE_SIZE, WORKFLOW_BATCH_SIZE
 
 """
 Query builder
 """
 
 
+@profiled("build_query")
 def build_query(
     template: Dict[str, Any],
     inputs: Dict[str, str],
@@ -12,6 +30,9 @@ def build_query(
     platform: str,
     base_queries: Dict[str, str],
     include_post_pipeline: bool = False,
+    time_range: Optional[Tuple[datetime, datetime]] = None,
+    optimize: bool = True,
+    limit: Optional[int] = None,
 ) -> str:
     """
     Builds a query with a template, inputs, duration and the provided platform
@@ -23,57 +44,222 @@ def build_query(
     - platform (str): A platform for issuing the queries ("qradar", "defender", "elastic")
     - base_queries (Dict[str, str]): A dictionary of base queries keyed by platform
     - include_post_pipeline (bool): Whether to include post-processing pipeline (Defender only)
+    - time_range (Optional[Tuple[datetime, datetime]]): Absolute (start, end) bounds
+    - optimize (bool): Whether to run the optimisation passes over the query
+    - limit (Optional[int]): Row limit overriding the template's limit
 
     Returns:
     - str: A formatted query for the specified platform
     """
 
-    if "base" not in template:
-        raise KeyError("Template missing required 'base' field")
-
-    base = template["base"]
-    key_name = None
-    if base_queries and base.startswith("{") and base.endswith("}"):
-        key_name = base[1:-1]
-        if key_name in base_queries:
-            base = base_queries[key_name]
-        else:
-            raise ValueError(f"Base query '{key_name}' not found in base_queries")
-
-    conditions = list(template.get("required_fields", []))
-
-    # Add optional field conditions
-    for key, val in inputs.items():
-        optional_fields = template.get("optional_fields", {})
-        if key in optional_fields:
-            field_config = optional_fields[key]
-            if isinstance(field_config, dict) and "pattern" in field_config:
-                pattern = field_config["pattern"]
-                conditions.append(pattern.format(value=val))
-            else:
-                # Handle simple string patterns
-                conditions.append(f"{key} = '{val}'")
-
-    match platform:
-        case "qradar":
-            condition_string = " and ".join(conditions) if conditions else "true"
-            if key_name.lower() == "events":
-                query = f"{base} where {condition_string} LAST {duration}"
-            else:
-                query = f"{base} where {condition_string} ORDER BY devicetime DESC LAST {duration}"
-        case "defender":
-            all_conditions = conditions + [f"Timestamp > ago({duration})"]
-            query = base
-            for condition in all_conditions:
-                query += f"\n | where {condition}"
-            if include_post_pipeline and "post_pipeline" in template:
-                query += f"\n | {template['post_pipeline']}"
-            query += "\n | order by Timestamp desc"
-        case "elastic":
-            condition_string = " and ".join(conditions) if conditions else "*"
-            query = f"{base} and {condition_string} and @timestamp >= now-{duration}"
-        case _:
-            raise ValueError(
-                f"Unsupported platform '{platform}'. Must be 'elastic', 'defender', or 'qradar'"
+    emitter = get_emitter(platform)
+    ir = build_ir(
+        template,
+        inputs,
+        duration,
+        base_queries,
+        include_post_pipeline,
+        time_range,
+        limit,
+    )
+    if optimize:
+        ir = optimize_ir(ir, platform)
+    return emitter.render(ir)
+
+
+def build_batched_queries(
+    template: Dict[str, Any],
+    inputs: Dict[str, str],
+    batched_inputs: Dict[str, List[str]],
+    duration: str,
+    platform: str,
+    base_queries: Dict[str, str],
+    include_post_pipeline: bool = False,
+    batch_size: int = WORKFLOW_BATCH_SIZE,
+) -> List[str]:
+    """
+    Builds queries matching any of several values per optional field
+
+    The values of each field are split into batches that are OR'ed into a
+    single condition (folded into IN lists by the optimiser), so hundreds of
+    values cost a handful of searches instead of one search each. With
+    several batched fields, every combination of their batches is built.
+
+    Args:
+    - template (Dict[str, Any]): A template dictionary containing query structure
+    - inputs (Dict[str, str]): Single values for optional parameters
+    - batched_inputs (Dict[str, List[str]]): Candidate values per optional parameter
+    - duration (str): A duration string for the time range (e.g., "1h", "30 MINUTES")
+    - platform (str): The platform ("qradar", "defender", "elastic")
+    - base_queries (Dict[str, str]): A dictionary of base queries keyed by platform
+    - include_post_pipeline (bool): Whether to include the Defender post_pipeline
+    - batch_size (int): Maximum number of values per condition
+
+    Returns:
+    - List[str]: The formatted queries, empty if a batched field has no values
+    """
+
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+
+    emitter = get_emitter(platform)
+    ir = build_ir(template, inputs, duration, base_queries, include_post_pipeline)
+
+    batches_per_field = []
+    for key, values in batched_inputs.items():
+        values = list(dict.fromkeys(values))
+        batches = []
+        for i in range(0, len(values), batch_size):
+            conditions = [
+                render_optional_field(template, key, value)
+                for value in values[i : i + batch_size]
+            ]
+            text = (
+                conditions[0]
+                if len(conditions) == 1
+                else f"({' or '.join(conditions)})"
             )
-    return query
+            batches.append(Predicate(text, origin=key))
+        batches_per_field.append(batches)
+
+    queries = []
+    for combination in product(*batches_per_field):
+        batch_ir = replace(ir, predicates=ir.predicates + list(combination))
+        queries.append(emitter.render(optimize_ir(batch_ir, platform)))
+    return queries
+
+
+class IncrementalQueryBuilder:
+    def __init__(
+        self,
+        template: Dict[str, Any],
+        platform: str,
+        base_queries: Dict[str, str],
+        cache_size: int = PREVIEW_CACHE_SIZE,
+    ) -> None:
+        """
+        Re-renders a template as its inputs change, for live previews
+
+        The required predicates are prepared once and each optional field's
+        predicate is prepared when its value changes. A render then only runs
+        the optimisation passes that look at all predicates and emits the
+        query, which gives the same result as build_query.
+
+        Args:
+        - template (Dict[str, Any]): A template dictionary containing query structure
+        - platform (str): The platform ("qradar", "defender", "elastic")
+        - base_queries (Dict[str, str]): A dictionary of base queries keyed by platform
+        - cache_size (int): Rendered queries kept for repeated inputs
+        """
+
+        self.template = template
+        self.platform = platform
+        self.emitter = get_emitter(platform)
+        self.cache_size = cache_size
+        self.optional_fields = template.get("optional_fields", {})
+
+        ir = build_ir(template, {}, "", base_queries)
+        self._base = replace(ir, predicates=[])
+        self._required = self._prepare(ir.predicates)
+        self._fields: Dict[Tuple[str, str], Tuple[List[Predicate], List[str]]] = {}
+        self._rendered: "OrderedDict[Tuple, str]" = OrderedDict()
+
+    def _prepare(
+        self, predicates: List[Predicate]
+    ) -> Tuple[List[Predicate], List[str]]:
+        ir = replace(self._base, predicates=predicates, stages=[])
+        for optimization_pass in PREDICATE_PASSES:
+            ir = optimization_pass(ir, self.emitter)
+        return ir.predicates, ir.stages
+
+    def _field(self, key: str, value: str) -> Tuple[List[Predicate], List[str]]:
+        prepared = self._fields.get((key, value))
+        if prepared is None:
+            predicate = Predicate(
+                render_optional_field(self.template, key, value), origin=key
+            )
+            prepared = self._fields[(key, value)] = self._prepare([predicate])
+        return prepared
+
+    def render(
+        self,
+        inputs: Dict[str, str],
+        duration: str,
+        include_post_pipeline: bool = False,
+    ) -> str:
+        """
+        Renders the template for the given inputs
+
+        Args:
+        - inputs (Dict[str, str]): User-provided field values for optional parameters
+        - duration (str): A duration for the time range (e.g., "1h", "30 MINUTES")
+        - include_post_pipeline (bool): Whether to include the Defender post_pipeline
+
+        Returns:
+        - str: A formatted query for the platform
+        """
+
+        items = tuple(
+            (key, value) for key, value in inputs.items() if key in self.optional_fields
+        )
+        cache_key = (items, duration, include_post_pipeline)
+        query = self._rendered.get(cache_key)
+        if query is not None:
+            self._rendered.move_to_end(cache_key)
+            return query
+
+        predicates, stages = list(self._required[0]), list(self._required[1])
+        for key, value in items:
+            field_predicates, field_stages = self._field(key, value)
+            predicates.extend(field_predicates)
+            stages.extend(field_stages)
+
+        post_pipeline = []
+        if include_post_pipeline and "post_pipeline" in self.template:
+            post_pipeline.append(self.template["post_pipeline"])
+
+        ir: QueryIR = replace(
+            self._base,
+            predicates=predicates,
+            stages=self._base.stages + stages,
+            time_filter=TimeFilter(duration),
+            post_pipeline=post_pipeline,
+        )
+        for optimization_pass in QUERY_PASSES:
+            ir = optimization_pass(ir, self.emitter)
+        query = self.emitter.render(ir)
+
+        self._rendered[cache_key] = query
+        if len(self._rendered) > self.cache_size:
+            self._rendered.popitem(last=False)
+        return query
+
+
+def build_elastic_search_body(
+    template: Dict[str, Any],
+    inputs: Dict[str, str],
+    duration: str,
+    time_range: Optional[Tuple[datetime, datetime]] = None,
+    limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Builds an Elasticsearch search body, pushing the template's projection and
+    limit down as _source and size
+
+    Args:
+    - template (Dict[str, Any]): An Elastic template dictionary
+    - inputs (Dict[str, str]): User-provided field values for optional parameters
+    - duration (str): A duration string for the time range (e.g., "1h")
+    - time_range (Optional[Tuple[datetime, datetime]]): Absolute (start, end) bounds
+    - limit (Optional[int]): Hit limit overriding the template's limit
+
+    Returns:
+    - Dict[str, Any]: A search request body
+    """
+
+    ir = optimize_ir(
+        build_ir(template, inputs, duration, {}, time_range=time_range, limit=limit),
+        "elastic",
+    )
+    query = get_emitter("elastic").render(ir)
+    return to_search_body(query, size=ir.limit, source=ir.projection or None)
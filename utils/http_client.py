@@ -0,0 +1,51 @@
+import http.client
+import ssl
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+"""
+HTTP connection helpers
+"""
+
+
+def parse_base_url(url: str) -> Tuple[str, str, Optional[int], str]:
+    """
+    Splits a base URL of a SIEM API into its connection parts
+
+    Args:
+    - url (str): Base URL (e.g., 'https://qradar.example.com')
+
+    Returns:
+    - Tuple[str, str, Optional[int], str]: The scheme, host, port and path without trailing slash
+    """
+
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Invalid URL '{url}'")
+    return parts.scheme, parts.hostname, parts.port, parts.path.rstrip("/")
+
+
+def open_connection(
+    scheme: str, host: str, port: Optional[int], timeout: float, verify_tls: bool
+) -> http.client.HTTPConnection:
+    """
+    Opens a plain or TLS connection
+
+    Args:
+    - scheme (str): 'http' or 'https'
+    - host (str): The host name
+    - port (Optional[int]): The port, or None for the scheme default
+    - timeout (float): Socket timeout in seconds
+    - verify_tls (bool): Whether to verify the server certificate
+
+    Returns:
+    - http.client.HTTPConnection: An unopened connection object
+    """
+
+    if scheme == "https":
+        context = ssl.create_default_context()
+        if not verify_tls:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        return http.client.HTTPSConnection(host, port, timeout=timeout, context=context)
+    return http.client.HTTPConnection(host, port, timeout=timeout)
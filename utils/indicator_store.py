@@ -0,0 +1,720 @@
+import argparse
+import hashlib
+import heapq
+import ipaddress
+import json
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from utils.configuration import load_templates, normalize_lookback
+from utils.correlation import normalize_ip
+from utils.generate_queries import build_batched_queries
+from utils.profiling import add_profiling_arguments, profiling_from_args
+from utils.ui_constants import (
+    DEFAULT_ENCODING,
+    INDICATOR_BUILD_CHUNK,
+    INDICATOR_STORE_DIR,
+    PLATFORMS,
+    WORKFLOW_BATCH_SIZE,
+)
+
+"""
+Memory-mapped indicator store
+"""
+
+MANIFEST = "manifest.json"
+STORE_VERSION = 1
+
+# Kinds held as sorted hashes with their values, besides the packed IP arrays
+STRING_KINDS = ("domain", "md5", "sha1", "sha256", "url", "other")
+KINDS = ("ipv4", "ipv6") + STRING_KINDS
+
+HASH_KINDS = {32: "md5", 40: "sha1", 64: "sha256"}
+HEX = re.compile(r"[0-9a-f]+")
+DOMAIN = re.compile(
+    r"(?=.{1,253}$)([a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9])?\.)+[a-z][a-z0-9-]{1,62}"
+)
+
+RUN_RECORD = struct.Struct("<QI")  # Hash and value length of a spilled string indicator
+
+
+def classify_indicator(value: str) -> Optional[Tuple[str, Any]]:
+    """
+    Determines the kind of an indicator and its normalised sort key
+
+    Args:
+    - value (str): The raw indicator (e.g., "10.0.0.1", "Example.com.", an MD5)
+
+    Returns:
+    - Optional[Tuple[str, Any]]: The kind with an int (IPv4), 16 bytes (IPv6) or
+      (hash, bytes) key, or None for an empty value
+    """
+
+    text = value.strip()
+    if not text:
+        return None
+
+    ip = normalize_ip(text)
+    if ip is not None:
+        address = ipaddress.ip_address(ip)
+        if address.version == 4:
+            return "ipv4", int(address)
+        return "ipv6", address.packed
+
+    lowered = text.lower()
+    if len(lowered) in HASH_KINDS and HEX.fullmatch(lowered):
+        kind, normalized = HASH_KINDS[len(lowered)], lowered
+    elif "://" in text:
+        kind, normalized = "url", text
+    else:
+        domain = lowered.rstrip(".")
+        if DOMAIN.fullmatch(domain):
+            kind, normalized = "domain", domain
+        else:
+            kind, normalized = "other", text
+    encoded = normalized.encode(DEFAULT_ENCODING)
+    return kind, (string_hash(encoded), encoded)
+
+
+def string_hash(value: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "little")
+
+
+def _format_key(kind: str, key: Any) -> str:
+    match kind:
+        case "ipv4":
+            return str(ipaddress.IPv4Address(key))
+        case "ipv6":
+            return ipaddress.IPv6Address(bytes(key)).compressed
+        case _:
+            return key[1].decode(DEFAULT_ENCODING)
+
+
+# =============================================================================
+# SPILLED RUNS
+# =============================================================================
+
+
+def _write_run(handle: BinaryIO, kind: str, keys: Sequence[Any]) -> None:
+    match kind:
+        case "ipv4":
+            array("I", keys).tofile(handle)
+        case "ipv6":
+            handle.write(b"".join(keys))
+        case _:
+            for hashed, encoded in keys:
+                handle.write(RUN_RECORD.pack(hashed, len(encoded)))
+                handle.write(encoded)
+
+
+def _read_run(path: str, kind: str) -> Iterator[Any]:
+    with open(path, "rb") as handle:
+        match kind:
+            case "ipv4":
+                while True:
+                    block = array("I")
+                    try:
+                        block.fromfile(handle, 65_536)
+                    except EOFError:
+                        pass  # A short final block is still loaded
+                    if not block:
+                        return
+                    yield from block
+            case "ipv6":
+                while record := handle.read(16):
+                    yield record
+            case _:
+                while header := handle.read(RUN_RECORD.size):
+                    hashed, length = RUN_RECORD.unpack(header)
+                    yield hashed, handle.read(length)
+
+
+def _unique(keys: Iterable[Any]) -> Iterator[Any]:
+    previous = object()
+    for key in keys:
+        if key != previous:
+            yield key
+            previous = key
+
+
+# =============================================================================
+# STORE
+# =============================================================================
+
+
+class _Records:
+    """
+    Fixed-width records of a memory map as a sequence of bytes, for bisect
+    """
+
+    def __init__(self, view: memoryview, width: int) -> None:
+        self.view = view
+        self.width = width
+
+    def __len__(self) -> int:
+        return len(self.view) // self.width
+
+    def __getitem__(self, index: int) -> bytes:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return bytes(self.view[index * self.width : (index + 1) * self.width])
+
+    def __iter__(self) -> Iterator[bytes]:
+        for start in range(0, len(self.view) - self.width + 1, self.width):
+            yield bytes(self.view[start : start + self.width])
+
+
+class _StringTable:
+    """
+    Values of one string kind, sorted by (hash, value), with their offsets
+    """
+
+    def __init__(
+        self, hashes: Sequence[int], offsets: Sequence[int], values: memoryview
+    ) -> None:
+        self.hashes = hashes
+        self.offsets = offsets
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def key(self, index: int) -> Tuple[int, bytes]:
+        return self.hashes[index], bytes(
+            self.values[self.offsets[index] : self.offsets[index + 1]]
+        )
+
+    def __contains__(self, key: Tuple[int, bytes]) -> bool:
+        hashed, encoded = key
+        index = bisect_left(self.hashes, hashed)
+        while index < len(self.hashes) and self.hashes[index] == hashed:
+            if self.key(index)[1] == encoded:
+                return True
+            index += 1
+        return False
+
+    def __iter__(self) -> Iterator[Tuple[int, bytes]]:
+        for index in range(len(self.hashes)):
+            yield self.key(index)
+
+
+class IndicatorStore:
+    def __init__(self, directory: str = INDICATOR_STORE_DIR) -> None:
+        """
+        Opens a store written by IndicatorStore.build
+
+        IPv4 addresses are a sorted array of packed 32-bit integers and IPv6
+        addresses sorted 16-byte records; other indicators are tables sorted
+        by a 64-bit hash with their values. All files are memory-mapped, so
+        opening is instant, lookups are binary searches and iteration reads
+        the mapped pages without loading the store.
+
+        Args:
+        - directory (str): The store directory
+        """
+
+        self.directory = directory
+        with open(
+            os.path.join(directory, MANIFEST), "r", encoding=DEFAULT_ENCODING
+        ) as f:
+            manifest = json.load(f)
+        if (
+            manifest.get("version") != STORE_VERSION
+            or manifest.get("byteorder") != sys.byteorder
+        ):
+            raise ValueError(
+                f"{directory} was written by an incompatible version or platform"
+            )
+        self.counts: Dict[str, int] = manifest["counts"]
+
+        self._maps: List[mmap.mmap] = []
+        self.ipv4: Sequence[int] = self._view("ipv4.u32", "I")
+        self.ipv6: Sequence[bytes] = _Records(self._view("ipv6.b16"), 16)
+        self.strings: Dict[str, _StringTable] = {
+            kind: _StringTable(
+                self._view(f"{kind}.hashes", "Q"),
+                self._view(f"{kind}.offsets", "Q") if self.counts[kind] else (0,),
+                self._view(f"{kind}.values"),
+            )
+            for kind in STRING_KINDS
+        }
+
+    def _view(self, name: str, fmt: str = "B") -> memoryview:
+        path = os.path.join(self.directory, name)
+        if os.path.getsize(path) == 0:
+            return memoryview(b"").cast(fmt)
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return memoryview(mapped).cast(fmt)
+
+    def close(self) -> None:
+        # Views must be released before their maps can close
+        self.ipv4 = self.ipv6 = None
+        self.strings = {}
+        for mapped in self._maps:
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # A caller still holds a view; the map closes once it is released
+        self._maps = []
+
+    def __enter__(self) -> "IndicatorStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return sum(self.counts.values())
+
+    def _table(self, kind: str) -> Sequence[Any]:
+        match kind:
+            case "ipv4":
+                return self.ipv4
+            case "ipv6":
+                return self.ipv6
+            case _:
+                return self.strings[kind]
+
+    def __contains__(self, value: str) -> bool:
+        classified = classify_indicator(value)
+        if classified is None:
+            return False
+        kind, key = classified
+        if kind in STRING_KINDS:
+            return key in self.strings[kind]
+        table = self._table(kind)
+        index = bisect_left(table, key)
+        return index < len(table) and table[index] == key
+
+    def keys(self, kind: str) -> Iterator[Any]:
+        """
+        Iterates the sort keys of a kind in order, reading straight from the mapped files
+
+        Args:
+        - kind (str): One of KINDS
+
+        Returns:
+        - Iterator[Any]: Integers (IPv4), 16-byte records (IPv6) or (hash, bytes) pairs
+        """
+
+        return iter(self._table(kind))
+
+    def values(self, kind: Optional[str] = None) -> Iterator[str]:
+        """
+        Iterates the indicators, optionally of a single kind
+
+        Args:
+        - kind (Optional[str]): One of KINDS, or None for all
+
+        Returns:
+        - Iterator[str]: The normalised indicators
+        """
+
+        for current in (kind,) if kind else KINDS:
+            for key in self.keys(current):
+                yield _format_key(current, key)
+
+    def difference(
+        self, other: "IndicatorStore", kind: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        Iterates indicators of this store that are not in another, e.g. not hunted yet
+
+        Each key is binary-searched in the other store from the position of
+        the previous match, since both sides are sorted.
+
+        Args:
+        - other (IndicatorStore): The store to subtract
+        - kind (Optional[str]): One of KINDS, or None for all
+
+        Returns:
+        - Iterator[str]: The indicators only present in this store
+        """
+
+        for current in (kind,) if kind else KINDS:
+            if current in STRING_KINDS:
+                table = other.strings[current]
+                for key in self.keys(current):
+                    if key not in table:
+                        yield _format_key(current, key)
+                continue
+            theirs = other._table(current)
+            low = 0
+            for key in self.keys(current):
+                low = bisect_left(theirs, key, low)
+                if low == len(theirs) or theirs[low] != key:
+                    yield _format_key(current, key)
+
+    @staticmethod
+    def build(
+        directory: str,
+        indicators: Iterable[str],
+        chunk_size: int = INDICATOR_BUILD_CHUNK,
+    ) -> "IndicatorStore":
+        """
+        Writes a store from indicators, deduplicating them
+
+        Indicators are sorted in chunks that are spilled to run files and
+        merged, so feeds larger than memory can be built. The store is written
+        next to the directory and swapped in when complete, so readers never
+        see a partial store and a store can be rebuilt from its own contents.
+
+        Args:
+        - directory (str): The store directory, replaced if it exists
+        - indicators (Iterable[str]): The raw indicators (IPs, domains, hashes, URLs, ...)
+        - chunk_size (int): Indicators per kind sorted in memory at once
+
+        Returns:
+        - IndicatorStore: The opened store
+        """
+
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".indicators-", dir=parent)
+        try:
+            with tempfile.TemporaryDirectory(prefix="threatqueryx-runs-") as runs_dir:
+                runs: Dict[str, List[str]] = {kind: [] for kind in KINDS}
+                buffers: Dict[str, List[Any]] = {kind: [] for kind in KINDS}
+
+                def spill(kind: str) -> None:
+                    path = os.path.join(runs_dir, f"{kind}-{len(runs[kind])}.run")
+                    with open(path, "wb") as handle:
+                        _write_run(handle, kind, list(_unique(sorted(buffers[kind]))))
+                    runs[kind].append(path)
+                    buffers[kind].clear()
+
+                for value in indicators:
+                    classified = classify_indicator(str(value))
+                    if classified is None:
+                        continue
+                    kind, key = classified
+                    buffers[kind].append(key)
+                    if len(buffers[kind]) >= chunk_size:
+                        spill(kind)
+
+                counts = {}
+                for kind in KINDS:
+                    if buffers[kind] or not runs[kind]:
+                        spill(kind)
+                    merged = _unique(
+                        heapq.merge(*(_read_run(path, kind) for path in runs[kind]))
+                    )
+                    counts[kind] = _write_kind(staging, kind, merged)
+
+            with open(
+                os.path.join(staging, MANIFEST), "w", encoding=DEFAULT_ENCODING
+            ) as f:
+                json.dump(
+                    {
+                        "version": STORE_VERSION,
+                        "byteorder": sys.byteorder,
+                        "counts": counts,
+                    },
+                    f,
+                    indent=2,
+                )
+
+            previous = None
+            if os.path.exists(directory):
+                previous = f"{staging}.old"
+                os.replace(directory, previous)
+            os.replace(staging, directory)
+            if previous is not None:
+                shutil.rmtree(previous, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return IndicatorStore(directory)
+
+
+def _write_kind(directory: str, kind: str, keys: Iterator[Any]) -> int:
+    """
+    Writes the final files of one kind from its sorted, unique keys
+
+    Returns:
+    - int: The number of indicators written
+    """
+
+    count = 0
+    if kind in ("ipv4", "ipv6"):
+        name = "ipv4.u32" if kind == "ipv4" else "ipv6.b16"
+        with open(os.path.join(directory, name), "wb") as handle:
+            block: List[Any] = []
+            for key in keys:
+                block.append(key)
+                if len(block) >= 65_536:
+                    _write_run(handle, kind, block)
+                    count += len(block)
+                    block = []
+            _write_run(handle, kind, block)
+            count += len(block)
+        return count
+
+    offset = 0
+    with (
+        open(os.path.join(directory, f"{kind}.hashes"), "wb") as hashes,
+        open(os.path.join(directory, f"{kind}.offsets"), "wb") as offsets,
+        open(os.path.join(directory, f"{kind}.values"), "wb") as values,
+    ):
+        hash_block, offset_block = array("Q"), array("Q")
+        for hashed, encoded in keys:
+            hash_block.append(hashed)
+            offset_block.append(offset)
+            values.write(encoded)
+            offset += len(encoded)
+            count += 1
+            if len(hash_block) >= 65_536:
+                hash_block.tofile(hashes)
+                offset_block.tofile(offsets)
+                hash_block, offset_block = array("Q"), array("Q")
+        hash_block.tofile(hashes)
+        if count:
+            offset_block.append(offset)  # End of the last value
+        offset_block.tofile(offsets)
+    return count
+
+
+def render_ip_queries(
+    store: IndicatorStore,
+    template: Dict[str, Any],
+    field: str,
+    duration: str,
+    platform: str,
+    base_queries: Dict[str, str],
+    inputs: Optional[Dict[str, str]] = None,
+    exclude: Optional[IndicatorStore] = None,
+    include_post_pipeline: bool = False,
+    batch_size: int = WORKFLOW_BATCH_SIZE,
+) -> Iterator[str]:
+    """
+    Renders a template for every IP of the store, batched into IN-lists
+
+    Args:
+    - store (IndicatorStore): The indicator store
+    - template (Dict[str, Any]): The template
+    - field (str): An optional field of the template with 'validation: ip'
+    - duration (str): A duration from normalize_lookback
+    - platform (str): The platform name
+    - base_queries (Dict[str, str]): The base queries of the platform
+    - inputs (Optional[Dict[str, str]]): Values of the other optional fields
+    - exclude (Optional[IndicatorStore]): IPs to skip, e.g. those hunted before
+    - include_post_pipeline (bool): Whether to include the Defender post_pipeline
+    - batch_size (int): IPs per query
+
+    Returns:
+    - Iterator[str]: The queries, generated lazily
+    """
+
+    meta = template.get("optional_fields", {}).get(field)
+    if not isinstance(meta, dict) or meta.get("validation") != "ip":
+        raise ValueError(
+            f"Optional field '{field}' is not an IP field ('validation: ip')"
+        )
+
+    inputs = {key: value for key, value in (inputs or {}).items() if key != field}
+    ips: Iterable[str] = (
+        (
+            value
+            for kind in ("ipv4", "ipv6")
+            for value in store.difference(exclude, kind)
+        )
+        if exclude is not None
+        else (value for kind in ("ipv4", "ipv6") for value in store.values(kind))
+    )
+
+    batch: List[str] = []
+    for ip in ips:
+        batch.append(ip)
+        if len(batch) == batch_size:
+            yield from build_batched_queries(
+                template,
+                inputs,
+                {field: batch},
+                duration,
+                platform,
+                base_queries,
+                include_post_pipeline,
+                batch_size,
+            )
+            batch = []
+    if batch:
+        yield from build_batched_queries(
+            template,
+            inputs,
+            {field: batch},
+            duration,
+            platform,
+            base_queries,
+            include_post_pipeline,
+            batch_size,
+        )
+
+
+def _read_feeds(paths: List[str]) -> Iterator[str]:
+    for path in paths:
+        with open(path, "r", encoding=DEFAULT_ENCODING, errors="replace") as f:
+            for line in f:
+                value = line.split("#", 1)[0].strip().strip(",")
+                if value:
+                    yield value
+
+
+def _values_then_close(store: IndicatorStore) -> Iterator[str]:
+    # Closes the store once read, so a build can replace its directory while
+    # still consuming later feeds (open maps cannot be renamed on Windows)
+    yield from store.values()
+    store.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Builds, queries and renders from indicator stores
+
+    Args:
+    - argv (Optional[List[str]]): Command line arguments, defaults to sys.argv
+
+    Returns:
+    - int: 0 on success, 1 on errors or when a 'contains' lookup misses
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.indicator_store", description="Memory-mapped IOC store"
+    )
+    parser.add_argument("--store", default=INDICATOR_STORE_DIR, help="Store directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser(
+        "build", help="Build the store from feed files (one indicator per line)"
+    )
+    build.add_argument("feeds", nargs="+")
+    build.add_argument(
+        "--append", action="store_true", help="Keep the indicators already in the store"
+    )
+
+    contains = commands.add_parser(
+        "contains", help="Check whether indicators are in the store"
+    )
+    contains.add_argument("values", nargs="+")
+
+    diff = commands.add_parser(
+        "diff", help="Print indicators missing from another store"
+    )
+    diff.add_argument(
+        "--against", required=True, help="Store to subtract (e.g., hunted indicators)"
+    )
+    diff.add_argument("--kind", choices=KINDS)
+
+    render = commands.add_parser(
+        "render", help="Render a template for every IP in the store"
+    )
+    render.add_argument("--platform", choices=PLATFORMS, required=True)
+    render.add_argument("--template", required=True)
+    render.add_argument(
+        "--field", required=True, help="Optional field with 'validation: ip'"
+    )
+    render.add_argument("--lookback", default="1h")
+    render.add_argument("--exclude", help="Store of IPs to skip")
+    render.add_argument("--batch-size", type=int, default=WORKFLOW_BATCH_SIZE)
+    add_profiling_arguments(render)
+
+    commands.add_parser("stats", help="Print the number of indicators per kind")
+    args = parser.parse_args(argv)
+
+    try:
+        match args.command:
+            case "build":
+                values: Iterable[str] = _read_feeds(args.feeds)
+                existing = (
+                    IndicatorStore(args.store)
+                    if args.append and os.path.exists(args.store)
+                    else None
+                )
+                try:
+                    if existing is not None:
+                        values = (
+                            value
+                            for source in (_values_then_close(existing), values)
+                            for value in source
+                        )
+                    with IndicatorStore.build(args.store, values) as store:
+                        print(
+                            f"{len(store)} indicators in {args.store}: {store.counts}"
+                        )
+                finally:
+                    if existing is not None:
+                        existing.close()
+            case "contains":
+                with IndicatorStore(args.store) as store:
+                    found = [value in store for value in args.values]
+                for value, hit in zip(args.values, found):
+                    print(f"{'yes' if hit else 'no '}  {value}")
+                return 0 if all(found) else 1
+            case "diff":
+                with (
+                    IndicatorStore(args.store) as store,
+                    IndicatorStore(args.against) as other,
+                ):
+                    for value in store.difference(other, args.kind):
+                        print(value)
+            case "render":
+                duration = normalize_lookback(args.lookback, args.platform)
+                if duration is None:
+                    parser.error(f"Invalid lookback '{args.lookback}'")
+                templates = load_templates(args.platform)
+                template = templates.get(args.template)
+                if not isinstance(template, dict) or args.template == "base_queries":
+                    parser.error(
+                        f"Unknown template '{args.template}' for {args.platform}"
+                    )
+                exclude = IndicatorStore(args.exclude) if args.exclude else None
+                with profiling_from_args(args), IndicatorStore(args.store) as store:
+                    for query in render_ip_queries(
+                        store,
+                        template,
+                        args.field,
+                        duration,
+                        args.platform,
+                        templates.get("base_queries", {}),
+                        exclude=exclude,
+                        batch_size=args.batch_size,
+                    ):
+                        print(query + "\n")
+                if exclude is not None:
+                    exclude.close()
+            case "stats":
+                with IndicatorStore(args.store) as store:
+                    for kind, count in store.counts.items():
+                        print(f"{kind:>8}  {count}")
+    except (OSError, ValueError) as e:
+        print(f"Indicator store failed: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+import argparse
+import re
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils.configuration import load_templates
+from utils.emitters import get_emitter
+from utils.ui_constants import PLATFORMS
+
+"""
+Static query cost linter for templates
+"""
+
+
+@dataclass(frozen=True)
+class LintRule:
+    """
+    An expensive query construct with a cheaper alternative
+    """
+
+    name: str
+    pattern: re.Pattern
+    message: str
+    suggestion: str
+
+
+@dataclass(frozen=True)
+class Finding:
+    """
+    A rule match in a template condition, with the cost of the condition
+    """
+
+    platform: str
+    template: str
+    location: str
+    rule: LintRule
+    snippet: str
+    cost: int
+
+
+def _rule(name: str, pattern: str, message: str, suggestion: str) -> LintRule:
+    """
+    Creates a lint rule with a case-insensitive pattern
+
+    Args:
+    - name (str): Short rule identifier shown in reports
+    - pattern (str): Regular expression matching the expensive construct
+    - message (str): Why the construct is expensive
+    - suggestion (str): A cheaper alternative
+
+    Returns:
+    - LintRule: The compiled rule
+    """
+
+    return LintRule(name, re.compile(pattern, re.IGNORECASE), message, suggestion)
+
+
+RULES: Dict[str, Tuple[LintRule, ...]] = {
+    "qradar": (
+        _rule(
+            "regex-match",
+            r"\bi?matches\b",
+            "Regular expression matching is evaluated on every event",
+            "Use '=' or a prefix ilike on an indexed property",
+        ),
+        _rule(
+            "double-wildcard-ilike",
+            r"\bi?like\s*'%[^']*%'",
+            "Double-sided wildcard (ilike '%value%') cannot use an index",
+            "Use '=' or a trailing wildcard (ilike 'value%')",
+        ),
+        _rule(
+            "leading-wildcard-ilike",
+            r"\bi?like\s*'%[^'%]*'",
+            "Leading wildcard (ilike '%value') cannot use an index",
+            "Use '=' or a trailing wildcard (ilike 'value%')",
+        ),
+        _rule(
+            "function-on-field",
+            r"\b\w+\(\w+\)\s*(=|i?like)",
+            "Comparing a function result forces per-event evaluation",
+            "Filter on the raw id (e.g., logsourceid = <id>) instead of its name",
+        ),
+        _rule(
+            "arithmetic-on-field",
+            r"\(\s*\w+\s*[-+*/%]\s*\w+",
+            "Arithmetic on a field disables index lookups",
+            "Compare the field against a precomputed range (e.g., category BETWEEN ...)",
+        ),
+    ),
+    "defender": (
+        _rule(
+            "regex-match",
+            r"\bmatches\s+regex\b",
+            "Regular expression matching scans every value",
+            "Use has, has_any or startswith where possible",
+        ),
+        _rule(
+            "aggregation-in-filter",
+            r"\|\s*summarize\b",
+            "Aggregation embedded in a required field runs before later filters",
+            "Keep required fields to conditions; aggregate in post_pipeline",
+        ),
+        _rule(
+            "contains",
+            r"\bcontains\b",
+            "'contains' performs a substring scan instead of a term index lookup",
+            "Use 'has' for whole terms, or 'has_cs' when case is known",
+        ),
+        _rule(
+            "function-on-column",
+            r"\b(strlen|tolower|toupper|substring|extract)\(",
+            "Functions on a column are evaluated for every row",
+            "Filter on indexed columns first, or precompute the value",
+        ),
+        _rule(
+            "endswith",
+            r"\bendswith\b",
+            "'endswith' cannot use the term index",
+            "Use 'hassuffix' for term suffixes",
+        ),
+        _rule(
+            "single-equals",
+            r"(?<![=!<>~])=(?![=~])",
+            "A single '=' is not a KQL comparison operator",
+            "Use '==' for comparisons",
+        ),
+    ),
+    "elastic": (
+        _rule(
+            "double-wildcard",
+            r":\s*\*[^\s*]*\*",
+            "Double-sided wildcard (*value*) expands against every term of the field",
+            "Use an exact match, a trailing wildcard (value*) or a wildcard field type",
+        ),
+        _rule(
+            "leading-wildcard",
+            r":\s*\*[^\s*)]+(?=[\s)]|$)",
+            "Leading wildcard (*value) expands against every term of the field",
+            "Use an exact match or a trailing wildcard (value*)",
+        ),
+        _rule(
+            "wildcard-on-text",
+            r"\bmessage:\s*\S*\*",
+            "Wildcards on the analysed message field are slow and imprecise",
+            "Search a keyword field such as event.code or a parsed field",
+        ),
+    ),
+}
+
+
+def iter_conditions(template: Dict[str, Any]) -> Iterator[Tuple[str, str]]:
+    """
+    Walks every condition of a template, including optional field patterns
+
+    Args:
+    - template (Dict[str, Any]): A template dictionary containing query structure
+
+    Returns:
+    - Iterator[Tuple[str, str]]: Each condition location with its text
+    """
+
+    for i, condition in enumerate(template.get("required_fields", [])):
+        yield f"required_fields[{i}]", condition
+
+    for name, meta in template.get("optional_fields", {}).items():
+        if isinstance(meta, dict) and "pattern" in meta:
+            yield f"optional_fields.{name}", meta["pattern"]
+
+
+def lint_template(platform: str, name: str, template: Dict[str, Any]) -> List[Finding]:
+    """
+    Lints the conditions of a single template
+
+    The cost of a flagged condition comes from the platform emitter's cost
+    model, the same one the optimizer orders predicates by.
+
+    Args:
+    - platform (str): The platform of the template
+    - name (str): The template name
+    - template (Dict[str, Any]): A template dictionary containing query structure
+
+    Returns:
+    - List[Finding]: The expensive constructs found
+    """
+
+    emitter = get_emitter(platform)
+    findings = []
+    for location, condition in iter_conditions(template):
+        cost = None
+        for rule in RULES.get(platform, ()):
+            if rule.pattern.search(condition):
+                if cost is None:
+                    cost = emitter.condition_cost(condition)
+                findings.append(
+                    Finding(platform, name, location, rule, condition, cost)
+                )
+    return findings
+
+
+def template_cost(findings: List[Finding]) -> int:
+    """
+    Estimates the scan cost of a template from its findings
+
+    Each flagged condition counts once, however many rules it matched.
+
+    Args:
+    - findings (List[Finding]): The findings of one template
+
+    Returns:
+    - int: A relative cost score, 1 for a template without findings
+    """
+
+    return 1 + sum({finding.location: finding.cost for finding in findings}.values())
+
+
+def lint_platform(platform: str, templates: Dict[str, Any]) -> Dict[str, List[Finding]]:
+    """
+    Lints every template of a platform
+
+    Args:
+    - platform (str): The platform name
+    - templates (Dict[str, Any]): The loaded templates, base_queries is skipped
+
+    Returns:
+    - Dict[str, List[Finding]]: The findings keyed by template name
+    """
+
+    return {
+        name: lint_template(platform, name, template)
+        for name, template in templates.items()
+        if name != "base_queries" and isinstance(template, dict)
+    }
+
+
+def format_report(platform: str, results: Dict[str, List[Finding]]) -> str:
+    """
+    Formats the lint results of a platform
+
+    Args:
+    - platform (str): The platform name
+    - results (Dict[str, List[Finding]]): The findings keyed by template name
+
+    Returns:
+    - str: A human readable report
+    """
+
+    lines = [f"== {platform} =="]
+    total = 0
+    for name, findings in results.items():
+        cost = template_cost(findings)
+        total += cost
+        lines.append(f"{name}: cost {cost}")
+        for finding in findings:
+            lines.append(
+                f"  [{finding.rule.name}] {finding.location} (cost {finding.cost}): {finding.snippet}"
+            )
+            lines.append(f"    {finding.rule.message}")
+            lines.append(f"    Suggestion: {finding.rule.suggestion}")
+    lines.append(f"Total cost for {platform}: {total}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Lints templates and optionally fails when a template exceeds a cost budget
+
+    Args:
+    - argv (Optional[List[str]]): Command line arguments, defaults to sys.argv
+
+    Returns:
+    - int: 0 when all templates are within budget, 1 otherwise
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.lint", description="Estimate the scan cost of templates"
+    )
+    parser.add_argument(
+        "--platform",
+        choices=PLATFORMS,
+        action="append",
+        help="Platform to lint (repeatable, default: all)",
+    )
+    parser.add_argument(
+        "--max-cost",
+        type=int,
+        default=None,
+        help="Fail when any template scores above this cost",
+    )
+    args = parser.parse_args(argv)
+
+    over_budget = []
+    for platform in args.platform or PLATFORMS:
+        results = lint_platform(platform, load_templates(platform))
+        print(format_report(platform, results))
+        print()
+        if args.max_cost is not None:
+            over_budget.extend(
+                f"{platform}.{name}"
+                for name, findings in results.items()
+                if template_cost(findings) > args.max_cost
+            )
+
+    if over_budget:
+        print(f"Templates over cost budget {args.max_cost}: {', '.join(over_budget)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import re
+from dataclasses import replace
+from typing import Callable, List, Sequence, Set, Tuple
+
+from utils.emitters import QueryEmitter, get_emitter
+from utils.query_ir import Predicate, QueryIR, split_conditions
+
+"""
+Query IR optimisation passes
+"""
+
+OptimizationPass = Callable[[QueryIR, QueryEmitter], QueryIR]
+
+# Pipeline stages after which the raw event Timestamp is no longer available
+AGGREGATION_STAGE = re.compile(r"^(summarize|count|distinct|make-series|top-nested)\b")
+
+
+def split_predicates(ir: QueryIR, emitter: QueryEmitter) -> QueryIR:
+    """
+    Splits conjunctions into separate predicates and hoists embedded pipeline stages
+
+    A required field such as "A and B | summarize count() by C" becomes the
+    predicates A and B, with the summarize stage moved after all filters.
+
+    Args:
+    - ir (QueryIR): The query structure
+    - emitter (QueryEmitter): The emitter of the target platform
+
+    Returns:
+    - QueryIR: The query structure with one condition per predicate
+    """
+
+    predicates: List[Predicate] = []
+    stages = list(ir.stages)
+    for predicate in ir.predicates:
+        if predicate.text is None or emitter.is_reorder_barrier(predicate.text):
+            predicates.append(predicate)
+            continue
+
+        condition, embedded = emitter.split_predicate_stages(predicate.text)
+        stages.extend(embedded)
+
+        if len(split_conditions(condition, "or")) > 1:
+            parts = [condition]
+        else:
+            parts = split_conditions(condition)
+        predicates.extend(Predicate(part, origin=predicate.origin) for part in parts)
+
+    return replace(ir, predicates=predicates, stages=stages)
+
+
+def merge_predicates(ir: QueryIR, emitter: QueryEmitter) -> QueryIR:
+    """
+    Drops predicates that repeat an earlier predicate
+
+    Args:
+    - ir (QueryIR): The query structure
+    - emitter (QueryEmitter): The emitter of the target platform
+
+    Returns:
+    - QueryIR: The query structure without duplicate predicates
+    """
+
+    seen: Set[Tuple[str, ...]] = set()
+    predicates: List[Predicate] = []
+    for predicate in ir.predicates:
+        rendered = emitter.render_predicate(predicate)
+        equality = emitter.parse_equality(rendered)
+        key = ("=",) + equality if equality else (rendered.strip(),)
+        if key in seen:
+            continue
+        seen.add(key)
+        predicates.append(predicate)
+    return replace(ir, predicates=predicates)
+
+
+def fold_in_lists(ir: QueryIR, emitter: QueryEmitter) -> QueryIR:
+    """
+    Folds disjunctions of equalities on a single field into membership tests
+
+    For example "(port = 80 or port = 443)" becomes "port IN (80, 443)".
+
+    Args:
+    - ir (QueryIR): The query structure
+    - emitter (QueryEmitter): The emitter of the target platform
+
+    Returns:
+    - QueryIR: The query structure with folded predicates
+    """
+
+    predicates: List[Predicate] = []
+    for predicate in ir.predicates:
+        group = (
+            emitter.parse_equality_group(predicate.text)
+            if predicate.text is not None
+            else None
+        )
+        if group and len(group[1]) > 1:
+            field, values = group
+            predicate = Predicate(
+                None, field, "in", tuple(dict.fromkeys(values)), predicate.origin
+            )
+        predicates.append(predicate)
+    return replace(ir, predicates=predicates)
+
+
+def order_predicates(ir: QueryIR, emitter: QueryEmitter) -> QueryIR:
+    """
+    Places the time filter first, followed by predicates from cheapest to most expensive
+
+    Queries whose conditions rely on their template position (e.g., an AQL
+    GROUP BY embedded in a required field) keep their original order.
+    Ordering by Timestamp is dropped once an aggregation stage removes it.
+
+    Args:
+    - ir (QueryIR): The query structure
+    - emitter (QueryEmitter): The emitter of the target platform
+
+    Returns:
+    - QueryIR: The reordered query structure
+    """
+
+    if any(
+        emitter.is_reorder_barrier(emitter.render_predicate(predicate))
+        for predicate in ir.predicates
+    ):
+        return ir
+
+    predicates = sorted(ir.predicates, key=emitter.predicate_cost)
+    order_by = ir.order_by
+    stages = ir.stages + ir.post_pipeline
+    if order_by is None and any(AGGREGATION_STAGE.match(stage) for stage in stages):
+        order_by = []
+
+    return replace(ir, predicates=predicates, order_by=order_by, time_filter_first=True)
+
+
+# Passes that rewrite each predicate on its own, so they can run per predicate
+PREDICATE_PASSES: Tuple[OptimizationPass, ...] = (split_predicates, fold_in_lists)
+# Passes that look at all predicates together
+QUERY_PASSES: Tuple[OptimizationPass, ...] = (merge_predicates, order_predicates)
+
+DEFAULT_PASSES: Tuple[OptimizationPass, ...] = PREDICATE_PASSES + QUERY_PASSES
+
+
+def optimize(
+    ir: QueryIR, platform: str, passes: Sequence[OptimizationPass] = DEFAULT_PASSES
+) -> QueryIR:
+    """
+    Runs optimisation passes over a query structure
+
+    Args:
+    - ir (QueryIR): The query structure
+    - platform (str): The platform the query targets
+    - passes (Sequence[OptimizationPass]): The passes to run, in order
+
+    Returns:
+    - QueryIR: The optimised query structure
+    """
+
+    emitter = get_emitter(platform)
+    for optimization_pass in passes:
+        ir = optimization_pass(ir, emitter)
+    return ir
@@ -0,0 +1,387 @@
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from utils.ui_constants import (
+    DEFAULT_ENCODING,
+    PROFILE_DIR,
+    PROFILE_MEMORY_SNAPSHOTS,
+    PROFILE_SAMPLE_INTERVAL_MS,
+    PROFILE_TOP_ALLOCATIONS,
+)
+
+"""
+Profiling hooks for interactive and batch runs
+"""
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# The profiler of the current run, None when profiling is off
+_active: Optional["Profiler"] = None
+
+# cProfile hooks are per thread before 3.12; from 3.12 one profile is active per
+# process, so worker threads are covered by the run profile instead
+_PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+
+@dataclass
+class PhaseStats:
+    """
+    Accumulated timing and memory of one phase (e.g., build_query)
+    """
+
+    calls: int = 0
+    total: float = 0.0
+    longest: float = 0.0
+    allocated: int = 0
+    snapshots: int = 0
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    # Leaves out the allocations of the profiler itself
+    return tracemalloc.take_snapshot().filter_traces(
+        [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ]
+    )
+
+
+class _Sampler(threading.Thread):
+    """
+    Records the stacks of all threads at a fixed interval, for long batches
+    where deterministic profiling is too slow
+    """
+
+    def __init__(self, interval: float) -> None:
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} "
+                        f"({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+                    )
+                    frame = frame.f_back
+                if stack:
+                    # Stacks are rooted at their thread, so worker pools are told apart
+                    stack.append(names.get(thread_id, str(thread_id)))
+                    self.stacks[";".join(reversed(stack))] += 1
+
+
+class Profiler:
+    def __init__(
+        self,
+        output_dir: str = PROFILE_DIR,
+        profile: bool = False,
+        trace_memory: bool = False,
+        sample_interval: Optional[float] = None,
+        top: int = PROFILE_TOP_ALLOCATIONS,
+    ) -> None:
+        """
+        Collects per-phase timing, cProfile statistics, allocations and stack samples
+
+        Args:
+        - output_dir (str): Directory receiving the reports
+        - profile (bool): Whether to profile with cProfile and write pstats files
+        - trace_memory (bool): Whether to trace allocations with tracemalloc
+        - sample_interval (Optional[float]): Stack sampling interval in seconds, or None
+        - top (int): Allocation sites reported per phase
+        """
+
+        self.output_dir = output_dir
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.sample_interval = sample_interval
+        self.top = top
+        self.phases: Dict[str, PhaseStats] = {}
+        self.allocations: Dict[str, Counter] = {}
+        # Profiles of a phase, one per thread, keyed by (phase, thread id)
+        self.profiles: Dict[Tuple[str, int], cProfile.Profile] = {}
+        self._lock = threading.Lock()
+        self._thread_id = threading.get_ident()
+        self._local = threading.local()
+        self._run_profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[_Sampler] = None
+        self._started = 0.0
+
+    def start(self) -> None:
+        global _active
+        self._started = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.sample_interval:
+            self._sampler = _Sampler(self.sample_interval)
+            self._sampler.start()
+        if self.profile:
+            self._run_profile = cProfile.Profile()
+            self._run_profile.enable()
+        _active = self
+
+    def stop(self) -> List[str]:
+        """
+        Stops profiling and writes the reports
+
+        Returns:
+        - List[str]: Paths of the written reports
+        """
+
+        global _active
+        _active = None
+        if self._run_profile is not None:
+            self._run_profile.disable()
+        if self._sampler is not None:
+            self._sampler.stopped.set()
+            self._sampler.join()
+        elapsed = time.perf_counter() - self._started
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(
+            self.output_dir, f"threatqueryx-{datetime.now():%Y%m%d-%H%M%S}"
+        )
+        written = [self._write_summary(f"{prefix}.txt", elapsed)]
+
+        if self._run_profile is not None:
+            # Phases whose profile never recorded a call are left out
+            by_phase: Dict[str, List[cProfile.Profile]] = {}
+            for (name, _), profile in self.profiles.items():
+                profile.create_stats()
+                if profile.stats:
+                    by_phase.setdefault(name, []).append(profile)
+            for name, profiles in sorted(by_phase.items()):
+                path = f"{prefix}.{name}.pstats"
+                pstats.Stats(*profiles).dump_stats(path)
+                written.append(path)
+            stats = pstats.Stats(self._run_profile)
+            for profiles in by_phase.values():
+                for profile in profiles:
+                    stats.add(profile)
+            stats.dump_stats(f"{prefix}.pstats")
+            written.append(f"{prefix}.pstats")
+
+        if self._sampler is not None:
+            path = f"{prefix}.samples.txt"
+            with open(path, "w", encoding=DEFAULT_ENCODING) as f:
+                for stack, count in self._sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            written.append(path)
+
+        if self.trace_memory:
+            tracemalloc.stop()
+        return written
+
+    def _write_summary(self, path: str, elapsed: float) -> str:
+        lines = [
+            f"Run: {elapsed:.3f}s",
+            "",
+            "Phase                  calls     total      mean       max",
+        ]
+        for name, phase in sorted(self.phases.items()):
+            lines.append(
+                f"{name:<20} {phase.calls:>7} {phase.total:>8.4f}s "
+                f"{phase.total / phase.calls * 1e3:>7.3f}ms {phase.longest * 1e3:>7.3f}ms"
+            )
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            lines += [
+                "",
+                f"Traced memory: {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB",
+            ]
+            for name, sites in sorted(self.allocations.items()):
+                phase = self.phases[name]
+                lines += [
+                    "",
+                    f"Top allocations in {name} (first {phase.snapshots} of {phase.calls} calls, "
+                    f"{phase.allocated / 1024:+.1f} KiB net over all calls):",
+                ]
+                for site, size in sites.most_common(self.top):
+                    lines.append(f"  {size / 1024:>+10.1f} KiB  {site}")
+        with open(path, "w", encoding=DEFAULT_ENCODING) as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Measures a phase of the run
+
+        Only the outermost phase of each thread (of the main thread from
+        Python 3.12) gets its own cProfile statistics; the first calls of each
+        phase are diffed with tracemalloc snapshots to attribute their
+        allocations. Snapshots are process-wide, so concurrent phases may be
+        attributed each other's allocations.
+
+        Args:
+        - name (str): The phase name (e.g., "template_load", "build_query")
+        """
+
+        thread_id = threading.get_ident()
+        depth = getattr(self._local, "depth", 0)
+        profile = None
+        snapshot = None
+        with self._lock:
+            stats = self.phases.setdefault(name, PhaseStats())
+            if (
+                self.trace_memory
+                and depth == 0
+                and stats.snapshots < PROFILE_MEMORY_SNAPSHOTS
+            ):
+                stats.snapshots += 1
+                snapshot = _snapshot()
+            if (
+                self.profile
+                and depth == 0
+                and (thread_id == self._thread_id or _PER_THREAD_PROFILES)
+            ):
+                profile = self.profiles.get((name, thread_id), cProfile.Profile())
+        self._local.depth = depth + 1
+        if profile is not None:
+            if thread_id == self._thread_id:
+                self._run_profile.disable()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler (e.g., a debugger) holds the interpreter
+                if thread_id == self._thread_id:
+                    self._run_profile.enable()
+                profile = None
+            else:
+                with self._lock:
+                    self.profiles.setdefault((name, thread_id), profile)
+        memory_before = tracemalloc.get_traced_memory()[0] if self.trace_memory else 0
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            if profile is not None:
+                profile.disable()
+                if thread_id == self._thread_id:
+                    self._run_profile.enable()
+            allocated = (
+                tracemalloc.get_traced_memory()[0] - memory_before
+                if self.trace_memory
+                else 0
+            )
+            diffs = []
+            if snapshot is not None:
+                diffs = _snapshot().compare_to(snapshot, "lineno")
+            with self._lock:
+                stats.calls += 1
+                stats.total += elapsed
+                stats.longest = max(stats.longest, elapsed)
+                stats.allocated += allocated
+                sites = self.allocations.setdefault(name, Counter())
+                for diff in diffs:
+                    if diff.size_diff:
+                        sites[str(diff.traceback[0])] += diff.size_diff
+            self._local.depth = depth
+
+
+def profiled(name: str) -> Callable[[F], F]:
+    """
+    Records calls of a function as a phase while a profiler is active
+
+    Args:
+    - name (str): The phase name
+
+    Returns:
+    - Callable[[F], F]: A decorator, costing one global lookup when profiling is off
+    """
+
+    def decorator(function: F) -> F:
+        @wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            profiler = _active
+            if profiler is None:
+                return function(*args, **kwargs)
+            with profiler.phase(name):
+                return function(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def add_profiling_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds --profile, --trace-memory, --sample and --profile-dir to a parser
+
+    Args:
+    - parser (argparse.ArgumentParser): The parser of an entry point
+    """
+
+    group = parser.add_argument_group("profiling")
+    group.add_argument(
+        "--profile", action="store_true", help="Write cProfile pstats files per phase"
+    )
+    group.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Report top allocations per phase with tracemalloc",
+    )
+    group.add_argument(
+        "--sample",
+        type=int,
+        nargs="?",
+        const=PROFILE_SAMPLE_INTERVAL_MS,
+        metavar="MS",
+        help="Sample stacks every MS milliseconds "
+        f"(default {PROFILE_SAMPLE_INTERVAL_MS}), for long batches",
+    )
+    group.add_argument(
+        "--profile-dir", default=PROFILE_DIR, help="Directory receiving the reports"
+    )
+
+
+@contextmanager
+def profiling_from_args(args: argparse.Namespace) -> Iterator[Optional[Profiler]]:
+    """
+    Profiles the enclosed run as requested on the command line
+
+    Args:
+    - args (argparse.Namespace): Arguments parsed with add_profiling_arguments
+
+    Returns:
+    - Iterator[Optional[Profiler]]: The active profiler, or None when profiling is off
+    """
+
+    if not (args.profile or args.trace_memory or args.sample):
+        yield None
+        return
+    if args.sample is not None and args.sample <= 0:
+        raise ValueError("--sample interval must be positive")
+
+    profiler = Profiler(
+        args.profile_dir,
+        args.profile,
+        args.trace_memory,
+        args.sample / 1000 if args.sample else None,
+    )
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        for path in profiler.stop():
+            print(f"Profile written to {path}", file=sys.stderr)
@@ -0,0 +1,456 @@
+import argparse
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.configuration import get_logger, normalize_lookback, read_templates
+from utils.generate_queries import build_query
+from utils.ui_constants import (
+    HISTORY_DB,
+    HISTORY_FLUSH_INTERVAL_SECONDS,
+    HISTORY_SEARCH_LIMIT,
+    HISTORY_WRITE_BATCH,
+    PLATFORMS,
+)
+
+logger = get_logger()
+
+"""
+Persistent query history
+"""
+
+# Columns of the queries table, in the order of HistoryEntry
+COLUMNS = (
+    "id, created_at, platform, template, inputs, duration, include_post_pipeline, query"
+)
+
+
+@dataclass
+class HistoryEntry:
+    """
+    A generated query with everything needed to render it again
+    """
+
+    id: int
+    created_at: datetime
+    platform: str
+    template: str
+    inputs: Dict[str, str]
+    duration: str
+    include_post_pipeline: bool
+    query: str
+
+    @classmethod
+    def from_row(cls, row: Tuple[Any, ...]) -> "HistoryEntry":
+        (
+            entry_id,
+            created_at,
+            platform,
+            template,
+            inputs,
+            duration,
+            include_post,
+            query,
+        ) = row
+        return cls(
+            entry_id,
+            datetime.fromisoformat(created_at),
+            platform,
+            template,
+            json.loads(inputs),
+            duration,
+            bool(include_post),
+            query,
+        )
+
+    @property
+    def summary(self) -> str:
+        inputs = ", ".join(f"{key}={value}" for key, value in self.inputs.items())
+        created = f"{self.created_at.astimezone():%Y-%m-%d %H:%M}"
+        return f"{created}  {self.platform}/{self.template}  {self.duration}  {inputs}"
+
+
+def fts_query(text: str) -> str:
+    """
+    Turns free text into an FTS5 query matching every word as a prefix
+
+    Args:
+    - text (str): The search text (e.g., "failed admin")
+
+    Returns:
+    - str: The FTS5 query, with the words quoted so that operators are not interpreted
+    """
+
+    return " ".join('"{}"*'.format(word.replace('"', '""')) for word in text.split())
+
+
+class QueryHistory:
+    def __init__(
+        self,
+        path: str = HISTORY_DB,
+        batch_size: int = HISTORY_WRITE_BATCH,
+        flush_interval: float = HISTORY_FLUSH_INTERVAL_SECONDS,
+    ) -> None:
+        """
+        SQLite history of generated queries with a full-text index
+
+        record() only enqueues the query; a background thread writes queued
+        queries in batches, one transaction each, so recording adds no latency
+        to generation. Searches use an FTS5 index over the platform, template,
+        inputs and query text, falling back to LIKE when SQLite lacks FTS5.
+
+        Args:
+        - path (str): Path to the SQLite database, created with its directory if missing
+        - batch_size (int): Maximum queries written per transaction
+        - flush_interval (float): Seconds the writer waits for more queries to commit
+        """
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._pending: "queue.Queue[Optional[Tuple[Any, ...]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._closed = False
+
+        with self._lock, self._connection:
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS queries (
+                    id INTEGER PRIMARY KEY,
+                    created_at TEXT NOT NULL,
+                    platform TEXT NOT NULL,
+                    template TEXT NOT NULL,
+                    inputs TEXT NOT NULL,
+                    duration TEXT NOT NULL,
+                    include_post_pipeline INTEGER NOT NULL,
+                    query TEXT NOT NULL
+                )
+                """)
+            self.fts = self._create_index()
+
+    def _create_index(self) -> bool:
+        try:
+            self._connection.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS queries_fts USING fts5(
+                    platform, template, inputs, query,
+                    content='queries', content_rowid='id'
+                )
+                """)
+        except sqlite3.OperationalError:
+            logger.info("SQLite has no FTS5, query history searches fall back to LIKE")
+            return False
+        self._connection.executescript("""
+            CREATE TRIGGER IF NOT EXISTS queries_ai AFTER INSERT ON queries BEGIN
+                INSERT INTO queries_fts (rowid, platform, template, inputs, query)
+                VALUES (new.id, new.platform, new.template, new.inputs, new.query);
+            END;
+            CREATE TRIGGER IF NOT EXISTS queries_ad AFTER DELETE ON queries BEGIN
+                INSERT INTO queries_fts
+                    (queries_fts, rowid, platform, template, inputs, query)
+                VALUES ('delete', old.id, old.platform, old.template, old.inputs,
+                    old.query);
+            END;
+            """)
+        return True
+
+    def record(
+        self,
+        platform: str,
+        template_name: str,
+        inputs: Dict[str, str],
+        duration: str,
+        include_post_pipeline: bool,
+        query: str,
+    ) -> None:
+        """
+        Queues a generated query for writing
+
+        Args:
+        - platform (str): The platform name
+        - template_name (str): The template name
+        - inputs (Dict[str, str]): The optional field values
+        - duration (str): A duration from normalize_lookback
+        - include_post_pipeline (bool): Whether the Defender post_pipeline was included
+        - query (str): The generated query
+        """
+
+        if self._closed:
+            return
+        self._pending.put(
+            (
+                datetime.now(timezone.utc).isoformat(),
+                platform,
+                template_name,
+                json.dumps(inputs, sort_keys=True),
+                duration,
+                int(include_post_pipeline),
+                query,
+            )
+        )
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(
+                        target=self._write_loop, name="history-writer", daemon=True
+                    )
+                    self._writer.start()
+
+    def _write_loop(self) -> None:
+        while True:
+            row = self._pending.get()
+            rows = [row]
+            # Gathers whatever else arrives shortly after, up to one batch
+            while row is not None and len(rows) < self.batch_size:
+                try:
+                    row = self._pending.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    break
+                rows.append(row)
+            stopping = rows[-1] is None
+            entries = [row for row in rows if row is not None]
+            try:
+                if entries:
+                    with self._lock, self._connection:
+                        self._connection.executemany(
+                            "INSERT INTO queries (created_at, platform, template, inputs, "
+                            "duration, include_post_pipeline, query) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            entries,
+                        )
+            except sqlite3.Error as e:
+                logger.error(f"Failed to record {len(entries)} queries in history: {e}")
+            finally:
+                for _ in rows:
+                    self._pending.task_done()
+            if stopping:
+                return
+
+    def flush(self) -> None:
+        """
+        Blocks until every queued query is written
+        """
+
+        if self._writer is not None:
+            self._pending.join()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is not None:
+            self._pending.put(None)
+            self._writer.join()
+        with self._lock:
+            self._connection.close()
+
+    def search(
+        self,
+        text: str = "",
+        platform: Optional[str] = None,
+        template_name: Optional[str] = None,
+        limit: int = HISTORY_SEARCH_LIMIT,
+    ) -> List[HistoryEntry]:
+        """
+        Finds recorded queries, newest first
+
+        Args:
+        - text (str): Words to find in the platform, template, inputs or query, or ""
+        - platform (Optional[str]): Only queries of this platform
+        - template_name (Optional[str]): Only queries of this template
+        - limit (int): Maximum number of entries
+
+        Returns:
+        - List[HistoryEntry]: The matching entries
+        """
+
+        conditions = []
+        parameters: List[Any] = []
+        if text.strip() and self.fts:
+            conditions.append(
+                "id IN (SELECT rowid FROM queries_fts WHERE queries_fts MATCH ?)"
+            )
+            parameters.append(fts_query(text))
+        elif text.strip():
+            for word in text.split():
+                conditions.append("(template || ' ' || inputs || ' ' || query) LIKE ?")
+                parameters.append(f"%{word}%")
+        if platform:
+            conditions.append("platform = ?")
+            parameters.append(platform)
+        if template_name:
+            conditions.append("template = ?")
+            parameters.append(template_name)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {COLUMNS} FROM queries {where} ORDER BY id DESC LIMIT ?",
+                (*parameters, limit),
+            ).fetchall()
+        return [HistoryEntry.from_row(row) for row in rows]
+
+    def get(self, entry_id: int) -> Optional[HistoryEntry]:
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT {COLUMNS} FROM queries WHERE id = ?", (entry_id,)
+            ).fetchone()
+        return HistoryEntry.from_row(row) if row else None
+
+    def delete(self, entry_id: int) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM queries WHERE id = ?", (entry_id,))
+
+
+def rerender(entry: HistoryEntry, duration: Optional[str] = None) -> str:
+    """
+    Renders a recorded query again with the current templates
+
+    Args:
+    - entry (HistoryEntry): The recorded query
+    - duration (Optional[str]): A new duration from normalize_lookback, None keeps it
+
+    Returns:
+    - str: The query
+
+    Raises:
+    - KeyError: If the template no longer exists
+    """
+
+    config = read_templates(entry.platform)
+    template = config.get(entry.template)
+    if entry.template == "base_queries" or not isinstance(template, dict):
+        raise KeyError(
+            f"Template '{entry.template}' no longer exists for {entry.platform}"
+        )
+    return build_query(
+        template,
+        entry.inputs,
+        duration or entry.duration,
+        entry.platform,
+        config.get("base_queries", {}),
+        entry.include_post_pipeline,
+    )
+
+
+_history: Optional[QueryHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_history() -> Optional[QueryHistory]:
+    """
+    Opens the shared history of the application, closed at exit
+
+    Returns:
+    - Optional[QueryHistory]: The history, or None if the database cannot be opened
+    """
+
+    global _history
+    with _history_lock:
+        if _history is None:
+            try:
+                _history = QueryHistory()
+            except sqlite3.Error as e:
+                logger.error(f"Query history unavailable: {e}")
+                return None
+            atexit.register(_history.close)
+        return _history
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Browses, searches and re-renders the query history
+
+    Args:
+    - argv (Optional[List[str]]): Command line arguments, defaults to sys.argv
+
+    Returns:
+    - int: 0 on success, 1 on errors
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.query_history", description="Query history"
+    )
+    parser.add_argument("--db", default=HISTORY_DB, help="History database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search = commands.add_parser("search", help="List recorded queries, newest first")
+    search.add_argument("text", nargs="*", help="Words to search for (prefix match)")
+    search.add_argument("--platform", choices=PLATFORMS)
+    search.add_argument("--template")
+    search.add_argument("--limit", type=int, default=HISTORY_SEARCH_LIMIT)
+
+    show = commands.add_parser("show", help="Print a recorded query")
+    show.add_argument("id", type=int)
+
+    render = commands.add_parser(
+        "render", help="Render a recorded query again with the current templates"
+    )
+    render.add_argument("id", type=int)
+    render.add_argument(
+        "--lookback", help="New time range (e.g., 1h), default the recorded one"
+    )
+
+    delete = commands.add_parser("delete", help="Remove a recorded query")
+    delete.add_argument("id", type=int)
+    args = parser.parse_args(argv)
+
+    try:
+        history = QueryHistory(args.db)
+    except sqlite3.Error as e:
+        print(f"Failed to open {args.db}: {e}", file=sys.stderr)
+        return 1
+
+    try:
+        match args.command:
+            case "search":
+                for entry in history.search(
+                    " ".join(args.text), args.platform, args.template, args.limit
+                ):
+                    print(f"{entry.id:>6}  {entry.summary}")
+                return 0
+            case "delete":
+                history.delete(args.id)
+                return 0
+
+        entry = history.get(args.id)
+        if entry is None:
+            print(f"No query with id {args.id}", file=sys.stderr)
+            return 1
+        if args.command == "show":
+            print(entry.query)
+            return 0
+
+        duration = None
+        if args.lookback:
+            duration = normalize_lookback(args.lookback, entry.platform)
+            if duration is None:
+                parser.error(f"Invalid lookback '{args.lookback}'")
+        query = rerender(entry, duration)
+        history.record(
+            entry.platform,
+            entry.template,
+            entry.inputs,
+            duration or entry.duration,
+            entry.include_post_pipeline,
+            query,
+        )
+        print(query)
+        return 0
+    except (KeyError, ValueError, sqlite3.Error) as e:
+        print(f"Query history failed: {e}", file=sys.stderr)
+        return 1
+    finally:
+        history.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
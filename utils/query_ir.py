@@ -0,0 +1,287 @@
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+"""
+Query intermediate representation
+"""
+
+QUOTED = re.compile(r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")""")
+
+
+@dataclass(frozen=True)
+class Predicate:
+    """
+    A single condition of a query
+
+    Predicates taken from templates keep their rendered text. Optimisation
+    passes that rewrite a predicate drop the text and describe it with a
+    field, an operator and its values, which emitters render natively.
+    """
+
+    text: Optional[str]
+    field: Optional[str] = None
+    operator: Optional[str] = None
+    values: Tuple[str, ...] = ()
+    origin: str = "required"
+
+
+@dataclass(frozen=True)
+class TimeFilter:
+    """
+    The time restriction of a query, either relative or absolute
+    """
+
+    duration: str
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+    @property
+    def is_absolute(self) -> bool:
+        return self.start is not None and self.end is not None
+
+
+@dataclass
+class QueryIR:
+    """
+    Platform-independent structure of a query built from a template
+    """
+
+    source: str
+    source_key: Optional[str]
+    predicates: List[Predicate]
+    time_filter: TimeFilter
+    stages: List[str] = field(default_factory=list)
+    post_pipeline: List[str] = field(default_factory=list)
+    order_by: Optional[List[Tuple[str, str]]] = None
+    time_filter_first: bool = False
+    projection: List[str] = field(default_factory=list)
+    limit: Optional[int] = None
+    # (alias, expression) pairs to count events by
+    group_by: List[Tuple[str, str]] = field(default_factory=list)
+
+
+def split_conditions(expression: str, keyword: str = "and") -> List[str]:
+    """
+    Splits an expression on a boolean keyword, ignoring keywords that appear
+    inside quotes or parentheses
+
+    Args:
+    - expression (str): The condition expression to split (e.g., "a = 1 and (b or c)")
+    - keyword (str): The boolean keyword to split on, matched case-insensitively
+
+    Returns:
+    - List[str]: The stripped top-level operands of the expression
+    """
+
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+    i = 0
+    length = len(expression)
+    width = len(keyword)
+
+    while i < length:
+        char = expression[i]
+        if quote:
+            if char == "\\":
+                i += 2
+                continue
+            if char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth = max(depth - 1, 0)
+        elif (
+            depth == 0
+            and char.isspace()
+            and expression[i + 1 : i + 1 + width].lower() == keyword
+            and i + 1 + width < length
+            and expression[i + 1 + width].isspace()
+        ):
+            parts.append(expression[start:i].strip())
+            i += width + 2
+            start = i
+            continue
+        i += 1
+
+    parts.append(expression[start:].strip())
+    return [part for part in parts if part]
+
+
+def mask_quotes(text: str) -> str:
+    """
+    Replaces the content of quoted literals so that searches only see query syntax
+
+    Args:
+    - text (str): The query text
+
+    Returns:
+    - str: The text with quoted content blanked, keeping all offsets intact
+    """
+
+    return QUOTED.sub(
+        lambda m: m.group(0)[0] + "_" * (len(m.group(0)) - 2) + m.group(0)[-1], text
+    )
+
+
+def split_pipeline(query: str) -> List[str]:
+    """
+    Splits a KQL query or condition into its pipeline stages, ignoring pipes inside quotes
+
+    Args:
+    - query (str): The KQL text
+
+    Returns:
+    - List[str]: The stripped pipeline stages
+    """
+
+    masked = mask_quotes(query)
+    stages = []
+    start = 0
+    for i, char in enumerate(masked):
+        if char == "|":
+            stages.append(query[start:i].strip())
+            start = i + 1
+    stages.append(query[start:].strip())
+    return [stage for stage in stages if stage]
+
+
+def strip_parentheses(expression: str) -> str:
+    """
+    Removes parentheses that enclose a whole expression
+
+    Args:
+    - expression (str): A condition expression (e.g., "(a = 1 or a = 2)")
+
+    Returns:
+    - str: The expression without its enclosing parentheses
+    """
+
+    expression = expression.strip()
+    while expression.startswith("(") and expression.endswith(")"):
+        depth = 0
+        quote = None
+        for i, char in enumerate(expression):
+            if quote:
+                if char == quote:
+                    quote = None
+            elif char in ("'", '"'):
+                quote = char
+            elif char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+                if depth == 0 and i < len(expression) - 1:
+                    return expression
+        expression = expression[1:-1].strip()
+    return expression
+
+
+def resolve_base(
+    template: Dict[str, Any], base_queries: Dict[str, str]
+) -> Tuple[str, Optional[str]]:
+    """
+    Resolves the base of a template, expanding '{name}' references to base_queries
+
+    Args:
+    - template (Dict[str, Any]): A template dictionary containing query structure
+    - base_queries (Dict[str, str]): A dictionary of base queries keyed by name
+
+    Returns:
+    - Tuple[str, Optional[str]]: The base query and the base_queries key it came from
+    """
+
+    if "base" not in template:
+        raise KeyError("Template missing required 'base' field")
+
+    base = template["base"]
+    if base_queries and base.startswith("{") and base.endswith("}"):
+        key_name = base[1:-1]
+        if key_name in base_queries:
+            return base_queries[key_name], key_name
+        raise ValueError(f"Base query '{key_name}' not found in base_queries")
+    return base, None
+
+
+def render_optional_field(template: Dict[str, Any], key: str, value: str) -> str:
+    """
+    Renders the condition of an optional field for a value
+
+    Args:
+    - template (Dict[str, Any]): A template dictionary containing query structure
+    - key (str): The optional field name
+    - value (str): The user-provided value
+
+    Returns:
+    - str: The rendered condition
+    """
+
+    field_config = template.get("optional_fields", {}).get(key)
+    if isinstance(field_config, dict) and "pattern" in field_config:
+        return field_config["pattern"].format(value=value)
+    # Handle simple string patterns
+    return f"{key} = '{value}'"
+
+
+def build_ir(
+    template: Dict[str, Any],
+    inputs: Dict[str, str],
+    duration: str,
+    base_queries: Dict[str, str],
+    include_post_pipeline: bool = False,
+    time_range: Optional[Tuple[datetime, datetime]] = None,
+    limit: Optional[int] = None,
+) -> QueryIR:
+    """
+    Builds the intermediate representation of a query from a template
+
+    Args:
+    - template (Dict[str, Any]): A template dictionary containing query structure
+    - inputs (Dict[str, str]): User-provided field values for optional parameters
+    - duration (str): A duration string for the time range (e.g., "1h", "30 MINUTES")
+    - base_queries (Dict[str, str]): A dictionary of base queries keyed by name
+    - include_post_pipeline (bool): Whether to include the template's post_pipeline
+    - time_range (Optional[Tuple[datetime, datetime]]): Absolute (start, end) bounds
+    - limit (Optional[int]): Row limit overriding the template's limit
+
+    Returns:
+    - QueryIR: The query structure
+    """
+
+    source, source_key = resolve_base(template, base_queries)
+
+    predicates = [Predicate(text) for text in template.get("required_fields", [])]
+
+    # Add optional field conditions
+    optional_fields = template.get("optional_fields", {})
+    for key, val in inputs.items():
+        if key in optional_fields:
+            predicates.append(
+                Predicate(render_optional_field(template, key, val), origin=key)
+            )
+
+    start, end = time_range if time_range is not None else (None, None)
+
+    post_pipeline = []
+    if include_post_pipeline and "post_pipeline" in template:
+        post_pipeline.append(template["post_pipeline"])
+
+    limit = limit if limit is not None else template.get("limit")
+    if limit is not None and (not isinstance(limit, int) or limit <= 0):
+        raise ValueError(f"Row limit must be a positive integer, got '{limit}'")
+
+    return QueryIR(
+        source=source,
+        source_key=source_key,
+        predicates=predicates,
+        time_filter=TimeFilter(duration, start, end),
+        post_pipeline=post_pipeline,
+        projection=list(template.get("projection", [])),
+        limit=limit,
+    )
@@ -0,0 +1,531 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from utils.canonical import canonicalize_query, query_fingerprint
+from utils.configuration import (
+    get_logger,
+    load_templates,
+    lookback_to_timedelta,
+    normalize_lookback,
+)
+from utils.continuous_hunt import parse_inputs
+from utils.generate_queries import build_query
+from utils.profiling import add_profiling_arguments, profiling_from_args
+from utils.time_slices import TimeSlice
+from utils.ui_constants import (
+    DEFAULT_ENCODING,
+    HUNT_INGEST_DELAY_SECONDS,
+    HUNT_MAX_PARALLEL_SLICES,
+    MSEARCH_DEFAULT_INDEX,
+    RESULT_CACHE_DB,
+    RESULT_CACHE_MAX_BYTES,
+    RESULT_CACHE_SLICE_MINUTES,
+    RESULT_CACHE_TTL_SECONDS,
+)
+from utils.workflow import RUNNER_PLATFORMS, Runner, build_runners
+
+"""
+On-disk cache of SIEM results per query and time slice
+"""
+
+logger = get_logger()
+
+Row = Dict[str, Any]
+
+# Fixed window rendered in place of the real one, so the key ignores time
+KEY_WINDOW: TimeSlice = (
+    datetime(1970, 1, 1, tzinfo=timezone.utc),
+    datetime(1970, 1, 2, tzinfo=timezone.utc),
+)
+
+# Clauses after which the results of two slices cannot simply be concatenated.
+# Elastic query strings cannot aggregate; their limit travels as the search
+# size and is checked on the template instead.
+MERGE_BARRIERS = {
+    "qradar": re.compile(
+        r"\b(group by|having|limit|(count|uniquecount|sum|avg|min|max)\s*\()",
+        re.IGNORECASE,
+    ),
+    "defender": re.compile(
+        r"\|\s*(summarize|top|take|limit|distinct|count)\b", re.IGNORECASE
+    ),
+    "elastic": re.compile(r"(?!)"),
+}
+
+
+def cache_key(
+    template: Dict[str, Any],
+    inputs: Dict[str, str],
+    platform: str,
+    base_queries: Dict[str, str],
+    include_post_pipeline: bool = False,
+    target: str = "",
+) -> str:
+    """
+    Identifies the results of a template and inputs independently of their time window
+
+    Args:
+    - template (Dict[str, Any]): The template
+    - inputs (Dict[str, str]): The optional field values
+    - platform (str): The platform name
+    - base_queries (Dict[str, str]): The base queries of the platform
+    - include_post_pipeline (bool): Whether to include the Defender post_pipeline
+    - target (str): The SIEM and index the runner searches (e.g., URL and index)
+
+    Returns:
+    - str: The fingerprint of the target and canonical query with a fixed time window
+    """
+
+    query = build_query(
+        template,
+        inputs,
+        "",
+        platform,
+        base_queries,
+        include_post_pipeline,
+        time_range=KEY_WINDOW,
+    )
+    return hashlib.sha256(
+        f"{target}\n{query_fingerprint(query, platform)}".encode(DEFAULT_ENCODING)
+    ).hexdigest()
+
+
+def is_mergeable(query: str, platform: str, limit: Optional[int] = None) -> bool:
+    """
+    Checks whether the results of a query over adjacent windows can be concatenated
+
+    Aggregations, limits and top-N stages produce per-window answers that do
+    not add up to the answer over the whole window.
+
+    Args:
+    - query (str): A query produced by build_query
+    - platform (str): The platform name
+    - limit (Optional[int]): The template's row limit, not part of every query string
+
+    Returns:
+    - bool: True if per-slice results can be merged
+    """
+
+    if limit is not None:
+        return False
+    return not MERGE_BARRIERS[platform].search(canonicalize_query(query, platform))
+
+
+def align_slices(start: datetime, end: datetime, span: timedelta) -> List[TimeSlice]:
+    """
+    Splits a window on a fixed grid, so that repeated lookbacks share their slices
+
+    Args:
+    - start (datetime): Start of the window
+    - end (datetime): End of the window
+    - span (timedelta): Grid width
+
+    Returns:
+    - List[TimeSlice]: The slices, oldest first; the first and last may be partial
+    """
+
+    if end <= start:
+        raise ValueError("Time window end must be after its start")
+    if span <= timedelta(0):
+        raise ValueError("span must be positive")
+
+    seconds = span.total_seconds()
+    boundary = datetime.fromtimestamp(
+        (start.timestamp() // seconds + 1) * seconds, tz=timezone.utc
+    )
+    slices = []
+    while boundary < end:
+        slices.append((start, boundary))
+        start, boundary = boundary, boundary + span
+    slices.append((start, end))
+    return slices
+
+
+class ResultCache:
+    def __init__(
+        self,
+        path: str = RESULT_CACHE_DB,
+        ttl: timedelta = timedelta(seconds=RESULT_CACHE_TTL_SECONDS),
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+    ) -> None:
+        """
+        SQLite store of compressed result rows per query key and absolute time slice
+
+        Args:
+        - path (str): Path to the SQLite database, created with its directory if missing
+        - ttl (timedelta): Age after which a slice is no longer served
+        - max_bytes (int): Compressed size kept before evicting least recently used slices
+        """
+
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS slices (
+                    query_key TEXT NOT NULL,
+                    platform TEXT NOT NULL,
+                    start REAL NOT NULL,
+                    end REAL NOT NULL,
+                    rows BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    used_at REAL NOT NULL,
+                    PRIMARY KEY (query_key, start, end)
+                )
+                """)
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS slices_used_at ON slices (used_at)"
+            )
+
+    def get(self, query_key: str, window: TimeSlice) -> Optional[List[Row]]:
+        """
+        Reads the cached rows of a slice
+
+        Args:
+        - query_key (str): The key from cache_key
+        - window (TimeSlice): The absolute slice bounds
+
+        Returns:
+        - Optional[List[Row]]: The rows, or None if the slice is missing or expired
+        """
+
+        now = time.time()
+        bounds = (query_key, window[0].timestamp(), window[1].timestamp())
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT rows FROM slices WHERE query_key = ? AND start = ? AND end = ? "
+                "AND created_at >= ?",
+                (*bounds, now - self.ttl.total_seconds()),
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                "UPDATE slices SET used_at = ? "
+                "WHERE query_key = ? AND start = ? AND end = ?",
+                (now, *bounds),
+            )
+        return json.loads(zlib.decompress(row[0]).decode(DEFAULT_ENCODING))
+
+    def put(
+        self, query_key: str, platform: str, window: TimeSlice, rows: List[Row]
+    ) -> None:
+        """
+        Stores the rows of a slice, then evicts expired and least recently used slices
+
+        Args:
+        - query_key (str): The key from cache_key
+        - platform (str): The platform name
+        - window (TimeSlice): The absolute slice bounds
+        - rows (List[Row]): The result rows of the slice
+        """
+
+        blob = zlib.compress(json.dumps(rows, default=str).encode(DEFAULT_ENCODING))
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO slices VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    query_key,
+                    platform,
+                    window[0].timestamp(),
+                    window[1].timestamp(),
+                    blob,
+                    len(blob),
+                    now,
+                    now,
+                ),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._connection.execute(
+            "DELETE FROM slices WHERE created_at < ?", (now - self.ttl.total_seconds(),)
+        )
+        total = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM slices"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        cursor = self._connection.execute(
+            "SELECT rowid, size FROM slices ORDER BY used_at"
+        )
+        evicted = []
+        for rowid, size in cursor:
+            if total <= self.max_bytes:
+                break
+            evicted.append((rowid,))
+            total -= size
+        self._connection.executemany("DELETE FROM slices WHERE rowid = ?", evicted)
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM slices")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+@dataclass
+class CachedSearch:
+    """
+    Merged rows of a search with the slices served from cache and from the SIEM
+    """
+
+    rows: List[Row] = field(default_factory=list)
+    cached: List[TimeSlice] = field(default_factory=list)
+    fetched: List[TimeSlice] = field(default_factory=list)
+    # False when the query's results cannot be stored for this lookback
+    cacheable: bool = True
+
+
+def cached_search(
+    cache: ResultCache,
+    runner: Runner,
+    template: Dict[str, Any],
+    inputs: Dict[str, str],
+    duration: str,
+    platform: str,
+    base_queries: Dict[str, str],
+    include_post_pipeline: bool = False,
+    end: Optional[datetime] = None,
+    span: timedelta = timedelta(minutes=RESULT_CACHE_SLICE_MINUTES),
+    settle: timedelta = timedelta(seconds=HUNT_INGEST_DELAY_SECONDS),
+    max_parallel_slices: int = HUNT_MAX_PARALLEL_SLICES,
+    target: str = "",
+) -> CachedSearch:
+    """
+    Runs a template over a lookback, sending only uncached slices to the SIEM
+
+    The lookback is split on a grid of span-wide slices, so lookbacks issued
+    at different times share their interior slices. Queries whose results
+    cannot be merged across slices are cached for their exact window only,
+    which is only reused when the lookback ends at a fixed time in the past;
+    lookbacks ending now bypass the cache for them. Slices ending within the
+    settle delay are not stored, since late events may still arrive. Runners
+    raise instead of returning partial results, so every fetched slice is
+    complete.
+
+    Args:
+    - cache (ResultCache): The result cache
+    - runner (Runner): Runs queries of the platform and returns their rows
+    - template (Dict[str, Any]): The template
+    - inputs (Dict[str, str]): The optional field values
+    - duration (str): A duration from normalize_lookback (e.g., "30 DAYS", "30d")
+    - platform (str): The platform name
+    - base_queries (Dict[str, str]): The base queries of the platform
+    - include_post_pipeline (bool): Whether to include the Defender post_pipeline
+    - end (Optional[datetime]): End of the lookback, defaults to now in UTC
+    - span (timedelta): Width of the slice grid
+    - settle (timedelta): Age before a slice's results are final
+    - max_parallel_slices (int): Maximum number of slices fetched at once
+    - target (str): The SIEM and index the runner searches, so caches are not
+      shared across clusters or indices
+
+    Returns:
+    - CachedSearch: The rows of all slices, oldest slice first
+    """
+
+    lookback = lookback_to_timedelta(duration)
+    if lookback is None:
+        raise ValueError(f"Invalid lookback '{duration}'")
+
+    now = datetime.now(timezone.utc)
+    end = end or now
+    start = end - lookback
+
+    def query_for(window: TimeSlice) -> str:
+        return build_query(
+            template,
+            inputs,
+            duration,
+            platform,
+            base_queries,
+            include_post_pipeline,
+            time_range=window,
+        )
+
+    key = cache_key(
+        template, inputs, platform, base_queries, include_post_pipeline, target
+    )
+    limit = template.get("limit")
+    result = CachedSearch()
+    if is_mergeable(query_for((start, end)), platform, limit):
+        windows = align_slices(start, end, span)
+    else:
+        windows = [(start, end)]
+        # A window still receiving events is never stored, so it is never looked up
+        result.cacheable = end <= now - settle
+
+    parts: Dict[TimeSlice, List[Row]] = {}
+    for window in windows:
+        rows = cache.get(key, window) if result.cacheable else None
+        if rows is None:
+            result.fetched.append(window)
+        else:
+            parts[window] = rows
+            result.cached.append(window)
+
+    if result.fetched:
+        with ThreadPoolExecutor(
+            max_workers=min(max_parallel_slices, len(result.fetched)),
+            thread_name_prefix="cache",
+        ) as executor:
+            futures = {
+                window: executor.submit(
+                    lambda w: list(runner([query_for(w)], limit)), window
+                )
+                for window in result.fetched
+            }
+            for window, future in futures.items():
+                parts[window] = future.result()
+                if result.cacheable and window[1] <= now - settle:
+                    cache.put(key, platform, window, parts[window])
+
+    for window in windows:
+        result.rows.extend(parts[window])
+    logger.info(
+        f"{len(result.cached)} slice(s) from cache, {len(result.fetched)} fetched"
+    )
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs a template through the result cache and writes the rows as NDJSON
+
+    Args:
+    - argv (Optional[List[str]]): Command line arguments, defaults to sys.argv
+
+    Returns:
+    - int: 0 on success, 1 if the search failed
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.result_cache",
+        description="Run a template, serving searched time slices from a local cache",
+    )
+    parser.add_argument("--platform", choices=RUNNER_PLATFORMS, required=True)
+    parser.add_argument("--template")
+    parser.add_argument(
+        "--input",
+        action="append",
+        default=[],
+        help="Optional field value as key=value (repeatable)",
+    )
+    parser.add_argument(
+        "--lookback", default="1h", help="Lookback to search (default 1h)"
+    )
+    parser.add_argument(
+        "--end",
+        type=datetime.fromisoformat,
+        help="End of the lookback as an ISO 8601 time, UTC unless it has an offset "
+        "(default now); "
+        "aggregating or limited templates are only cached with a fixed end",
+    )
+    parser.add_argument("--db", default=RESULT_CACHE_DB, help="Cache database")
+    parser.add_argument("--clear", action="store_true", help="Empty the cache and exit")
+    parser.add_argument("--output", help="Write rows to this file instead of stdout")
+    parser.add_argument("--qradar-url")
+    parser.add_argument("--qradar-token")
+    parser.add_argument("--elastic-url")
+    parser.add_argument("--elastic-api-key")
+    parser.add_argument("--elastic-index", default=MSEARCH_DEFAULT_INDEX)
+    add_profiling_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.end is not None and args.end.tzinfo is None:
+        args.end = args.end.replace(tzinfo=timezone.utc)
+
+    cache = ResultCache(args.db)
+    try:
+        if args.clear:
+            cache.clear()
+            return 0
+
+        duration = normalize_lookback(args.lookback, args.platform)
+        if duration is None:
+            parser.error(f"Invalid lookback '{args.lookback}'")
+
+        templates = load_templates(args.platform)
+        template = templates.get(args.template)
+        if not isinstance(template, dict) or args.template == "base_queries":
+            parser.error(f"Unknown template '{args.template}' for {args.platform}")
+
+        try:
+            inputs = parse_inputs(args.input, template)
+        except ValueError as e:
+            parser.error(str(e))
+
+        runner = build_runners(
+            args.qradar_url,
+            args.qradar_token,
+            args.elastic_url,
+            args.elastic_api_key,
+            args.elastic_index,
+        ).get(args.platform)
+        if runner is None:
+            parser.error(f"No connection details given for {args.platform}")
+        if args.platform == "qradar":
+            target = args.qradar_url.rstrip("/")
+        else:
+            target = f"{args.elastic_url.rstrip('/')}/{args.elastic_index}"
+
+        try:
+            with profiling_from_args(args):
+                result = cached_search(
+                    cache,
+                    runner,
+                    template,
+                    inputs,
+                    duration,
+                    args.platform,
+                    templates.get("base_queries", {}),
+                    end=args.end,
+                    target=target,
+                )
+        except Exception as e:
+            print(f"Search failed: {e}", file=sys.stderr)
+            return 1
+    finally:
+        cache.close()
+
+    output = (
+        open(args.output, "w", encoding=DEFAULT_ENCODING) if args.output else sys.stdout
+    )
+    try:
+        for row in result.rows:
+            output.write(json.dumps(row, default=str) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(
+        (
+            f"{len(result.rows)} rows ({len(result.cached)} cached, "
+            f"{len(result.fetched)} fetched slices)"
+            if result.cacheable
+            else f"{len(result.rows)} rows (not cached: aggregating or limited template "
+            "without --end)"
+        ),
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,436 @@
+import argparse
+import ipaddress
+import json
+import os
+import re
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, TextIO, Tuple
+
+from utils.analysis import iter_records, parse_timestamp
+from utils.canonical import query_fingerprint
+from utils.configuration import load_templates, normalize_lookback
+from utils.generate_queries import build_query
+from utils.ui_constants import DEFAULT_ENCODING, PLATFORMS
+
+"""
+STIX 2.1 bundle export of hunt findings
+"""
+
+# Namespace defined by STIX 2.1 for deterministic cyber-observable identifiers
+SCO_NAMESPACE = uuid.UUID("00abedb4-aa42-466c-9c01-fed23315a9b7")
+# Namespace of the domain objects produced by this exporter
+SDO_NAMESPACE = uuid.uuid5(
+    uuid.NAMESPACE_URL, "https://github.com/olofmagn/threatqueryx"
+)
+
+PATTERN_TYPES = {"qradar": "aql", "defender": "kql", "elastic": "kql"}
+
+# Observable types classify_value can produce
+SCO_TYPES = ("ipv4-addr", "ipv6-addr", "file", "url", "domain-name", "user-account")
+
+# Column names hinting at the observable type of their values
+COLUMN_HINTS: Tuple[Tuple[re.Pattern, str], ...] = (
+    (re.compile(r"md5|sha1|sha256|hash", re.IGNORECASE), "file"),
+    (re.compile(r"url", re.IGNORECASE), "url"),
+    (re.compile(r"domain|host|dns|query", re.IGNORECASE), "domain-name"),
+    (re.compile(r"user|account|upn", re.IGNORECASE), "user-account"),
+)
+
+HASH_ALGORITHMS = {32: "MD5", 40: "SHA-1", 64: "SHA-256"}
+DOMAIN = re.compile(r"(?=.{1,253}$)([a-z0-9_-]{1,63}\.)+[a-z]{2,63}\.?", re.IGNORECASE)
+HEX = re.compile(r"[0-9a-f]+", re.IGNORECASE)
+
+
+def format_stix_time(moment: datetime) -> str:
+    """
+    Formats a datetime as a STIX timestamp
+
+    Args:
+    - moment (datetime): The point in time, naive values are assumed to be in UTC
+
+    Returns:
+    - str: The time formatted as 'yyyy-MM-ddTHH:mm:ss.fffZ'
+    """
+
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{moment.microsecond // 1000:03d}Z"
+
+
+def _canonical_json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def sco_id(sco_type: str, properties: Dict[str, Any]) -> str:
+    """
+    Derives the deterministic identifier of a cyber-observable
+
+    Args:
+    - sco_type (str): The observable type (e.g., "ipv4-addr")
+    - properties (Dict[str, Any]): The ID contributing properties of the type
+
+    Returns:
+    - str: The STIX identifier
+    """
+
+    return f"{sco_type}--{uuid.uuid5(SCO_NAMESPACE, _canonical_json(properties))}"
+
+
+def sdo_id(sdo_type: str, *parts: str) -> str:
+    """
+    Derives a deterministic identifier for an object produced by this exporter
+
+    Args:
+    - sdo_type (str): The object type (e.g., "indicator")
+    - parts (str): Values identifying the object
+
+    Returns:
+    - str: The STIX identifier
+    """
+
+    return f"{sdo_type}--{uuid.uuid5(SDO_NAMESPACE, '|'.join((sdo_type, *parts)))}"
+
+
+def classify_value(
+    column: str, value: Any, sco_type: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Turns a result value into a cyber-observable
+
+    IP addresses are recognised in any column, other types from the column
+    name (see COLUMN_HINTS) unless sco_type is given.
+
+    Args:
+    - column (str): The column the value came from
+    - value (Any): The raw value
+    - sco_type (Optional[str]): Observable type forced for the column
+
+    Returns:
+    - Optional[Dict[str, Any]]: The observable, or None if the value is not one
+    """
+
+    if value is None or isinstance(value, bool):
+        return None
+    text = str(value).strip()
+    if not text:
+        return None
+
+    if sco_type in (None, "ipv4-addr", "ipv6-addr"):
+        try:
+            address = ipaddress.ip_address(text)
+        except ValueError:
+            address = None
+        if address is not None:
+            kind = "ipv4-addr" if address.version == 4 else "ipv6-addr"
+            properties = {"value": address.compressed}
+            return {
+                "type": kind,
+                "spec_version": "2.1",
+                "id": sco_id(kind, properties),
+                **properties,
+            }
+        if sco_type is not None:
+            return None
+
+    if sco_type is None:
+        sco_type = next(
+            (kind for pattern, kind in COLUMN_HINTS if pattern.search(column)), None
+        )
+
+    match sco_type:
+        case "file":
+            algorithm = HASH_ALGORITHMS.get(len(text))
+            if algorithm is None or not HEX.fullmatch(text):
+                return None
+            properties = {"hashes": {algorithm: text.lower()}}
+        case "url":
+            if "://" not in text:
+                return classify_value(column, text, "domain-name")
+            properties = {"value": text}
+        case "domain-name":
+            if not DOMAIN.fullmatch(text):
+                return None
+            properties = {"value": text.lower().rstrip(".")}
+        case "user-account":
+            properties = {"account_login": text}
+        case _:
+            return None
+
+    return {
+        "type": sco_type,
+        "spec_version": "2.1",
+        "id": sco_id(sco_type, properties),
+        **properties,
+    }
+
+
+class StixBundleWriter:
+    def __init__(self, output: TextIO, bundle_id: Optional[str] = None) -> None:
+        """
+        Writes a STIX bundle object by object, without holding it in memory
+
+        The bundle is only closed when its block exits without an exception,
+        so an interrupted export never parses as a complete bundle.
+
+        Args:
+        - output (TextIO): Destination of the bundle JSON
+        - bundle_id (Optional[str]): Identifier of the bundle, random by default
+        """
+
+        self.output = output
+        self.bundle_id = bundle_id or f"bundle--{uuid.uuid4()}"
+        self.written = 0
+        self._seen: set = set()
+
+    def __enter__(self) -> "StixBundleWriter":
+        self.output.write(f'{{"type": "bundle", "id": "{self.bundle_id}", "objects": [')
+        return self
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        if exc_type is None:
+            self.output.write("\n]}\n")
+
+    def write(self, stix_object: Dict[str, Any]) -> bool:
+        """
+        Appends an object to the bundle, skipping identifiers already written
+
+        Args:
+        - stix_object (Dict[str, Any]): The STIX object
+
+        Returns:
+        - bool: True if the object was written
+        """
+
+        if stix_object["id"] in self._seen:
+            return False
+        self._seen.add(stix_object["id"])
+        separator = "," if self.written else ""
+        self.output.write(f"{separator}\n{json.dumps(stix_object, ensure_ascii=False)}")
+        self.written += 1
+        return True
+
+
+def export_bundle(
+    rows: Iterable[Dict[str, Any]],
+    output: TextIO,
+    template_name: str,
+    template: Dict[str, Any],
+    query: str,
+    platform: str,
+    time_column: Optional[str] = None,
+    columns: Optional[Dict[str, Optional[str]]] = None,
+    created: Optional[datetime] = None,
+) -> int:
+    """
+    Exports hunt results as a STIX 2.1 bundle
+
+    The generating query becomes an indicator. Every distinct observable in
+    the results gets an observed-data object, a sighting of the indicator
+    and a 'based-on' relationship from the indicator. Observables are
+    written as they are first seen; only their first/last sighting times
+    and counts are kept until the end of the stream. All identifiers are
+    derived from content, so repeated exports deduplicate downstream.
+
+    Args:
+    - rows (Iterable[Dict[str, Any]]): The exported rows
+    - output (TextIO): Destination of the bundle JSON
+    - template_name (str): Name of the generating template
+    - template (Dict[str, Any]): The generating template
+    - query (str): The generating query
+    - platform (str): The platform the query ran on
+    - time_column (Optional[str]): Column holding the event timestamp
+    - columns (Optional[Dict[str, Optional[str]]]): Columns to export, optionally with a forced observable type
+    - created (Optional[datetime]): Creation time of the objects, defaults to now
+
+    Returns:
+    - int: Number of objects written
+    """
+
+    now = format_stix_time(created or datetime.now(timezone.utc))
+    indicator_id = sdo_id("indicator", query_fingerprint(query, platform))
+    sightings: Dict[str, List[Any]] = {}
+
+    with StixBundleWriter(output) as writer:
+        writer.write(
+            {
+                "type": "indicator",
+                "spec_version": "2.1",
+                "id": indicator_id,
+                "created": now,
+                "modified": now,
+                "name": template_name,
+                "description": template.get("description", ""),
+                "indicator_types": ["anomalous-activity"],
+                "pattern": query,
+                "pattern_type": PATTERN_TYPES.get(platform, platform),
+                "valid_from": now,
+            }
+        )
+
+        for row in rows:
+            moment = parse_timestamp(row.get(time_column)) if time_column else None
+            seen_at = format_stix_time(moment) if moment else now
+            items = columns.items() if columns else ((name, None) for name in row)
+            for column, sco_type in items:
+                if column == time_column:
+                    continue
+                observable = classify_value(column, row.get(column), sco_type)
+                if observable is None:
+                    continue
+                writer.write(observable)
+                entry = sightings.get(observable["id"])
+                if entry is None:
+                    sightings[observable["id"]] = [seen_at, seen_at, 1]
+                else:
+                    entry[0] = min(entry[0], seen_at)
+                    entry[1] = max(entry[1], seen_at)
+                    entry[2] += 1
+
+        for observable_id, (first, last, count) in sightings.items():
+            observed_id = sdo_id("observed-data", indicator_id, observable_id)
+            writer.write(
+                {
+                    "type": "observed-data",
+                    "spec_version": "2.1",
+                    "id": observed_id,
+                    "created": now,
+                    "modified": now,
+                    "first_observed": first,
+                    "last_observed": last,
+                    "number_observed": count,
+                    "object_refs": [observable_id],
+                }
+            )
+            writer.write(
+                {
+                    "type": "sighting",
+                    "spec_version": "2.1",
+                    "id": sdo_id("sighting", indicator_id, observable_id),
+                    "created": now,
+                    "modified": now,
+                    "first_seen": first,
+                    "last_seen": last,
+                    "count": count,
+                    "sighting_of_ref": indicator_id,
+                    "observed_data_refs": [observed_id],
+                }
+            )
+            writer.write(
+                {
+                    "type": "relationship",
+                    "spec_version": "2.1",
+                    "id": sdo_id("relationship", indicator_id, "based-on", observed_id),
+                    "created": now,
+                    "modified": now,
+                    "relationship_type": "based-on",
+                    "source_ref": indicator_id,
+                    "target_ref": observed_id,
+                }
+            )
+        return writer.written
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Exports hunt results together with their generating template as STIX
+
+    Args:
+    - argv (Optional[List[str]]): Command line arguments, defaults to sys.argv
+
+    Returns:
+    - int: 0 on success, 1 if the export failed
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.stix_export",
+        description="Convert exported hunt results into a STIX 2.1 bundle",
+    )
+    parser.add_argument("path", help="Exported CSV, JSON or NDJSON results")
+    parser.add_argument("--platform", choices=PLATFORMS, required=True)
+    parser.add_argument(
+        "--template", required=True, help="Template that produced the results"
+    )
+    parser.add_argument(
+        "--lookback", default="10m", help="Lookback the query ran with (default 10m)"
+    )
+    parser.add_argument(
+        "--query", help="The exact query that ran, instead of rebuilding it"
+    )
+    parser.add_argument("--time-column", help="Column holding the event timestamp")
+    parser.add_argument(
+        "--column",
+        action="append",
+        default=[],
+        help="Column to export, optionally as column=type with a STIX observable "
+        "type such as ipv4-addr or domain-name (repeatable, default: all)",
+    )
+    parser.add_argument(
+        "--output", help="Write the bundle to this file instead of stdout"
+    )
+    args = parser.parse_args(argv)
+
+    templates = load_templates(args.platform)
+    base_queries = templates.get("base_queries", {})
+    template = templates.get(args.template)
+    if not isinstance(template, dict) or args.template == "base_queries":
+        parser.error(f"Unknown template '{args.template}' for {args.platform}")
+
+    query = args.query
+    if query is None:
+        duration = normalize_lookback(args.lookback, args.platform)
+        if duration is None:
+            parser.error(f"Invalid lookback '{args.lookback}'")
+        query = build_query(template, {}, duration, args.platform, base_queries)
+
+    columns = None
+    if args.column:
+        columns = {}
+        for spec in args.column:
+            name, _, sco_type = spec.partition("=")
+            if sco_type and sco_type not in SCO_TYPES:
+                parser.error(
+                    f"Unknown observable type '{sco_type}' for column {name}, "
+                    f"expected one of {', '.join(SCO_TYPES)}"
+                )
+            columns[name] = sco_type or None
+
+    # The bundle is written next to --output and only moved there once complete
+    partial = None
+    output = sys.stdout
+    if args.output:
+        descriptor, partial = tempfile.mkstemp(
+            suffix=".tmp", dir=os.path.dirname(os.path.abspath(args.output))
+        )
+        output = open(descriptor, "w", encoding=DEFAULT_ENCODING)
+    try:
+        written = export_bundle(
+            iter_records(args.path),
+            output,
+            args.template,
+            template,
+            query,
+            args.platform,
+            args.time_column,
+            columns,
+        )
+        if partial is not None:
+            output.close()
+            os.replace(partial, args.output)
+    except (OSError, ValueError) as e:
+        print(f"Failed to export {args.path}: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if partial is not None:
+            output.close()
+            if os.path.exists(partial):
+                os.remove(partial)
+
+    print(f"Wrote {written} STIX objects", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.configuration import lookback_to_timedelta
+from utils.generate_queries import build_query
+from utils.ui_constants import DEFAULT_TIME_SLICES
+
+"""
+Time-window slicing
+"""
+
+TimeSlice = Tuple[datetime, datetime]
+
+
+def split_window(start: datetime, end: datetime, slices: int) -> List[TimeSlice]:
+    """
+    Splits a time window into contiguous slices of equal length
+
+    Args:
+    - start (datetime): Start of the window
+    - end (datetime): End of the window
+    - slices (int): Number of slices
+
+    Returns:
+    - List[TimeSlice]: The (start, end) bounds of each slice, oldest first
+    """
+
+    if slices <= 0:
+        raise ValueError("slices must be positive")
+    if end <= start:
+        raise ValueError("Time window end must be after its start")
+
+    step = (end - start) / slices
+    bounds = [start + step * i for i in range(slices)] + [end]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def slice_lookback(
+    duration: str,
+    slices: Optional[int] = None,
+    max_span: Optional[timedelta] = None,
+    end: Optional[datetime] = None,
+) -> List[TimeSlice]:
+    """
+    Splits a lookback ending at a given time into absolute sub-windows
+
+    Either a fixed number of slices or a maximum slice span can be given;
+    with a span the number of slices is derived from the lookback length.
+
+    Args:
+    - duration (str): A duration from normalize_lookback (e.g., "30 DAYS", "30d")
+    - slices (Optional[int]): Number of slices (default: DEFAULT_TIME_SLICES)
+    - max_span (Optional[timedelta]): Maximum length of a single slice
+    - end (Optional[datetime]): End of the lookback, defaults to now in UTC
+
+    Returns:
+    - List[TimeSlice]: The (start, end) bounds of each slice, oldest first
+    """
+
+    span = lookback_to_timedelta(duration)
+    if span is None:
+        raise ValueError(f"Invalid lookback '{duration}'")
+
+    if max_span is not None:
+        if max_span <= timedelta(0):
+            raise ValueError("max_span must be positive")
+        slices = -(-span // max_span)  # Ceiling division
+    elif slices is None:
+        slices = DEFAULT_TIME_SLICES
+
+    end = end or datetime.now(timezone.utc)
+    return split_window(end - span, end, slices)
+
+
+def build_sliced_queries(
+    template: Dict[str, Any],
+    inputs: Dict[str, str],
+    duration: str,
+    platform: str,
+    base_queries: Dict[str, str],
+    include_post_pipeline: bool = False,
+    slices: Optional[int] = None,
+    max_span: Optional[timedelta] = None,
+    end: Optional[datetime] = None,
+) -> List[Tuple[TimeSlice, str]]:
+    """
+    Builds one query per time slice of a lookback, using absolute time bounds
+
+    Args:
+    - template (Dict[str, Any]): A template dictionary containing query structure
+    - inputs (Dict[str, str]): User-provided field values for optional parameters
+    - duration (str): A duration from normalize_lookback (e.g., "30 DAYS", "30d")
+    - platform (str): The platform ("qradar", "defender", "elastic")
+    - base_queries (Dict[str, str]): A dictionary of base queries keyed by platform
+    - include_post_pipeline (bool): Whether to include the Defender post_pipeline
+    - slices (Optional[int]): Number of slices (default: DEFAULT_TIME_SLICES)
+    - max_span (Optional[timedelta]): Maximum length of a single slice
+    - end (Optional[datetime]): End of the lookback, defaults to now in UTC
+
+    Returns:
+    - List[Tuple[TimeSlice, str]]: Each slice with its query, oldest first
+    """
+
+    return [
+        (
+            window,
+            build_query(
+                template,
+                inputs,
+                duration,
+                platform,
+                base_queries,
+                include_post_pipeline,
+                time_range=window,
+            ),
+        )
+        for window in slice_lookback(duration, slices, max_span, end)
+    ]
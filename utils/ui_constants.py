@@ -1,4 +1,5 @@
 import logging
+import os
 
 # =============================================================================
 # CONSTANTS AND CONFIGURATION
@@ -9,9 +10,11 @@ DEFAULT_MODE = "qradar"
 DEFAULT_ENCODING = "utf-8"
 DEFAULT_TIME_RANGE_INDEX = 1  # "10 MINUTES"
 PLATFORMS = ["qradar", "defender", "elastic"]
+TEMPLATES_DIR = "templates"
 DEFAULT_LOGGER_NAME = "ThreatQueryX"
 DEFAULT_LOG_LEVEL = logging.INFO
 LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+DATA_DIR = os.path.join(os.path.expanduser("~"), ".threatqueryx")  # Local databases
 
 # Window Configuration
 DEFAULT_WINDOW_WIDTH = 500
@@ -41,6 +44,22 @@ TIME_ENTRY_WIDTH = 15
 ARROW_BUTTON_WIDTH = 2
 ARROW_BUTTON_PADDING = (6, 0)
 
+# Batch Panel
+BATCH_WINDOW_TITLE = "ThreatQueryX - Batch Queries"
+BATCH_CHUNK_SIZE = 500  # Indicators rendered between progress updates
+BATCH_POLL_INTERVAL_MS = 50  # How often the GUI drains rendered chunks
+BATCH_INPUT_HEIGHT = 10
+
+# Output Pane
+OUTPUT_PAGE_SIZE = 100  # Queries materialized in the output view at once
+OUTPUT_RENDER_CHUNK_CHARS = 65_536  # Characters inserted per event loop turn
+OUTPUT_MAX_VIEW_CHARS = 1_000_000  # Longer pages are truncated in the view only
+
+# Live Preview
+PREVIEW_DEBOUNCE_MS = 250  # Quiet time after an edit before the preview re-renders
+PREVIEW_CACHE_SIZE = 256  # Rendered queries kept per template
+INVALID_FIELD_COLOR = "#b00020"
+
 # Valid Platforms
 VALID_PLATFORMS = {
     "defender": {"description": "Microsoft Defender for Endpoint"},
@@ -58,3 +77,90 @@ TIME_RANGES = [
     ("12h", "12 HOURS"),
     ("1d", "1 DAY"),
 ]
+
+# Elastic _msearch Batching
+MSEARCH_MAX_COUNT = 100  # Searches per _msearch request
+MSEARCH_MAX_BYTES = 1_048_576  # NDJSON body budget per request (1 MiB)
+MSEARCH_DEFAULT_INDEX = "logs-*"
+ELASTIC_PAGE_SIZE = 1000  # Hits per search request when paging a query
+ELASTIC_PIT_KEEP_ALIVE = "1m"  # Point in time kept open between pages
+HTTP_TIMEOUT_SECONDS = 30
+
+# QRadar Ariel Scheduling
+ARIEL_API_VERSION = "16.0"
+QRADAR_CONSOLE_TIMEZONE = "UTC"  # IANA timezone of START/STOP bounds
+ARIEL_MAX_IN_FLIGHT = 3  # Concurrent Ariel searches per scheduler
+ARIEL_PAGE_SIZE = 1000  # Records per Range request
+ARIEL_POLL_INTERVAL_SECONDS = 1.0
+ARIEL_RESULT_QUEUE_SIZE = 8  # Pages buffered ahead of the consumer
+
+# Time Slicing
+DEFAULT_TIME_SLICES = 4
+
+# Field Statistics
+FIELD_STATS_TOP_N = 10  # Most common values returned per field
+
+# Export Analysis
+ANALYSIS_BATCH_ROWS = 50_000  # Rows per columnar batch
+ANALYSIS_READ_CHUNK = 1_048_576  # Characters read at a time from JSON exports
+
+# Correlation
+CORRELATION_MAX_BUILD_ROWS = 1_000_000  # Build-side rows held in memory before spilling
+CORRELATION_SPILL_PARTITIONS = 64
+
+# Anomaly Detection
+ANOMALY_WINDOW_STEPS = 4  # Sub-buckets per rolling window
+ANOMALY_MAD_THRESHOLD = 3.5  # Robust z-score above which a window is anomalous
+ANOMALY_MIN_WINDOWS = 5  # Windows needed before an entity gets its own threshold
+
+# Hunt Workflows
+WORKFLOWS_DIR = "workflows"
+WORKFLOW_BATCH_SIZE = 50  # Values of one optional field OR'ed into a single query
+WORKFLOW_MAX_VALUES = 1000  # Values extracted from a step's results
+WORKFLOW_MAX_PARALLEL_STEPS = 4
+WORKFLOW_CACHE_TTL_SECONDS = 15 * 60  # Age until step results are searched again
+
+# Continuous Hunting
+HUNT_STATE_DB = os.path.join(DATA_DIR, "hunts.sqlite")
+HUNT_INGEST_DELAY_SECONDS = 60  # Events younger than this may not be searchable yet
+HUNT_BACKFILL_SLICE_MINUTES = 60  # Maximum span of one backfill slice
+HUNT_MAX_PARALLEL_SLICES = 4
+HUNT_MIN_SLICE_SECONDS = 60  # Shortest part of a slice truncated by the limit
+
+# Result Cache
+RESULT_CACHE_DB = os.path.join(DATA_DIR, "cache.sqlite")
+RESULT_CACHE_SLICE_MINUTES = 60  # Cached slices are aligned to this grid
+RESULT_CACHE_TTL_SECONDS = 7 * 24 * 3600
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024  # Compressed rows kept before LRU eviction
+
+# Engine
+ENGINE_RENDER_CACHE_SIZE = 4096  # Rendered queries kept per engine
+
+# Profiling
+PROFILE_DIR = os.path.join(DATA_DIR, "profiles")
+PROFILE_SAMPLE_INTERVAL_MS = 10  # Stack sampling interval of --sample
+PROFILE_TOP_ALLOCATIONS = 15  # Allocation sites reported per phase
+PROFILE_MEMORY_SNAPSHOTS = 5  # Calls per phase diffed with tracemalloc snapshots
+
+# Indicator Store
+INDICATOR_STORE_DIR = os.path.join(DATA_DIR, "indicators")
+INDICATOR_BUILD_CHUNK = 1_000_000  # Indicators per kind sorted in memory per run
+
+# Watchlist Matching
+WATCHLIST_COLUMNS = (  # DNS and URL columns of QRadar, Elastic and Defender exports
+    "dns.question.name",
+    "url.domain",
+    "url.full",
+    "url.original",
+    "URL Domain",
+    "RemoteUrl",
+    "URL",
+)
+
+# Query History
+HISTORY_DB = os.path.join(DATA_DIR, "history.sqlite")
+HISTORY_WRITE_BATCH = 100  # Queries written per transaction
+HISTORY_FLUSH_INTERVAL_SECONDS = 0.5  # Wait for more queries before committing
+HISTORY_SEARCH_LIMIT = 50
+HISTORY_WINDOW_TITLE = "ThreatQueryX - Query History"
+HISTORY_LIST_HEIGHT = 15
@@ -0,0 +1,205 @@
+import ipaddress
+import re
+from typing import Any, Callable, Dict, Optional, Pattern, Tuple
+
+from utils.profiling import profiled
+
+"""
+Input validators
+"""
+
+# Takes a stripped input value and returns whether it is valid with an error message
+Validator = Callable[[str], Tuple[bool, str]]
+
+VALIDATORS: Dict[str, Validator] = {}
+
+DOMAIN_PATTERN = re.compile(
+    r"(?=.{1,253}\.?$)(?:[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9])?\.)+[a-z][a-z0-9-]{0,61}[a-z0-9]\.?",
+    re.IGNORECASE,
+)
+URL_PATTERN = re.compile(r"[a-z][a-z0-9+.-]*://[^\s/?#@]+(?:[/?#]\S*)?", re.IGNORECASE)
+EMAIL_PATTERN = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s.]+")
+# [0-9] rather than \d, which also matches non-ASCII digits (e.g., '٨٠')
+PORT_PATTERN = re.compile(r"[0-9]{1,5}")
+PORT_RANGE_PATTERN = re.compile(r"([0-9]{1,5})(?:\s*-\s*([0-9]{1,5}))?")
+MAX_PORT = 65535
+
+
+class UnknownValidationError(ValueError):
+    """
+    Raised for a 'validation' name without a registered validator
+    """
+
+
+def register_validator(name: str, validator: Validator) -> None:
+    """
+    Registers a validator under a name usable as 'validation' in templates
+
+    Args:
+    - name (str): The validation name (e.g., "ip")
+    - validator (Validator): The validator, recorded as the "validation" profiling phase
+    """
+
+    VALIDATORS[name] = profiled("validation")(validator)
+
+
+def get_validator(name: Optional[str]) -> Optional[Validator]:
+    """
+    Looks up the validator of a validation name
+
+    Args:
+    - name (Optional[str]): The validation name, None for fields without validation
+
+    Returns:
+    - Optional[Validator]: The validator, None if name is None
+
+    Raises:
+    - UnknownValidationError: If no validator is registered under the name
+    """
+
+    if name is None:
+        return None
+    try:
+        return VALIDATORS[name]
+    except (KeyError, TypeError):
+        raise UnknownValidationError(
+            f"Unknown validation '{name}' (expected one of: {', '.join(sorted(VALIDATORS))})"
+        ) from None
+
+
+def field_validator(meta: Any) -> Optional[Validator]:
+    """
+    Returns the validator of an optional field, resolved at template load
+
+    Args:
+    - meta (Any): The optional field definition
+
+    Returns:
+    - Optional[Validator]: The validator, None if the field has no validation
+    """
+
+    if not isinstance(meta, dict):
+        return None
+    validator = meta.get("validator")
+    if validator is None and "validation" in meta:
+        validator = get_validator(
+            meta["validation"]
+        )  # Templates not read through read_templates
+    return validator
+
+
+def resolve_validators(config: Any) -> Any:
+    """
+    Attaches the validator of every optional field with a 'validation' to the field
+
+    Each field definition gets a "validator" entry, so validating an input
+    is a single call instead of a dispatch on the validation name.
+
+    Args:
+    - config (Any): The parsed template file of a platform
+
+    Returns:
+    - Any: The same config
+
+    Raises:
+    - UnknownValidationError: If a field names an unknown validation
+    """
+
+    if not isinstance(config, dict):
+        return config
+    for name, template in config.items():
+        if name == "base_queries" or not isinstance(template, dict):
+            continue
+        optional_fields = template.get("optional_fields")
+        if not isinstance(optional_fields, dict):
+            continue
+        for field, meta in optional_fields.items():
+            if isinstance(meta, dict) and "validation" in meta:
+                try:
+                    meta["validator"] = get_validator(meta["validation"])
+                except UnknownValidationError as e:
+                    raise UnknownValidationError(
+                        f"Template '{name}', field '{field}': {e}"
+                    ) from None
+    return config
+
+
+# =============================================================================
+# VALIDATORS
+# =============================================================================
+
+
+def _pattern_validator(pattern: Pattern[str], message: str) -> Validator:
+    match = pattern.fullmatch
+
+    def validator(value: str) -> Tuple[bool, str]:
+        return (True, "") if match(value) else (False, message)
+
+    return validator
+
+
+def _validate_ip(value: str) -> Tuple[bool, str]:
+    try:
+        ipaddress.ip_address(value)
+        return True, ""
+    except ValueError:
+        return False, "Invalid IP Address"
+
+
+def _validate_cidr(value: str) -> Tuple[bool, str]:
+    try:
+        ipaddress.ip_network(value, strict=False)
+        return True, ""
+    except ValueError:
+        return False, "Invalid CIDR range (e.g., 10.0.0.0/8)"
+
+
+def _validate_integer(value: str) -> Tuple[bool, str]:
+    try:
+        int(value)
+        return True, ""
+    except ValueError:
+        return False, "Must be an integer"
+
+
+def _validate_port(value: str) -> Tuple[bool, str]:
+    if PORT_PATTERN.fullmatch(value) and int(value) <= MAX_PORT:
+        return True, ""
+    return False, f"Must be a port between 0 and {MAX_PORT}"
+
+
+def _validate_port_range(value: str) -> Tuple[bool, str]:
+    match = PORT_RANGE_PATTERN.fullmatch(value)
+    if match:
+        low = int(match.group(1))
+        high = int(match.group(2) or low)
+        if low <= high <= MAX_PORT:
+            return True, ""
+    return False, f"Must be a port or a range like 1024-{MAX_PORT}"
+
+
+register_validator("ip", _validate_ip)
+register_validator("cidr", _validate_cidr)
+register_validator("integer", _validate_integer)
+register_validator("port", _validate_port)
+register_validator("port-range", _validate_port_range)
+register_validator(
+    "md5",
+    _pattern_validator(re.compile(r"[0-9a-f]{32}", re.IGNORECASE), "Invalid MD5 hash"),
+)
+register_validator(
+    "sha1",
+    _pattern_validator(re.compile(r"[0-9a-f]{40}", re.IGNORECASE), "Invalid SHA1 hash"),
+)
+register_validator(
+    "sha256",
+    _pattern_validator(
+        re.compile(r"[0-9a-f]{64}", re.IGNORECASE), "Invalid SHA256 hash"
+    ),
+)
+register_validator("domain", _pattern_validator(DOMAIN_PATTERN, "Invalid domain name"))
+register_validator(
+    "url",
+    _pattern_validator(URL_PATTERN, "Invalid URL (e.g., https://example.com/path)"),
+)
+register_validator("email", _pattern_validator(EMAIL_PATTERN, "Invalid email address"))
@@ -0,0 +1,288 @@
+import argparse
+import json
+import sys
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from utils.analysis import iter_records
+from utils.ui_constants import DEFAULT_ENCODING, WATCHLIST_COLUMNS
+
+"""
+Watchlist matching over exported DNS and URL results
+"""
+
+# Characters separating domain labels and URL parts, for whole-label matching
+LABEL_SEPARATORS = frozenset("./:@?#=&")
+
+
+class AhoCorasick:
+    def __init__(self, patterns: Iterable[str]) -> None:
+        """
+        Automaton finding every occurrence of many substrings in one pass
+
+        Matching is case-insensitive. The failure links are followed while
+        building, so each node holds all patterns ending at it and scanning
+        a text costs one transition per character regardless of how many
+        patterns the watchlist holds.
+
+        Args:
+        - patterns (Iterable[str]): The substrings to find (e.g., domains)
+        """
+
+        self.patterns: List[str] = list(
+            dict.fromkeys(p.strip().lower() for p in patterns if p.strip())
+        )
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[Tuple[int, ...]] = [()]
+
+        for index, pattern in enumerate(self.patterns):
+            node = 0
+            for char in pattern:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._outputs.append(())
+                node = next_node
+            self._outputs[node] += (index,)
+
+        # Breadth-first, so the failure target of a node is complete before its children
+        pending = deque(self._goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target
+                self._outputs[child] += self._outputs[self._fail[child]]
+                pending.append(child)
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """
+        Finds all watchlist entries occurring in a text
+
+        Args:
+        - text (str): The text to scan
+
+        Returns:
+        - Iterator[Tuple[int, str]]: The start offset and the pattern of each occurrence
+        """
+
+        goto, fail, outputs, patterns = (
+            self._goto,
+            self._fail,
+            self._outputs,
+            self.patterns,
+        )
+        node = 0
+        for position, char in enumerate(text.lower()):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for index in outputs[node]:
+                yield position - len(patterns[index]) + 1, patterns[index]
+
+    def find(self, text: str, whole_labels: bool = False) -> List[str]:
+        """
+        Lists the distinct watchlist entries found in a text
+
+        Args:
+        - text (str): The text to scan (e.g., a queried name or URL)
+        - whole_labels (bool): Only count entries bounded by label or URL separators,
+          so "evil.com" matches "a.evil.com" but not "notevil.com"
+
+        Returns:
+        - List[str]: The matched entries in order of first occurrence
+        """
+
+        text = text.lower()
+        found: Dict[str, None] = {}
+        for start, pattern in self.iter_matches(text):
+            if whole_labels:
+                end = start + len(pattern)
+                if (
+                    start > 0
+                    and text[start - 1] not in LABEL_SEPARATORS
+                    and pattern[0] not in LABEL_SEPARATORS
+                ):
+                    continue
+                if (
+                    end < len(text)
+                    and text[end] not in LABEL_SEPARATORS
+                    and pattern[-1] not in LABEL_SEPARATORS
+                ):
+                    continue
+            found[pattern] = None
+        return list(found)
+
+
+@dataclass
+class WatchlistMatch:
+    """
+    A watchlist hit in one column of an exported row
+    """
+
+    row: int
+    column: str
+    value: str
+    patterns: List[str]
+    record: Dict[str, Any]
+
+
+def load_watchlist(paths: Sequence[str]) -> List[str]:
+    """
+    Reads watchlist files with one domain or URL fragment per line
+
+    Args:
+    - paths (Sequence[str]): The watchlist files, '#' starts a comment
+
+    Returns:
+    - List[str]: The entries
+    """
+
+    entries = []
+    for path in paths:
+        with open(path, "r", encoding=DEFAULT_ENCODING) as f:
+            for line in f:
+                entry = line.split("#", 1)[0].strip()
+                if entry:
+                    entries.append(entry)
+    return entries
+
+
+def scan_records(
+    records: Iterable[Dict[str, Any]],
+    automaton: AhoCorasick,
+    columns: Optional[Sequence[str]] = None,
+    whole_labels: bool = False,
+) -> Iterator[WatchlistMatch]:
+    """
+    Matches exported rows against a watchlist in a single pass
+
+    Args:
+    - records (Iterable[Dict[str, Any]]): Flat rows, e.g. from iter_records
+    - automaton (AhoCorasick): The compiled watchlist
+    - columns (Optional[Sequence[str]]): Columns to scan, None for every text column
+    - whole_labels (bool): Only count entries bounded by label or URL separators
+
+    Returns:
+    - Iterator[WatchlistMatch]: One match per row and column containing an entry
+    """
+
+    for row, record in enumerate(records):
+        items = (
+            record.items() if columns is None else ((c, record.get(c)) for c in columns)
+        )
+        for column, value in items:
+            if not isinstance(value, str) or not value:
+                continue
+            patterns = automaton.find(value, whole_labels)
+            if patterns:
+                yield WatchlistMatch(row, column, value, patterns, record)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Scans exported DNS or URL results for watchlist entries
+
+    Args:
+    - argv (Optional[List[str]]): Command line arguments, defaults to sys.argv
+
+    Returns:
+    - int: 0 on success, 1 if the watchlist or export could not be read
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.watchlist",
+        description="Match exported results against a watchlist of domains and URLs",
+    )
+    parser.add_argument("paths", nargs="+", help="Exported CSV, JSON or NDJSON results")
+    parser.add_argument(
+        "--watchlist",
+        action="append",
+        required=True,
+        help="File with one entry per line (repeatable)",
+    )
+    parser.add_argument(
+        "--column",
+        action="append",
+        help=f"Column to scan (repeatable, default: {', '.join(WATCHLIST_COLUMNS)})",
+    )
+    parser.add_argument(
+        "--all-columns", action="store_true", help="Scan every text column"
+    )
+    parser.add_argument(
+        "--whole-labels",
+        action="store_true",
+        help="Only match entries at label boundaries "
+        "('evil.com' does not match 'notevil.com')",
+    )
+    parser.add_argument(
+        "--output", help="Write matched rows as NDJSON to this file instead of stdout"
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="Number of entries in the summary"
+    )
+    args = parser.parse_args(argv)
+
+    columns = None if args.all_columns else (args.column or WATCHLIST_COLUMNS)
+    try:
+        automaton = AhoCorasick(load_watchlist(args.watchlist))
+    except OSError as e:
+        print(f"Failed to read watchlist: {e}", file=sys.stderr)
+        return 1
+    if not len(automaton):
+        parser.error("The watchlist is empty")
+
+    output = (
+        open(args.output, "w", encoding=DEFAULT_ENCODING) if args.output else sys.stdout
+    )
+    hits: Counter = Counter()
+    rows = 0
+    try:
+        for path in args.paths:
+            for match in scan_records(
+                iter_records(path), automaton, columns, args.whole_labels
+            ):
+                output.write(
+                    json.dumps(
+                        {
+                            "path": path,
+                            "column": match.column,
+                            "value": match.value,
+                            "watchlist": match.patterns,
+                            "record": match.record,
+                        },
+                        default=str,
+                    )
+                    + "\n"
+                )
+                hits.update(match.patterns)
+                rows += 1
+    except (OSError, ValueError) as e:
+        print(f"Failed to scan: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(
+        f"{rows} matches for {len(hits)} of {len(automaton)} watchlist entries",
+        file=sys.stderr,
+    )
+    for pattern, count in hits.most_common(args.top):
+        print(f"  {count:>8}  {pattern}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
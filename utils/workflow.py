@@ -0,0 +1,627 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import yaml
+
+from utils.analysis import flatten_record
+from utils.ariel_scheduler import ArielScheduler
+from utils.canonical import query_fingerprint
+from utils.configuration import get_logger, normalize_lookback, read_templates
+from utils.correlation import KEY_NORMALIZERS
+from utils.elastic_batch import MsearchClient
+from utils.generate_queries import build_batched_queries, build_query
+from utils.profiling import add_profiling_arguments, profiling_from_args
+from utils.ui_constants import (
+    DEFAULT_ENCODING,
+    MSEARCH_DEFAULT_INDEX,
+    PLATFORMS,
+    WORKFLOW_BATCH_SIZE,
+    WORKFLOW_CACHE_TTL_SECONDS,
+    WORKFLOW_MAX_PARALLEL_STEPS,
+    WORKFLOW_MAX_VALUES,
+)
+from utils.validators import field_validator
+
+"""
+Chained hunt workflows executed as a DAG
+"""
+
+logger = get_logger()
+
+# Runs a list of queries of one platform, up to a number of rows per query (None
+# for all), and streams every result row; raises instead of returning partial results
+Runner = Callable[[List[str], Optional[int]], Iterable[Dict[str, Any]]]
+
+
+# Platforms build_runners can connect to; Defender queries are only rendered
+RUNNER_PLATFORMS = ["qradar", "elastic"]
+
+
+def build_runners(
+    qradar_url: Optional[str] = None,
+    qradar_token: Optional[str] = None,
+    elastic_url: Optional[str] = None,
+    elastic_api_key: Optional[str] = None,
+    elastic_index: str = MSEARCH_DEFAULT_INDEX,
+) -> Dict[str, Runner]:
+    """
+    Creates query runners for the platforms with connection details
+
+    Args:
+    - qradar_url (Optional[str]): QRadar console URL
+    - qradar_token (Optional[str]): QRadar authorized service token
+    - elastic_url (Optional[str]): Elasticsearch URL
+    - elastic_api_key (Optional[str]): Elasticsearch API key
+    - elastic_index (str): Index pattern to search
+
+    Returns:
+    - Dict[str, Runner]: Runner per platform
+    """
+
+    runners: Dict[str, Runner] = {}
+    if qradar_url and qradar_token:
+        scheduler = ArielScheduler(qradar_url, qradar_token)
+        # AQL carries its LIMIT in the query itself
+        runners["qradar"] = lambda queries, limit=None: scheduler.stream(queries)
+    if elastic_url:
+        client = MsearchClient(elastic_url, elastic_index, elastic_api_key)
+        runners["elastic"] = lambda queries, limit=None: client.iter_hits(
+            queries, limit=limit
+        )
+    return runners
+
+
+@dataclass(frozen=True)
+class Extraction:
+    """
+    A column of a step's results published as a named output
+    """
+
+    column: str
+    key: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class WorkflowStep:
+    """
+    A template run with fixed inputs and inputs fed from earlier steps
+    """
+
+    name: str
+    template: str
+    platform: str
+    inputs: Dict[str, str] = field(default_factory=dict)
+    # Optional field name to (step, output) it is fed from
+    inputs_from: Dict[str, Tuple[str, str]] = field(default_factory=dict)
+    extract: Dict[str, Extraction] = field(default_factory=dict)
+    needs: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class Workflow:
+    """
+    A named set of steps with a shared lookback
+    """
+
+    name: str
+    lookback: str
+    steps: Dict[str, WorkflowStep]
+    description: str = ""
+
+
+@dataclass
+class StepResult:
+    """
+    Outcome of a workflow step
+    """
+
+    name: str
+    queries: List[str] = field(default_factory=list)
+    rows: int = 0
+    outputs: Dict[str, List[str]] = field(default_factory=dict)
+    skipped: Optional[str] = None
+    cached: bool = False
+
+
+def _parse_step(
+    name: str, spec: Dict[str, Any], platform: Optional[str]
+) -> WorkflowStep:
+    """
+    Parses one step of a workflow definition
+
+    Args:
+    - name (str): The step name
+    - spec (Dict[str, Any]): The step definition
+    - platform (Optional[str]): The workflow's default platform
+
+    Returns:
+    - WorkflowStep: The parsed step
+    """
+
+    if not isinstance(spec, dict) or "template" not in spec:
+        raise ValueError(f"Step '{name}' must define a template")
+
+    step_platform = spec.get("platform", platform)
+    if step_platform not in PLATFORMS:
+        raise ValueError(f"Step '{name}' has no valid platform: '{step_platform}'")
+
+    inputs_from = {}
+    for key, source in (spec.get("inputs_from") or {}).items():
+        step, _, output = str(source).partition(".")
+        if not step or not output:
+            raise ValueError(
+                f"Step '{name}' input '{key}' must reference '<step>.<output>', "
+                f"got '{source}'"
+            )
+        inputs_from[key] = (step, output)
+
+    extract = {}
+    for output, column in (spec.get("extract") or {}).items():
+        if isinstance(column, dict):
+            key = column.get("key")
+            if key is not None and key not in KEY_NORMALIZERS:
+                raise ValueError(
+                    f"Step '{name}' output '{output}' has unknown key '{key}'"
+                )
+            extract[output] = Extraction(column["column"], key)
+        else:
+            extract[output] = Extraction(str(column))
+
+    needs = tuple(
+        dict.fromkeys(
+            [*spec.get("needs", []), *(step for step, _ in inputs_from.values())]
+        )
+    )
+    return WorkflowStep(
+        name,
+        spec["template"],
+        step_platform,
+        {key: str(value) for key, value in (spec.get("inputs") or {}).items()},
+        inputs_from,
+        extract,
+        needs,
+    )
+
+
+def parse_workflow(definition: Dict[str, Any], name: str = "workflow") -> Workflow:
+    """
+    Parses and checks a workflow definition
+
+    Args:
+    - definition (Dict[str, Any]): The decoded workflow YAML
+    - name (str): Name used when the definition has none
+
+    Returns:
+    - Workflow: The parsed workflow
+    """
+
+    steps_spec = definition.get("steps")
+    if not isinstance(steps_spec, dict) or not steps_spec:
+        raise ValueError("A workflow needs at least one step")
+
+    platform = definition.get("platform")
+    steps = {
+        step_name: _parse_step(step_name, spec, platform)
+        for step_name, spec in steps_spec.items()
+    }
+
+    for step in steps.values():
+        for dependency in step.needs:
+            if dependency not in steps:
+                raise ValueError(
+                    f"Step '{step.name}' needs unknown step '{dependency}'"
+                )
+        for key, (source, output) in step.inputs_from.items():
+            if output not in steps[source].extract:
+                raise ValueError(
+                    f"Step '{step.name}' input '{key}' uses '{source}.{output}', "
+                    f"which '{source}' does not extract"
+                )
+
+    # Kahn's algorithm; leftover steps are part of a cycle
+    remaining = {step.name: set(step.needs) for step in steps.values()}
+    while True:
+        ready = [step for step, needs in remaining.items() if not needs]
+        if not ready:
+            break
+        for step in ready:
+            del remaining[step]
+        for needs in remaining.values():
+            needs.difference_update(ready)
+    if remaining:
+        raise ValueError(f"Workflow steps form a cycle: {', '.join(sorted(remaining))}")
+
+    return Workflow(
+        definition.get("name", name),
+        str(definition.get("lookback", "10m")),
+        steps,
+        definition.get("description", ""),
+    )
+
+
+def load_workflow(path: str) -> Workflow:
+    """
+    Loads a workflow definition from a YAML file
+
+    Args:
+    - path (str): Path to the workflow YAML
+
+    Returns:
+    - Workflow: The parsed workflow
+    """
+
+    with open(path, "r", encoding=DEFAULT_ENCODING) as f:
+        definition = yaml.safe_load(f)
+    if not isinstance(definition, dict):
+        raise ValueError(f"{path} is not a workflow definition")
+    return parse_workflow(definition, os.path.splitext(os.path.basename(path))[0])
+
+
+class WorkflowExecutor:
+    def __init__(
+        self,
+        runners: Optional[Dict[str, Runner]] = None,
+        cache_dir: Optional[str] = None,
+        output_dir: Optional[str] = None,
+        max_parallel_steps: int = WORKFLOW_MAX_PARALLEL_STEPS,
+        batch_size: int = WORKFLOW_BATCH_SIZE,
+        max_values: int = WORKFLOW_MAX_VALUES,
+        cache_ttl: float = WORKFLOW_CACHE_TTL_SECONDS,
+    ) -> None:
+        """
+        Runs workflow steps as soon as their dependencies finished
+
+        Step results are cached on disk keyed by the fingerprints of the
+        step's queries, so reruns and steps sharing queries skip the SIEM
+        while the cached rows are younger than cache_ttl.
+
+        Args:
+        - runners (Optional[Dict[str, Runner]]): Query runner per platform, or None
+        - cache_dir (Optional[str]): Directory of the result cache, temporary by default
+        - output_dir (Optional[str]): Directory receiving each step's rows as NDJSON
+        - max_parallel_steps (int): Maximum number of steps running at once
+        - batch_size (int): Maximum number of fed values per query condition
+        - max_values (int): Maximum number of values extracted per output
+        - cache_ttl (float): Seconds cached step results are reused
+        """
+
+        if max_parallel_steps <= 0:
+            raise ValueError("max_parallel_steps must be positive")
+
+        self.runners = runners or {}
+        self.cache_dir = cache_dir
+        self.output_dir = output_dir
+        self.max_parallel_steps = max_parallel_steps
+        self.batch_size = batch_size
+        self.max_values = max_values
+        self.cache_ttl = cache_ttl
+        self._templates: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._query_locks: Dict[str, threading.Lock] = {}
+
+    def _load_templates(self, platform: str) -> Dict[str, Any]:
+        with self._lock:
+            if platform not in self._templates:
+                self._templates[platform] = read_templates(platform)
+            return self._templates[platform]
+
+    def _cache_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._query_locks.setdefault(key, threading.Lock())
+
+    def _fetch(
+        self,
+        platform: str,
+        queries: List[str],
+        limit: Optional[int],
+        cache_dir: str,
+    ) -> Tuple[Iterator[Dict[str, Any]], bool]:
+        """
+        Streams the rows of a step's queries, from the cache when available
+
+        Queries use a lookback relative to now, so cached rows are only reused
+        for cache_ttl seconds.
+
+        Args:
+        - platform (str): The platform of the queries
+        - queries (List[str]): The queries of the step
+        - limit (Optional[int]): Maximum number of rows per query, None for all
+        - cache_dir (str): Directory of the result cache
+
+        Returns:
+        - Tuple[Iterator[Dict[str, Any]], bool]: The rows and whether they were cached
+        """
+
+        key = "\n".join(sorted(query_fingerprint(q, platform) for q in queries))
+        digest = hashlib.sha256(f"{limit}\n{key}".encode(DEFAULT_ENCODING)).hexdigest()
+        path = os.path.join(cache_dir, f"{platform}-{digest}.ndjson")
+
+        with self._cache_lock(path):
+            try:
+                cached = time.time() - os.path.getmtime(path) < self.cache_ttl
+            except OSError:
+                cached = False
+            if not cached:
+                runner = self.runners[platform]
+                partial = f"{path}.{threading.get_ident()}.tmp"
+                try:
+                    with open(partial, "w", encoding=DEFAULT_ENCODING) as f:
+                        for row in runner(queries, limit):
+                            f.write(json.dumps(row, default=str) + "\n")
+                    os.replace(partial, path)
+                finally:
+                    if os.path.exists(partial):
+                        os.remove(partial)
+
+        def rows() -> Iterator[Dict[str, Any]]:
+            with open(path, "r", encoding=DEFAULT_ENCODING) as f:
+                for line in f:
+                    yield json.loads(line)
+
+        return rows(), cached
+
+    def _feed_values(
+        self,
+        step: WorkflowStep,
+        template: Dict[str, Any],
+        results: Dict[str, StepResult],
+    ) -> Dict[str, List[str]]:
+        """
+        Collects the values fed into a step, dropping those failing field validation
+
+        Args:
+        - step (WorkflowStep): The step to feed
+        - template (Dict[str, Any]): The step's template
+        - results (Dict[str, StepResult]): Results of the finished steps
+
+        Returns:
+        - Dict[str, List[str]]: Values per optional field
+        """
+
+        fed = {}
+        optional_fields = template.get("optional_fields", {})
+        for key, (source, output) in step.inputs_from.items():
+            validator = field_validator(optional_fields.get(key))
+            fed[key] = [
+                value
+                for value in results[source].outputs.get(output, [])
+                if validator is None or validator(value)[0]
+            ]
+        return fed
+
+    def run_step(
+        self,
+        workflow: Workflow,
+        step: WorkflowStep,
+        results: Dict[str, StepResult],
+        cache_dir: str,
+    ) -> StepResult:
+        """
+        Renders and runs one step, then extracts its outputs
+
+        Args:
+        - workflow (Workflow): The workflow of the step
+        - step (WorkflowStep): The step to run
+        - results (Dict[str, StepResult]): Results of the finished steps
+        - cache_dir (str): Directory of the result cache
+
+        Returns:
+        - StepResult: The outcome of the step
+        """
+
+        result = StepResult(step.name)
+        try:
+            templates = self._load_templates(step.platform)
+        except (OSError, yaml.YAMLError) as e:
+            raise ValueError(
+                f"Step '{step.name}' cannot load {step.platform} templates: {e}"
+            ) from e
+        template = templates.get(step.template)
+        if not isinstance(template, dict) or step.template == "base_queries":
+            raise ValueError(
+                f"Step '{step.name}' uses unknown {step.platform} "
+                f"template '{step.template}'"
+            )
+
+        duration = normalize_lookback(workflow.lookback, step.platform)
+        if duration is None:
+            raise ValueError(f"Invalid workflow lookback '{workflow.lookback}'")
+        base_queries = templates.get("base_queries", {})
+
+        if step.inputs_from:
+            fed = self._feed_values(step, template, results)
+            empty = [key for key, values in fed.items() if not values]
+            if empty:
+                result.skipped = f"no values for {', '.join(empty)}"
+                return result
+            result.queries = build_batched_queries(
+                template,
+                step.inputs,
+                fed,
+                duration,
+                step.platform,
+                base_queries,
+                batch_size=self.batch_size,
+            )
+        else:
+            result.queries = [
+                build_query(
+                    template, step.inputs, duration, step.platform, base_queries
+                )
+            ]
+
+        if step.platform not in self.runners:
+            result.skipped = f"no runner for {step.platform}"
+            return result
+
+        rows, result.cached = self._fetch(
+            step.platform, result.queries, template.get("limit"), cache_dir
+        )
+        collected: Dict[str, Dict[str, None]] = {output: {} for output in step.extract}
+
+        output = None
+        if self.output_dir:
+            output = open(
+                os.path.join(self.output_dir, f"{step.name}.ndjson"),
+                "w",
+                encoding=DEFAULT_ENCODING,
+            )
+        try:
+            for row in rows:
+                result.rows += 1
+                if output is not None:
+                    output.write(json.dumps(row, default=str) + "\n")
+                flat = flatten_record(row)
+                for name, extraction in step.extract.items():
+                    values = collected[name]
+                    value = flat.get(extraction.column)
+                    if value in (None, "") or len(values) >= self.max_values:
+                        continue
+                    value = str(value)
+                    if extraction.key is not None:
+                        value = KEY_NORMALIZERS[extraction.key](value)
+                    if value is not None:
+                        values[value] = None
+        finally:
+            if output is not None:
+                output.close()
+
+        result.outputs = {name: list(values) for name, values in collected.items()}
+        return result
+
+    def run(self, workflow: Workflow) -> Dict[str, StepResult]:
+        """
+        Runs a workflow, starting every step once its dependencies finished
+
+        Args:
+        - workflow (Workflow): The workflow to run
+
+        Returns:
+        - Dict[str, StepResult]: The result of each step, in completion order
+        """
+
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+
+        with tempfile.TemporaryDirectory(prefix="threatqueryx-workflow-") as scratch:
+            cache_dir = self.cache_dir or scratch
+            os.makedirs(cache_dir, exist_ok=True)
+
+            results: Dict[str, StepResult] = {}
+            pending = dict(workflow.steps)
+            with ThreadPoolExecutor(
+                max_workers=self.max_parallel_steps, thread_name_prefix="workflow"
+            ) as executor:
+                running = {}
+                while pending or running:
+                    for name, step in list(pending.items()):
+                        if all(dependency in results for dependency in step.needs):
+                            del pending[name]
+                            future = executor.submit(
+                                self.run_step, workflow, step, dict(results), cache_dir
+                            )
+                            running[future] = name
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        result = results[name] = future.result()
+                        if result.skipped:
+                            logger.info(
+                                f"Workflow step '{name}' skipped: {result.skipped}"
+                            )
+                        else:
+                            logger.info(
+                                f"Workflow step '{name}' finished: {result.rows} rows"
+                            )
+            return results
+
+
+def format_report(workflow: Workflow, results: Dict[str, StepResult]) -> str:
+    """
+    Formats the outcome of a workflow
+
+    Args:
+    - workflow (Workflow): The workflow that ran
+    - results (Dict[str, StepResult]): The result of each step
+
+    Returns:
+    - str: A human readable report
+    """
+
+    lines = [f"== {workflow.name} =="]
+    for name in workflow.steps:
+        result = results.get(name)
+        if result is None:
+            continue
+        status = (
+            f"skipped ({result.skipped})" if result.skipped else f"{result.rows} rows"
+        )
+        if result.cached:
+            status += ", cached"
+        lines.append(f"\n[{name}] {status}")
+        for query in result.queries:
+            lines.append(query)
+        for output, values in result.outputs.items():
+            lines.append(f"  {output}: {len(values)} values")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs a hunt workflow, or renders its queries without SIEM credentials
+
+    Args:
+    - argv (Optional[List[str]]): Command line arguments, defaults to sys.argv
+
+    Returns:
+    - int: 0 on success, 1 if the workflow failed
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.workflow", description="Run a chained hunt workflow"
+    )
+    parser.add_argument("path", help="Workflow YAML (see workflows/)")
+    parser.add_argument("--qradar-url", help="QRadar console URL")
+    parser.add_argument("--qradar-token", help="QRadar authorized service token")
+    parser.add_argument("--elastic-url", help="Elasticsearch URL")
+    parser.add_argument("--elastic-api-key", help="Elasticsearch API key")
+    parser.add_argument(
+        "--elastic-index", default=MSEARCH_DEFAULT_INDEX, help="Index pattern to search"
+    )
+    parser.add_argument("--cache-dir", help="Persistent result cache directory")
+    parser.add_argument("--output-dir", help="Write each step's rows to this directory")
+    add_profiling_arguments(parser)
+    args = parser.parse_args(argv)
+
+    runners = build_runners(
+        args.qradar_url,
+        args.qradar_token,
+        args.elastic_url,
+        args.elastic_api_key,
+        args.elastic_index,
+    )
+
+    try:
+        with profiling_from_args(args):
+            workflow = load_workflow(args.path)
+            executor = WorkflowExecutor(runners, args.cache_dir, args.output_dir)
+            results = executor.run(workflow)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Workflow failed: {e}")
+        return 1
+
+    print(format_report(workflow, results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())